@@ -1,66 +1,180 @@
+import json
 from typing import List
 from uuid import UUID
+import anyio
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.models.conversation import Conversation, Message
 from app.models.user import User
 from app.services.chat_service import ChatService
-from app.api.deps import get_current_user
-from app.schemas.chat import ChatRequest, ChatResponse, ConversationResponse, MessageResponse
+from app.services.stage_timer import StageTimeout
+from app.tasks.conversations import schedule_summary
+from app.api.deps import get_current_user, get_chat_service
+from app.schemas.chat import (
+    BatchAnswer,
+    BatchChatRequest,
+    BatchChatResponse,
+    ChatRequest,
+    ChatResponse,
+    ConversationResponse,
+    MessageResponse,
+)
 
 router = APIRouter()
 
 
-@router.post("/", response_model=ChatResponse)
-async def chat(
+async def get_or_create_conversation(
     chat_request: ChatRequest,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
-    conversation_id = chat_request.conversation_id
-    
-    if conversation_id:
+    current_user: User,
+    db: AsyncSession
+) -> Conversation:
+    if chat_request.conversation_id:
         result = await db.execute(
             select(Conversation).where(
-                Conversation.id == conversation_id,
+                Conversation.id == chat_request.conversation_id,
                 Conversation.user_id == current_user.id
             )
         )
         conversation = result.scalar_one_or_none()
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
-    else:
-        conversation = Conversation(
-            user_id=current_user.id,
-            title=chat_request.message[:50] + "..." if len(chat_request.message) > 50 else chat_request.message
-        )
-        db.add(conversation)
-        await db.commit()
-        await db.refresh(conversation)
-        conversation_id = conversation.id
+        return conversation
     
-    chat_service = ChatService()
+    conversation = Conversation(
+        user_id=current_user.id,
+        title=chat_request.message[:50] + "..." if len(chat_request.message) > 50 else chat_request.message
+    )
+    db.add(conversation)
+    await db.commit()
+    await db.refresh(conversation)
+    return conversation
+
+
+def format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@router.post("/", response_model=ChatResponse)
+async def chat(
+    chat_request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
+):
+    conversation = await get_or_create_conversation(chat_request, current_user, db)
+    conversation_id = conversation.id
     
     try:
         response_data = await chat_service.generate_response(
             user_message=chat_request.message,
             conversation_id=str(conversation_id),
             user_id=current_user.id,
-            db=db
+            db=db,
+            use_cache=not chat_request.bypass_cache
         )
+        if response_data.get("compact_history"):
+            schedule_summary(str(conversation_id))
         
         return ChatResponse(
             conversation_id=conversation_id,
             message=response_data["response"],
-            sources=response_data["sources"]
+            sources=response_data["sources"],
+            cached=response_data.get("cached", False),
+            timings=response_data.get("timings")
+        )
+    
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
+
+
+@router.post("/stream")
+async def chat_stream(
+    chat_request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
+):
+    conversation = await get_or_create_conversation(chat_request, current_user, db)
+    conversation_id = conversation.id
+    user_id = current_user.id
+    
+    # The session dependency is released before the body is streamed, so
+    # the stream closes the session itself once the answer is saved.
+    async def events():
+        try:
+            yield format_event("conversation", {"conversation_id": conversation_id})
+            async for event in chat_service.stream_response(
+                user_message=chat_request.message,
+                conversation_id=str(conversation_id),
+                user_id=user_id,
+                db=db,
+                use_cache=not chat_request.bypass_cache
+            ):
+                yield format_event(event["event"], event["data"])
+                if event.get("compact_history"):
+                    schedule_summary(str(conversation_id))
+        except Exception as e:
+            yield format_event("error", {"detail": f"Chat processing failed: {str(e)}"})
+        finally:
+            with anyio.CancelScope(shield=True):
+                await db.close()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/batch", response_model=BatchChatResponse)
+async def chat_batch(
+    batch_request: BatchChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
+):
+    if not batch_request.questions:
+        raise HTTPException(status_code=400, detail="No questions provided")
+    if len(batch_request.questions) > settings.CHAT_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Exceeds the {settings.CHAT_BATCH_MAX_QUESTIONS} question limit"
         )
     
+    try:
+        batch = await chat_service.answer_batch(
+            questions=batch_request.questions,
+            user_id=current_user.id,
+            db=db,
+            use_cache=not batch_request.bypass_cache
+        )
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
+    
+    return BatchChatResponse(
+        results=[
+            BatchAnswer(
+                question=result["question"],
+                message=result["response"],
+                sources=result["sources"],
+                cached=result["cached"],
+                error=result["error"]
+            )
+            for result in batch["results"]
+        ],
+        timings=batch.get("timings")
+    )
 
 
 @router.get("/conversations", response_model=List[ConversationResponse])
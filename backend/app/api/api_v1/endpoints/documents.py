@@ -1,22 +1,65 @@
-from typing import List
+import mimetypes
+import uuid
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, List
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
+from app.core.config import settings
 from app.core.database import get_db
-from app.models.document import Document, DocumentChunk
+from app.models.document import Document
 from app.models.user import User
-from app.services.document_processor import DocumentProcessor
+from app.services.chunk_search import search_chunks
 from app.services.embedding_service import EmbeddingService
-from app.api.deps import get_current_user
-from app.schemas.document import DocumentResponse, DocumentListResponse
+from app.services.lexical_index import LexicalIndex
+from app.tasks.documents import process_document, process_documents, reindex_document
+from app.api.deps import get_current_user, get_embedding_service, get_lexical_index
+from app.schemas.document import (
+    DocumentResponse,
+    DocumentListResponse,
+    DocumentStatusResponse,
+    BulkUploadItem,
+    BulkUploadResponse,
+    ChunkSearchResponse,
+)
 
 router = APIRouter()
 
 
-@router.post("/upload", response_model=DocumentResponse)
+async def _save_upload(file: UploadFile, destination: Path, max_size: int) -> int:
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    size = 0
+    try:
+        with open(destination, "wb") as out:
+            while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File exceeds the {max_size} byte upload limit"
+                    )
+                await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        destination.unlink(missing_ok=True)
+        raise
+    return size
+
+
+def _remove_upload(file_path: str | None):
+    if file_path:
+        Path(file_path).unlink(missing_ok=True)
+
+
+@router.post(
+    "/upload",
+    response_model=DocumentStatusResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
 async def upload_document(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
@@ -25,58 +68,309 @@ async def upload_document(
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
-    processor = DocumentProcessor()
-    embedding_service = EmbeddingService()
+    file_extension = Path(file.filename).suffix.lower()
+    if file_extension not in settings.ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type: {file_extension}"
+        )
+    
+    document_id = uuid.uuid4()
+    file_path = Path(settings.UPLOAD_DIRECTORY) / str(current_user.id) / f"{document_id}{file_extension}"
     
     try:
-        processed_data = await processor.process_file(file.file, file.filename)
-        
-        document = Document(
-            filename=file.filename,
-            file_type=file.content_type or "unknown",
-            file_size=file.size or 0,
-            content=processed_data["content"],
-            metadata=processed_data["metadata"],
-            owner_id=current_user.id,
-            processing_status="processing"
-        )
-        
-        db.add(document)
+        file_size = await _save_upload(file, file_path, settings.MAX_UPLOAD_SIZE)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to store upload: {str(e)}")
+    
+    document = Document(
+        id=document_id,
+        filename=file.filename,
+        file_type=file.content_type or "unknown",
+        file_size=file_size,
+        file_path=str(file_path),
+        metadata={},
+        owner_id=current_user.id,
+        processing_status="pending",
+        processing_progress=0
+    )
+    
+    db.add(document)
+    await db.commit()
+    await db.refresh(document)
+    
+    try:
+        process_document.delay(str(document.id))
+    except Exception as e:
+        document.processing_status = "failed"
+        document.error_message = str(e)
         await db.commit()
-        await db.refresh(document)
         
-        chunk_ids = await embedding_service.store_document_embeddings(
-            str(document.id),
-            processed_data["chunks"],
-            {"filename": file.filename, "owner_id": current_user.id}
+        raise HTTPException(
+            status_code=503,
+            detail=f"Failed to queue document for processing: {str(e)}"
         )
+    
+    return document
+
+
+def _extract_archive(archive: BinaryIO, directory: Path, max_files: int) -> List[dict]:
+    # Entries are flattened to their base name and copied with a byte limit,
+    # so neither crafted paths nor understated sizes escape the upload rules.
+    try:
+        zip_file = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile as e:
+        return [{"filename": None, "error": f"Invalid ZIP archive: {str(e)}"}]
+    
+    directory.mkdir(parents=True, exist_ok=True)
+    entries = []
+    stored = 0
+    with zip_file:
+        for info in zip_file.infolist():
+            name = PurePosixPath(info.filename).name
+            if info.is_dir() or not name or name.startswith(".") or "__MACOSX" in info.filename:
+                continue
+            
+            entry = {"filename": name}
+            entries.append(entry)
+            file_extension = Path(name).suffix.lower()
+            if stored >= max_files:
+                entry["error"] = f"Exceeds the {settings.BULK_UPLOAD_MAX_FILES} file limit"
+                continue
+            if file_extension not in settings.ALLOWED_EXTENSIONS:
+                entry["error"] = f"Unsupported file type: {file_extension}"
+                continue
+            if info.file_size > settings.MAX_UPLOAD_SIZE:
+                entry["error"] = f"File exceeds the {settings.MAX_UPLOAD_SIZE} byte upload limit"
+                continue
+            
+            document_id = uuid.uuid4()
+            destination = directory / f"{document_id}{file_extension}"
+            size = 0
+            try:
+                with zip_file.open(info) as source, open(destination, "wb") as out:
+                    while block := source.read(settings.UPLOAD_CHUNK_SIZE):
+                        size += len(block)
+                        if size > settings.MAX_UPLOAD_SIZE:
+                            raise ValueError(
+                                f"File exceeds the {settings.MAX_UPLOAD_SIZE} byte upload limit"
+                            )
+                        out.write(block)
+            except Exception as e:
+                destination.unlink(missing_ok=True)
+                entry["error"] = str(e)
+                continue
+            
+            entry.update(id=document_id, path=destination, size=size)
+            stored += 1
+    return entries
+
+
+@router.post(
+    "/bulk",
+    response_model=BulkUploadResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def bulk_upload_documents(
+    files: List[UploadFile] = File(...),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    directory = Path(settings.UPLOAD_DIRECTORY) / str(current_user.id)
+    entries: List[dict] = []
+    
+    for file in files:
+        accepted = sum("path" in entry for entry in entries)
+        filename = file.filename or "unknown"
+        file_extension = Path(filename).suffix.lower()
         
-        for i, (chunk_content, chunk_id) in enumerate(zip(processed_data["chunks"], chunk_ids)):
-            chunk = DocumentChunk(
-                document_id=document.id,
-                chunk_index=i,
-                content=chunk_content,
-                embedding_id=chunk_id,
-                tokens=len(chunk_content.split())
+        if file_extension == ".zip":
+            archive_entries = await run_in_threadpool(
+                _extract_archive, file.file, directory, settings.BULK_UPLOAD_MAX_FILES - accepted
             )
-            db.add(chunk)
+            for entry in archive_entries:
+                entry["filename"] = f"{filename}/{entry['filename'] or ''}".rstrip("/")
+            entries.extend(archive_entries)
+            continue
         
-        document.processing_status = "completed"
-        await db.commit()
-        await db.refresh(document)
+        entry = {"filename": filename}
+        entries.append(entry)
+        if accepted >= settings.BULK_UPLOAD_MAX_FILES:
+            entry["error"] = f"Exceeds the {settings.BULK_UPLOAD_MAX_FILES} file limit"
+            continue
+        if file_extension not in settings.ALLOWED_EXTENSIONS:
+            entry["error"] = f"Unsupported file type: {file_extension}"
+            continue
         
-        return document
+        document_id = uuid.uuid4()
+        file_path = directory / f"{document_id}{file_extension}"
+        try:
+            size = await _save_upload(file, file_path, settings.MAX_UPLOAD_SIZE)
+        except HTTPException as e:
+            entry["error"] = e.detail
+            continue
+        except OSError as e:
+            entry["error"] = f"Failed to store upload: {str(e)}"
+            continue
+        entry.update(id=document_id, path=file_path, size=size, content_type=file.content_type)
     
-    except Exception as e:
-        if 'document' in locals():
-            document.processing_status = "failed"
-            document.error_message = str(e)
+    documents = [
+        Document(
+            id=entry["id"],
+            filename=PurePosixPath(entry["filename"]).name,
+            file_type=entry.get("content_type") or mimetypes.guess_type(entry["filename"])[0] or "unknown",
+            file_size=entry["size"],
+            file_path=str(entry["path"]),
+            metadata={},
+            owner_id=current_user.id,
+            processing_status="pending",
+            processing_progress=0
+        )
+        for entry in entries
+        if "path" in entry
+    ]
+    db.add_all(documents)
+    await db.commit()
+    
+    for start in range(0, len(documents), settings.BULK_INGEST_TASK_SIZE):
+        group = documents[start:start + settings.BULK_INGEST_TASK_SIZE]
+        try:
+            process_documents.delay([str(document.id) for document in group])
+        except Exception as e:
+            for document in group:
+                document.processing_status = "failed"
+                document.error_message = str(e)
             await db.commit()
+            
+            failed_ids = {document.id for document in group}
+            for entry in entries:
+                if entry.get("id") in failed_ids:
+                    entry["error"] = f"Failed to queue document for processing: {str(e)}"
+    
+    items = [
+        BulkUploadItem(
+            filename=entry["filename"],
+            status="rejected" if "error" in entry else "queued",
+            document_id=entry.get("id"),
+            error=entry.get("error")
+        )
+        for entry in entries
+    ]
+    queued = sum(item.status == "queued" for item in items)
+    return BulkUploadResponse(queued=queued, rejected=len(items) - queued, items=items)
+
+
+@router.get("/{document_id}/status", response_model=DocumentStatusResponse)
+async def get_document_status(
+    document_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    result = await db.execute(
+        select(Document).where(Document.id == document_id, Document.owner_id == current_user.id)
+    )
+    document = result.scalar_one_or_none()
+    
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    return document
+
+
+@router.put(
+    "/{document_id}",
+    response_model=DocumentStatusResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def replace_document(
+    document_id: UUID,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    result = await db.execute(
+        select(Document).where(Document.id == document_id, Document.owner_id == current_user.id)
+    )
+    document = result.scalar_one_or_none()
+    
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    if document.processing_status in ("pending", "processing"):
+        raise HTTPException(status_code=409, detail="Document is still being processed")
+    
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+    
+    file_extension = Path(file.filename).suffix.lower()
+    if file_extension not in settings.ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type: {file_extension}"
+        )
+    
+    file_path = Path(settings.UPLOAD_DIRECTORY) / str(current_user.id) / f"{uuid.uuid4()}{file_extension}"
+    
+    try:
+        file_size = await _save_upload(file, file_path, settings.MAX_UPLOAD_SIZE)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to store upload: {str(e)}")
+    
+    # The document keeps its current file until the reindex task completes
+    # with the new one.
+    replacement = {
+        "filename": file.filename,
+        "file_type": file.content_type or "unknown",
+        "file_size": file_size,
+        "file_path": str(file_path),
+    }
+    document.processing_status = "pending"
+    document.processing_progress = 0
+    document.error_message = None
+    await db.commit()
+    await db.refresh(document)
+    
+    try:
+        reindex_document.delay(str(document.id), replacement, document.file_path)
+    except Exception as e:
+        await run_in_threadpool(_remove_upload, str(file_path))
+        document.processing_status = "failed"
+        document.error_message = str(e)
+        await db.commit()
         
         raise HTTPException(
-            status_code=500,
-            detail=f"Document processing failed: {str(e)}"
+            status_code=503,
+            detail=f"Failed to queue document for processing: {str(e)}"
         )
+    
+    return document
+
+
+@router.get("/search", response_model=ChunkSearchResponse)
+async def search_documents(
+    q: str = Query(..., min_length=1, max_length=500),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    document_id: UUID | None = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # Keyword search over the caller's chunks; no embeddings or LLM calls.
+    total, results = await search_chunks(
+        db,
+        current_user.id,
+        q,
+        limit=page_size,
+        offset=(page - 1) * page_size,
+        document_id=document_id
+    )
+    return ChunkSearchResponse(
+        query=q,
+        total=total,
+        page=page,
+        page_size=page_size,
+        results=results
+    )
 
 
 @router.get("/", response_model=List[DocumentListResponse])
@@ -116,7 +410,9 @@ async def get_document(
 async def delete_document(
     document_id: UUID,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    lexical_index: LexicalIndex = Depends(get_lexical_index)
 ):
     result = await db.execute(
         select(Document).where(Document.id == document_id, Document.owner_id == current_user.id)
@@ -126,10 +422,12 @@ async def delete_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    embedding_service = EmbeddingService()
-    embedding_service.delete_document_embeddings(str(document_id))
+    await embedding_service.delete_document_embeddings(str(document_id), current_user.id)
     
+    await lexical_index.remove_document(db, document.id)
     await db.delete(document)
     await db.commit()
     
+    await run_in_threadpool(_remove_upload, document.file_path)
+    
     return {"message": "Document deleted successfully"}
\ No newline at end of file
@@ -1,5 +1,5 @@
 from typing import Annotated
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -8,6 +8,9 @@ from sqlalchemy import select
 from app.core.config import settings
 from app.core.database import get_db
 from app.models.user import User
+from app.services.chat_service import ChatService
+from app.services.embedding_service import EmbeddingService
+from app.services.lexical_index import LexicalIndex
 from app.schemas.token import TokenData
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
@@ -40,4 +43,16 @@ async def get_current_user(
     if user is None:
         raise credentials_exception
     
-    return user
\ No newline at end of file
+    return user
+
+
+def get_embedding_service(request: Request) -> EmbeddingService:
+    return request.app.state.embedding_service
+
+
+def get_chat_service(request: Request) -> ChatService:
+    return request.app.state.chat_service
+
+
+def get_lexical_index(request: Request) -> LexicalIndex:
+    return request.app.state.lexical_index
@@ -0,0 +1,20 @@
+from celery import Celery
+
+from app.core.config import settings
+
+celery_app = Celery(
+    "docintell",
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND,
+    include=["app.tasks.documents", "app.tasks.conversations"],
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    task_time_limit=settings.CELERY_TASK_TIME_LIMIT,
+    worker_prefetch_multiplier=settings.CELERY_WORKER_PREFETCH_MULTIPLIER,
+)
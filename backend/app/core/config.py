@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Dict
 from pydantic import field_validator, PostgresDsn
 from pydantic_settings import BaseSettings
 from pydantic_core.core_schema import ValidationInfo
@@ -37,20 +37,130 @@ class Settings(BaseSettings):
     
     OPENAI_API_KEY: str = ""
     EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100_000
+    EMBEDDING_BATCH_MAX_INPUTS: int = 256
+    EMBEDDING_MAX_INPUT_TOKENS: int = 8191
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    
+    EMBEDDING_CACHE_BACKEND: str = "redis"  # "redis", "disk" or "none"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 1_000_000
+    EMBEDDING_CACHE_TTL: int = 30 * 24 * 60 * 60
+    EMBEDDING_CACHE_PATH: str = "./embedding_cache.sqlite3"
+    QUERY_EMBEDDING_CACHE_BACKEND: str = "memory"  # "memory", "redis" or "none"
+    QUERY_EMBEDDING_CACHE_MAX_ENTRIES: int = 10_000
+    QUERY_EMBEDDING_CACHE_TTL: int = 60 * 60
     LLM_MODEL: str = "gpt-3.5-turbo"
+    RESPONSE_CACHE_BACKEND: str = "none"  # "none", "memory" or "redis"
+    RESPONSE_CACHE_SIMILARITY: float = 0.97
+    RESPONSE_CACHE_TTL: int = 24 * 60 * 60
+    RESPONSE_CACHE_ENTRIES_PER_KEY: int = 20
+    RESPONSE_CACHE_MAX_KEYS: int = 10_000
+    CHAT_MAX_PROMPT_TOKENS: int = 3000
+    CHAT_MAX_HISTORY_TOKENS: int = 1000
+    CHAT_HISTORY_MAX_MESSAGES: int = 50
+    CHAT_SUMMARY_MAX_TOKENS: int = 300
+    # Seconds per chat stage; stages without an entry have no timeout.
+    # Lexical search, the corpus version and the cache lookup are skipped
+    # when they time out, the other stages fail the request.
+    CHAT_STAGE_TIMEOUTS: Dict[str, float] = {
+        "history": 2.0,
+        "query_embedding": 10.0,
+        "vector_search": 5.0,
+        "lexical_search": 2.0,
+        "corpus_version": 1.0,
+        "fusion": 5.0,
+        "context": 5.0,
+        "cache_lookup": 1.0,
+        "completion": 60.0,
+    }
+    CHAT_BATCH_MAX_QUESTIONS: int = 200
+    CHAT_BATCH_CONCURRENCY: int = 8
+    CHAT_CONTEXT_CANDIDATES: int = 20
+    CHAT_CONTEXT_MIN_SIMILARITY: float = 0.2
+    CHAT_MMR_LAMBDA: float = 0.7
+    CHAT_DUPLICATE_SIMILARITY: float = 0.95
+    OPENAI_TIMEOUT: float = 60.0
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    # Client-side limits per model and process, in requests ("rpm") and
+    # estimated tokens ("tpm") per minute. Models without an entry are not
+    # limited.
+    OPENAI_RATE_LIMITS: Dict[str, Dict[str, int]] = {
+        "gpt-3.5-turbo": {"rpm": 3500, "tpm": 160_000},
+        "text-embedding-3-small": {"rpm": 3000, "tpm": 1_000_000},
+    }
+    OPENAI_MAX_RETRIES: int = 4
+    OPENAI_RETRY_BASE_DELAY: float = 0.5
+    OPENAI_RETRY_MAX_DELAY: float = 20.0
+    OPENAI_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    OPENAI_CIRCUIT_RESET_TIMEOUT: float = 30.0
+    # Seconds before a slow request is duplicated; 0 disables hedging.
+    OPENAI_HEDGE_DELAY: float = 0.0
+    SERVICE_WARMUP_ENABLED: bool = True
+    
+    VECTOR_STORE_BACKEND: str = "chroma"  # "chroma", "pgvector" or "numpy"
+    VECTOR_STORE_EXECUTOR_WORKERS: int = 4
+    VECTOR_STORE_EXECUTOR_QUEUE_SIZE: int = 64
+    VECTOR_PARTITION_MODE: str = "global"  # "global", "owner" or "bucket"
+    VECTOR_PARTITION_BUCKETS: int = 64
+    EMBEDDING_DIMENSIONS: int = 1536
+    VECTOR_QUANTIZATION: str = "none"  # "none" or "float16" (pgvector); int8 is benchmark-only
+    VECTOR_QUANTIZATION_COLLECTIONS: Dict[str, str] = {}  # per-collection overrides
+    VECTOR_RESCORE_OVERSAMPLE: int = 4
+    VECTOR_RESCORE_DIRECTORY: str = ""  # memory-maps full-precision vectors (numpy backend)
+    VECTOR_COARSE_DIMENSIONS: int = 0  # truncated first-pass index, e.g. 256; 0 disables it
+    VECTOR_COARSE_CANDIDATES: int = 100
+    
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_SEARCH_CANDIDATES: int = 20  # ranked per side before fusion
+    RRF_K: int = 60
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    LEXICAL_MAX_QUERY_TERMS: int = 32
+    LEXICAL_MAX_DOCUMENT_FREQUENCY: float = 0.5  # skip terms in more than half the chunks
+    LEXICAL_STATS_TTL: int = 60
     
     CHROMA_PERSIST_DIRECTORY: str = "./chromadb"
+    CHROMA_HOST: str = ""  # connects to a Chroma server instead of the local directory
+    CHROMA_PORT: int = 8000
     CHROMA_COLLECTION_NAME: str = "documents"
     
+    UPLOAD_DIRECTORY: str = "./uploads"
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
-    ALLOWED_EXTENSIONS: set[str] = {".pdf", ".txt", ".doc", ".docx"}
+    BULK_UPLOAD_MAX_SIZE: int = 500 * 1024 * 1024  # 500MB
+    BULK_UPLOAD_MAX_FILES: int = 1000
+    ALLOWED_EXTENSIONS: set[str] = {
+        ".pdf", ".txt", ".doc", ".docx", ".jpg", ".jpeg", ".png", ".tiff"
+    }
+    
+    EXTRACTION_POOL_WORKERS: int = 0  # 0 uses one process per CPU
+    PDF_PAGES_PER_TASK: int = 20
+    PDF_PAGE_TIMEOUT: float = 30.0
+    TEXT_READ_BLOCK_SIZE: int = 256 * 1024
+    CHUNK_SIZE_TOKENS: int = 256
+    CHUNK_OVERLAP_TOKENS: int = 50
+    STREAM_SPLIT_WINDOW: int = 64_000
+    INGEST_CHUNK_BATCH_SIZE: int = 256
+    BULK_INGEST_CONCURRENCY: int = 4
+    BULK_INGEST_TASK_SIZE: int = 50
+    DOCUMENT_CONTENT_PREVIEW_CHARS: int = 10_000
+    
+    OCR_ENABLED: bool = True
+    OCR_LANGUAGE: str = "eng"
+    OCR_TARGET_DPI: int = 300
+    OCR_BINARIZE_THRESHOLD: int = 128
+    OCR_PAGE_TIMEOUT: float = 60.0
     
     CORS_ORIGINS: list[str] = ["http://localhost:3000", "http://localhost:5173"]
     
     CELERY_BROKER_URL: str = "redis://localhost:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/0"
+    CELERY_TASK_TIME_LIMIT: int = 30 * 60
+    CELERY_WORKER_PREFETCH_MULTIPLIER: int = 1
     
     LOG_LEVEL: str = "INFO"
+    DEBUG: bool = False
     
     class Config:
         env_file = ".env"
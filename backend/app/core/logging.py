@@ -27,6 +27,27 @@ DOCUMENT_PROCESSING_DURATION = Histogram(
     ['file_type']
 )
 
+EXTRACTION_POOL_WORKERS = Gauge(
+    'extraction_pool_workers',
+    'Worker processes in the extraction process pool'
+)
+
+EXTRACTION_POOL_IN_FLIGHT = Gauge(
+    'extraction_pool_in_flight_tasks',
+    'Extraction tasks submitted to the process pool and not yet finished'
+)
+
+EXTRACTION_POOL_QUEUE_WAIT = Histogram(
+    'extraction_pool_queue_wait_seconds',
+    'Time extraction tasks wait for a free worker process'
+)
+
+EXTRACTION_PAGE_TIMEOUTS = Counter(
+    'extraction_page_timeouts_total',
+    'Pages skipped because extraction exceeded the per-page timeout',
+    ['file_type']
+)
+
 CHAT_REQUESTS = Counter(
     'chat_requests_total',
     'Total chat requests',
@@ -38,6 +59,118 @@ EMBEDDING_GENERATION_DURATION = Histogram(
     'Embedding generation duration in seconds'
 )
 
+EMBEDDING_CACHE_REQUESTS = Counter(
+    'embedding_cache_requests_total',
+    'Embedding cache lookups',
+    ['backend', 'result']
+)
+
+EMBEDDING_CACHE_EVICTIONS = Counter(
+    'embedding_cache_evictions_total',
+    'Embedding cache entries evicted to stay within the size bound',
+    ['backend']
+)
+
+QUERY_EMBEDDING_CACHE_REQUESTS = Counter(
+    'query_embedding_cache_requests_total',
+    'Query embedding cache lookups by cache layer',
+    ['layer', 'result']
+)
+
+QUERY_EMBEDDING_CACHE_ENTRIES = Gauge(
+    'query_embedding_cache_entries',
+    'Query embeddings held in the in-process cache'
+)
+
+RESPONSE_CACHE_REQUESTS = Counter(
+    'chat_response_cache_requests_total',
+    'Chat answers served from, missed in or bypassing the response cache',
+    ['result']
+)
+
+CHAT_STAGE_DURATION = Histogram(
+    'chat_stage_duration_seconds',
+    'Duration of each stage of a chat turn in seconds',
+    ['stage'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+CHAT_STAGE_TIMEOUTS = Counter(
+    'chat_stage_timeouts_total',
+    'Chat turn stages that exceeded their timeout',
+    ['stage']
+)
+
+
+OPENAI_REQUESTS = Counter(
+    'openai_requests_total',
+    'HTTP requests sent to the OpenAI API',
+    ['endpoint', 'status']
+)
+
+OPENAI_REQUEST_DURATION = Histogram(
+    'openai_request_duration_seconds',
+    'OpenAI API request duration in seconds',
+    ['endpoint']
+)
+
+OPENAI_REQUESTS_IN_FLIGHT = Gauge(
+    'openai_requests_in_flight',
+    'OpenAI API requests waiting for a response'
+)
+
+OPENAI_POOL_CONNECTIONS = Gauge(
+    'openai_pool_connections',
+    'Connections held in the shared OpenAI HTTP pool',
+    ['state']
+)
+
+OPENAI_RATE_LIMIT_WAIT = Histogram(
+    'openai_rate_limit_wait_seconds',
+    'Time OpenAI requests wait for the client-side rate limits',
+    ['model'],
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+OPENAI_RETRIES = Counter(
+    'openai_retries_total',
+    'OpenAI API requests retried, by reason',
+    ['endpoint', 'reason']
+)
+
+OPENAI_CIRCUIT_OPEN = Gauge(
+    'openai_circuit_open',
+    'Whether the OpenAI circuit breaker is rejecting requests'
+)
+
+OPENAI_CIRCUIT_REJECTIONS = Counter(
+    'openai_circuit_rejections_total',
+    'OpenAI API requests rejected while the circuit breaker was open',
+    ['endpoint']
+)
+
+OPENAI_HEDGED_REQUESTS = Counter(
+    'openai_hedged_requests_total',
+    'Slow OpenAI API requests duplicated, by which copy answered first',
+    ['endpoint', 'winner']
+)
+
+VECTOR_COLLECTION_ITEMS = Gauge(
+    'vector_collection_items',
+    'Vectors stored in the document collection'
+)
+
+VECTOR_STORE_OPERATION_DURATION = Histogram(
+    'vector_store_operation_duration_seconds',
+    'Vector store operation duration in seconds, including executor queueing',
+    ['backend', 'operation']
+)
+
+VECTOR_STORE_QUEUE_DEPTH = Gauge(
+    'vector_store_queue_depth',
+    'Vector store operations running or queued on the store executor',
+    ['backend']
+)
 
 def setup_logging() -> None:
     structlog.configure(
@@ -0,0 +1,55 @@
+from typing import Dict
+from fastapi import HTTPException, status
+from starlette.responses import JSONResponse
+
+# Allowance for multipart boundaries and part headers on top of the file.
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    def __init__(self, app, limits: Dict[str, int]):
+        # Maps path prefixes to body size limits; the longest matching
+        # prefix wins.
+        self.app = app
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+    
+    async def __call__(self, scope, receive, send):
+        max_body_size = None
+        if scope["type"] == "http" and scope["method"] in ("POST", "PUT"):
+            max_body_size = next(
+                (limit for prefix, limit in self.limits if scope["path"].startswith(prefix)),
+                None
+            )
+        if max_body_size is None:
+            await self.app(scope, receive, send)
+            return
+        
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and int(content_length) > max_body_size:
+            response = JSONResponse(
+                {"detail": self._detail(max_body_size)},
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    # Raised while the form is being parsed, so the request
+                    # is rejected before the rest of the body is spooled.
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=self._detail(max_body_size)
+                    )
+            return message
+        
+        await self.app(scope, limited_receive, send)
+    
+    def _detail(self, max_body_size: int) -> str:
+        return f"Request body exceeds the {max_body_size} byte limit"
@@ -9,6 +9,15 @@ from app.core.config import settings
 from app.api.api_v1.api import api_router
 from app.core.database import engine, Base
 from app.core.logging import setup_logging, MetricsMiddleware, log_request_response
+from app.core.uploads import UploadSizeLimitMiddleware, MULTIPART_OVERHEAD
+from app.services.chat_service import ChatService
+from app.services.chunk_search import ensure_search_index
+from app.services.conversation_memory import ensure_memory_columns
+from app.services.embedding_service import EmbeddingService
+from app.services.extraction_pool import shutdown_process_pool
+from app.services.ingestion_service import ensure_document_columns
+from app.services.lexical_index import LexicalIndex
+from app.services.openai_client import create_openai_client
 
 setup_logging()
 logger = structlog.get_logger()
@@ -19,8 +28,30 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up DocIntell API", version=settings.VERSION)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await ensure_search_index(conn)
+        await ensure_memory_columns(conn)
+        await ensure_document_columns(conn)
+    
+    # One OpenAI client (and HTTP connection pool) and one vector store
+    # handle are shared by every request.
+    openai_client = create_openai_client()
+    embedding_service = EmbeddingService(client=openai_client)
+    if settings.SERVICE_WARMUP_ENABLED:
+        await embedding_service.warm_up()
+    app.state.embedding_service = embedding_service
+    app.state.lexical_index = LexicalIndex()
+    app.state.chat_service = ChatService(
+        embedding_service=embedding_service,
+        client=openai_client,
+        lexical_index=app.state.lexical_index
+    )
+    
     yield
+    
     logger.info("Shutting down DocIntell API")
+    await app.state.chat_service.close()
+    await embedding_service.close()
+    shutdown_process_pool()
 
 
 app = FastAPI(
@@ -40,6 +71,14 @@ app.add_middleware(
 
 app.add_middleware(MetricsMiddleware)
 
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        f"{settings.API_V1_STR}/documents": settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD,
+        f"{settings.API_V1_STR}/documents/bulk": settings.BULK_UPLOAD_MAX_SIZE + MULTIPART_OVERHEAD,
+    },
+)
+
 @app.middleware("http")
 async def logging_middleware(request: Request, call_next):
     start_time = time.time()
@@ -1,5 +1,5 @@
 from app.models.user import User
-from app.models.document import Document, DocumentChunk
+from app.models.document import Document, DocumentChunk, ChunkTerm
 from app.models.conversation import Conversation, Message
 
-__all__ = ["User", "Document", "DocumentChunk", "Conversation", "Message"]
\ No newline at end of file
+__all__ = ["User", "Document", "DocumentChunk", "ChunkTerm", "Conversation", "Message"]
\ No newline at end of file
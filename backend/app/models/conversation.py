@@ -15,6 +15,10 @@ class Conversation(Base):
     title = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Rolling summary of the messages up to summary_until; newer messages
+    # are sent to the model verbatim.
+    summary = Column(Text)
+    summary_until = Column(DateTime(timezone=True))
     
     user = relationship("User", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan", order_by="Message.created_at")
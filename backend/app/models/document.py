@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, JSON, PrimaryKeyConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
@@ -14,6 +14,7 @@ class Document(Base):
     filename = Column(String, nullable=False)
     file_type = Column(String, nullable=False)
     file_size = Column(Integer, nullable=False)
+    file_path = Column(String)
     content = Column(Text)
     metadata = Column(JSON, default={})
     
@@ -24,6 +25,7 @@ class Document(Base):
     processed_at = Column(DateTime(timezone=True))
     
     processing_status = Column(String, default="pending")
+    processing_progress = Column(Integer, default=0)
     error_message = Column(Text)
     
     owner = relationship("User", back_populates="documents")
@@ -37,9 +39,24 @@ class DocumentChunk(Base):
     document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
     chunk_index = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
+    content_hash = Column(String(64), index=True)
     embedding_id = Column(String)
     tokens = Column(Integer)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    document = relationship("Document", back_populates="chunks")
\ No newline at end of file
+    document = relationship("Document", back_populates="chunks")
+
+
+class ChunkTerm(Base):
+    # BM25 postings: one row per distinct term of a chunk. The owner leads
+    # the key so lexical search only reads the caller's postings.
+    __tablename__ = "chunk_terms"
+    __table_args__ = (PrimaryKeyConstraint("owner_id", "term", "chunk_id"),)
+    
+    owner_id = Column(Integer, nullable=False)
+    term = Column(String(64), nullable=False)
+    chunk_id = Column(UUID(as_uuid=True), ForeignKey("document_chunks.id", ondelete="CASCADE"), nullable=False, index=True)
+    document_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    frequency = Column(Integer, nullable=False)
+    chunk_length = Column(Integer, nullable=False)
@@ -7,6 +7,7 @@ from typing import List, Dict, Any, Optional
 class ChatRequest(BaseModel):
     message: str
     conversation_id: Optional[UUID] = None
+    bypass_cache: bool = False
 
 
 class ChatSource(BaseModel):
@@ -19,6 +20,27 @@ class ChatResponse(BaseModel):
     conversation_id: UUID
     message: str
     sources: List[ChatSource]
+    cached: bool = False
+    # Milliseconds per stage, only returned when DEBUG is enabled.
+    timings: Optional[Dict[str, float]] = None
+
+
+class BatchChatRequest(BaseModel):
+    questions: List[str]
+    bypass_cache: bool = False
+
+
+class BatchAnswer(BaseModel):
+    question: str
+    message: Optional[str] = None
+    sources: List[ChatSource]
+    cached: bool = False
+    error: Optional[str] = None
+
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchAnswer]
+    timings: Optional[Dict[str, float]] = None
 
 
 class MessageResponse(BaseModel):
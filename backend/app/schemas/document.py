@@ -1,7 +1,7 @@
 from pydantic import BaseModel
 from datetime import datetime
 from uuid import UUID
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Literal
 
 
 class DocumentChunkResponse(BaseModel):
@@ -26,6 +26,7 @@ class DocumentResponse(DocumentBase):
     content: str | None
     metadata: Dict[str, Any]
     processing_status: str
+    processing_progress: int | None = None
     error_message: str | None
     created_at: datetime
     updated_at: datetime | None
@@ -43,4 +44,46 @@ class DocumentListResponse(DocumentBase):
     metadata: Dict[str, Any]
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class DocumentStatusResponse(BaseModel):
+    id: UUID
+    filename: str
+    processing_status: str
+    processing_progress: int | None
+    error_message: str | None
+    processed_at: datetime | None
+    
+    class Config:
+        from_attributes = True
+
+
+class ChunkSearchResult(BaseModel):
+    chunk_id: UUID
+    document_id: UUID
+    filename: str
+    chunk_index: int
+    snippet: str  # HTML-escaped, matches wrapped in <mark>
+    rank: float
+
+
+class ChunkSearchResponse(BaseModel):
+    query: str
+    total: int
+    page: int
+    page_size: int
+    results: List[ChunkSearchResult]
+
+
+class BulkUploadItem(BaseModel):
+    filename: str
+    status: Literal["queued", "rejected"]
+    document_id: UUID | None = None
+    error: str | None = None
+
+
+class BulkUploadResponse(BaseModel):
+    queued: int
+    rejected: int
+    items: List[BulkUploadItem]
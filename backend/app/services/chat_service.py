@@ -1,11 +1,31 @@
-from typing import List, Dict, Any
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import AsyncIterator, List, Dict, Any
+import anyio
 import openai
 import structlog
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
 from app.core.config import settings
+from app.core.logging import RESPONSE_CACHE_REQUESTS
+from app.services.context_builder import (
+    PackedContext,
+    context_candidates,
+    pack_context,
+    select_context,
+)
+from app.services.conversation_memory import history_tokens, load_memory
 from app.services.embedding_service import EmbeddingService
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from app.services.response_cache import (
+    ResponseCache,
+    corpus_version,
+    create_response_cache,
+    response_cache_key,
+)
+from app.services.stage_timer import StageTimeout, StageTimer
 from app.models.conversation import Conversation, Message
 from app.models.user import User
 
@@ -13,9 +33,21 @@ logger = structlog.get_logger()
 
 
 class ChatService:
-    def __init__(self):
-        self.client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        self.embedding_service = EmbeddingService()
+    def __init__(
+        self,
+        embedding_service: EmbeddingService | None = None,
+        client: openai.AsyncOpenAI | None = None,
+        lexical_index: LexicalIndex | None = None,
+        response_cache: ResponseCache | None = None
+    ):
+        self.embedding_service = embedding_service or EmbeddingService(client=client)
+        self.client = client or self.embedding_service.client
+        self.lexical_index = lexical_index or LexicalIndex()
+        self.response_cache = response_cache or create_response_cache()
+    
+    async def close(self):
+        if self.response_cache:
+            await self.response_cache.close()
     
     async def generate_response(
         self,
@@ -23,35 +55,25 @@ class ChatService:
         conversation_id: str,
         user_id: int,
         db: AsyncSession,
-        max_context_chunks: int = 5
+        max_context_chunks: int | None = None,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         try:
-            relevant_docs = await self.embedding_service.search_similar_documents(
-                query=user_message,
-                n_results=max_context_chunks,
-                document_filter={"owner_id": user_id}
-            )
-            
-            context = "\n\n".join([
-                f"Document: {doc}" 
-                for doc in relevant_docs["documents"]
-            ])
-            
-            conversation_history = await self._get_conversation_history(
-                conversation_id, db
-            )
-            
-            system_prompt = self._build_system_prompt(context)
-            messages = self._build_messages(system_prompt, conversation_history, user_message)
-            
-            response = await self.client.chat.completions.create(
-                model=settings.LLM_MODEL,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1000
+            turn = await self._prepare_turn(
+                user_message, conversation_id, user_id, db, max_context_chunks, use_cache
             )
             
-            assistant_message = response.choices[0].message.content
+            assistant_message = turn["cached_response"]
+            if assistant_message is None:
+                response = await turn["timer"].run("completion", self.client.chat.completions.create(
+                    model=settings.LLM_MODEL,
+                    messages=turn["messages"],
+                    temperature=0.7,
+                    max_tokens=1000
+                ))
+                
+                assistant_message = response.choices[0].message.content
+                await self._cache_response(turn, assistant_message)
             
             await self._save_messages(
                 conversation_id, user_message, assistant_message, db
@@ -59,26 +81,409 @@ class ChatService:
             
             return {
                 "response": assistant_message,
-                "sources": [
-                    {
-                        "content": doc,
-                        "metadata": meta,
-                        "similarity": 1 - distance
-                    }
-                    for doc, meta, distance in zip(
-                        relevant_docs["documents"],
-                        relevant_docs["metadatas"],
-                        relevant_docs["distances"]
-                    )
-                ]
+                "cached": turn["cached_response"] is not None,
+                "sources": turn["sources"],
+                "compact_history": self._history_overflows(turn, user_message, assistant_message),
+                "timings": turn["timer"].breakdown() if settings.DEBUG else None
             }
         
         except Exception as e:
             logger.error("Chat response generation failed", error=str(e))
             raise
     
-    def _build_system_prompt(self, context: str) -> str:
-        return f"""You are an AI assistant that helps users understand and analyze their documents. 
+    async def stream_response(
+        self,
+        user_message: str,
+        conversation_id: str,
+        user_id: int,
+        db: AsyncSession,
+        max_context_chunks: int | None = None,
+        use_cache: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # Yields {"event", "data"} dicts: the sources once retrieval is done,
+        # then the answer as it is generated. The answer is saved when the
+        # stream ends, including the part generated before a cancellation;
+        # closing the generator closes the upstream request. The final "done"
+        # event also carries "compact_history" for the caller.
+        try:
+            turn = await self._prepare_turn(
+                user_message, conversation_id, user_id, db, max_context_chunks, use_cache
+            )
+            cached = turn["cached_response"] is not None
+            yield {"event": "sources", "data": {"sources": turn["sources"], "cached": cached}}
+            
+            if cached:
+                await self._save_messages(conversation_id, user_message, turn["cached_response"], db)
+                yield {"event": "token", "data": {"content": turn["cached_response"]}}
+                yield {
+                    "event": "done",
+                    "data": self._done_data(turn, cached=True),
+                    "compact_history": self._history_overflows(turn, user_message, turn["cached_response"])
+                }
+                return
+            
+            timer = turn["timer"]
+            stream = await timer.run("completion", self.client.chat.completions.create(
+                model=settings.LLM_MODEL,
+                messages=turn["messages"],
+                temperature=0.7,
+                max_tokens=1000,
+                stream=True
+            ))
+            parts: List[str] = []
+            completed = False
+            started = time.perf_counter()
+            try:
+                async for chunk in stream:
+                    content = chunk.choices[0].delta.content if chunk.choices else None
+                    if content:
+                        if not parts:
+                            timer.record("first_token", time.perf_counter() - started)
+                        parts.append(content)
+                        yield {"event": "token", "data": {"content": content}}
+                completed = True
+            finally:
+                timer.record("stream", time.perf_counter() - started)
+                # A disconnect cancels the surrounding scope, so cleanup is
+                # shielded to finish closing the request and saving the answer.
+                with anyio.CancelScope(shield=True):
+                    await stream.close()
+                    if parts:
+                        await self._save_messages(conversation_id, user_message, "".join(parts), db)
+                    if completed:
+                        await self._cache_response(turn, "".join(parts))
+                    else:
+                        logger.info("Chat stream ended early", conversation_id=conversation_id, chunks=len(parts))
+            
+            yield {
+                "event": "done",
+                "data": self._done_data(turn, cached=False),
+                "compact_history": self._history_overflows(turn, user_message, "".join(parts))
+            }
+        
+        except Exception as e:
+            logger.error("Chat response streaming failed", error=str(e))
+            raise
+    
+    async def answer_batch(
+        self,
+        questions: List[str],
+        user_id: int,
+        db: AsyncSession,
+        max_context_chunks: int | None = None,
+        use_cache: bool = True
+    ) -> Dict[str, Any]:
+        # Stand-alone answers to many questions over the same documents. The
+        # questions are embedded in one request and searched with one vector
+        # query, then answered concurrently, at most CHAT_BATCH_CONCURRENCY
+        # at a time. Nothing is saved to a conversation, and a failed answer
+        # is reported in its own result. Results keep the input order.
+        timer = StageTimer()
+        n_results = max(settings.CHAT_CONTEXT_CANDIDATES, max_context_chunks or 0)
+        hybrid = settings.HYBRID_SEARCH_ENABLED
+        depth = max(n_results, settings.HYBRID_SEARCH_CANDIDATES) if hybrid else n_results
+        
+        async def database_branch():
+            keyword = [
+                await self._lexical_search(question, user_id, db, depth, timer) if hybrid else None
+                for question in questions
+            ]
+            version = None
+            if self.response_cache and use_cache:
+                try:
+                    version = await timer.run("corpus_version", corpus_version(db, user_id))
+                except StageTimeout:
+                    await db.rollback()
+            return keyword, version
+        
+        async def vector_branch():
+            embeddings = await timer.run(
+                "query_embedding", self.embedding_service.embed_queries(questions)
+            )
+            vectors = await timer.run(
+                "vector_search",
+                self.embedding_service.search_by_embeddings(embeddings, depth, {"owner_id": user_id})
+            )
+            return embeddings, vectors
+        
+        try:
+            async with asyncio.TaskGroup() as group:
+                database = group.create_task(database_branch())
+                dense = group.create_task(vector_branch())
+        except ExceptionGroup as error:
+            raise error.exceptions[0]
+        keyword, version = database.result()
+        embeddings, vectors = dense.result()
+        
+        fused = await timer.run("fusion", asyncio.gather(*(
+            self._fuse(vector, lexical, embedding, user_id, n_results)
+            for vector, lexical, embedding in zip(vectors, keyword, embeddings)
+        )))
+        packed = await timer.run("context", asyncio.gather(*(
+            self.build_context(results, user_id, [], question, max_context_chunks)
+            for results, question in zip(fused, questions)
+        )))
+        
+        semaphore = asyncio.Semaphore(settings.CHAT_BATCH_CONCURRENCY)
+        
+        async def answer(question: str, context: PackedContext, embedding: List[float]) -> Dict[str, Any]:
+            result = {
+                "question": question,
+                "response": None,
+                "cached": False,
+                "sources": self._sources(context),
+                "error": None,
+            }
+            turn = {
+                "cache_key": (
+                    response_cache_key(user_id, version, [chunk.id for chunk in context.chunks])
+                    if version is not None else None
+                ),
+                "query_embedding": embedding,
+            }
+            try:
+                if turn["cache_key"] is not None:
+                    result["response"] = await timer.run(
+                        "cache_lookup", self._cached_response(turn["cache_key"], embedding)
+                    )
+                    result["cached"] = result["response"] is not None
+                if result["response"] is None:
+                    async with semaphore:
+                        response = await timer.run("completion", self.client.chat.completions.create(
+                            model=settings.LLM_MODEL,
+                            messages=self._build_messages(
+                                self._build_system_prompt(context.context), context.history, question
+                            ),
+                            temperature=0.7,
+                            max_tokens=1000
+                        ))
+                    result["response"] = response.choices[0].message.content
+                    await self._cache_response(turn, result["response"])
+            except Exception as e:
+                logger.warning("Batch question failed", error=str(e))
+                result["error"] = str(e)
+            return result
+        
+        results = await asyncio.gather(*(
+            answer(question, context, embedding)
+            for question, context, embedding in zip(questions, packed, embeddings)
+        ))
+        logger.info(
+            "Chat batch answered",
+            questions=len(questions),
+            failed=sum(1 for result in results if result["error"])
+        )
+        return {
+            "results": results,
+            "timings": timer.breakdown() if settings.DEBUG else None
+        }
+    
+    def _sources(self, packed: PackedContext) -> List[Dict[str, Any]]:
+        return [
+            {
+                "content": chunk.content,
+                "metadata": chunk.metadata,
+                "similarity": chunk.similarity
+            }
+            for chunk in packed.chunks
+        ]
+    
+    def _done_data(self, turn: Dict[str, Any], cached: bool) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"cached": cached}
+        if settings.DEBUG:
+            data["timings"] = turn["timer"].breakdown()
+        return data
+    
+    async def _prepare_turn(
+        self,
+        user_message: str,
+        conversation_id: str,
+        user_id: int,
+        db: AsyncSession,
+        max_context_chunks: int | None,
+        use_cache: bool
+    ) -> Dict[str, Any]:
+        # Everything before the completion call. The session cannot run
+        # statements concurrently, so the stages that use it form one branch
+        # while the query embedding and vector search run beside it.
+        timer = StageTimer()
+        n_results = max(settings.CHAT_CONTEXT_CANDIDATES, max_context_chunks or 0)
+        hybrid = settings.HYBRID_SEARCH_ENABLED
+        depth = max(n_results, settings.HYBRID_SEARCH_CANDIDATES) if hybrid else n_results
+        check_cache = bool(self.response_cache and use_cache)
+        
+        async def database_branch():
+            memory = await timer.run("history", load_memory(db, conversation_id))
+            keyword = (
+                await self._lexical_search(user_message, user_id, db, depth, timer) if hybrid else None
+            )
+            # Follow-up answers depend on the conversation, so only opening
+            # questions are answered from the cache.
+            version = None
+            if check_cache and not memory.messages and not memory.summary:
+                try:
+                    version = await timer.run("corpus_version", corpus_version(db, user_id))
+                except StageTimeout:
+                    await db.rollback()
+            return memory, keyword, version
+        
+        async def vector_branch():
+            embedding = await timer.run(
+                "query_embedding", self.embedding_service.embed_query(user_message)
+            )
+            vector = await timer.run(
+                "vector_search",
+                self.embedding_service.search_by_embedding(embedding, depth, {"owner_id": user_id})
+            )
+            return embedding, vector
+        
+        try:
+            async with asyncio.TaskGroup() as group:
+                database = group.create_task(database_branch())
+                dense = group.create_task(vector_branch())
+        except ExceptionGroup as error:
+            raise error.exceptions[0]
+        memory, keyword, version = database.result()
+        query_embedding, vector = dense.result()
+        
+        relevant_docs = await timer.run(
+            "fusion", self._fuse(vector, keyword, query_embedding, user_id, n_results)
+        )
+        packed = await timer.run("context", self.build_context(
+            relevant_docs, user_id, memory.messages, user_message, max_context_chunks, memory.summary
+        ))
+        
+        cache_key = None
+        cached_response = None
+        if version is not None:
+            cache_key = response_cache_key(user_id, version, [chunk.id for chunk in packed.chunks])
+            try:
+                cached_response = await timer.run(
+                    "cache_lookup", self._cached_response(cache_key, query_embedding)
+                )
+            except StageTimeout:
+                pass
+        elif check_cache:
+            RESPONSE_CACHE_REQUESTS.labels(result="bypass").inc()
+        
+        system_prompt = self._build_system_prompt(packed.context, memory.summary)
+        return {
+            "messages": self._build_messages(system_prompt, packed.history, user_message),
+            "sources": self._sources(packed),
+            "cache_key": cache_key,
+            "query_embedding": query_embedding,
+            "cached_response": cached_response,
+            "history_tokens": history_tokens(memory.messages),
+            "timer": timer,
+        }
+    
+    async def build_context(
+        self,
+        results: Dict[str, list],
+        user_id: int,
+        history: List[Dict[str, str]],
+        user_message: str,
+        max_chunks: int | None = None,
+        summary: str | None = None
+    ) -> PackedContext:
+        # Retrieved chunks are cut off by similarity, deduplicated with MMR
+        # and packed with the history into the prompt token budget.
+        candidates = context_candidates(results)
+        embeddings = (
+            await self.embedding_service.embeddings_for_ids(
+                [chunk.id for chunk in candidates], user_id
+            )
+            if len(candidates) > 1 else {}
+        )
+        chunks = select_context(candidates, embeddings, max_chunks)
+        return pack_context(
+            partial(self._build_system_prompt, summary=summary), history, user_message, chunks
+        )
+    
+    async def _lexical_search(
+        self,
+        query: str,
+        user_id: int,
+        db: AsyncSession,
+        depth: int,
+        timer: StageTimer | None = None
+    ) -> Dict[str, list] | None:
+        # Retrieval falls back to the dense ranking alone when BM25 fails or
+        # times out.
+        try:
+            return await (timer or StageTimer()).run(
+                "lexical_search", self.lexical_index.search(db, query, user_id, depth)
+            )
+        except Exception as e:
+            logger.warning("Lexical search failed", error=str(e))
+            await db.rollback()
+            return None
+    
+    async def _fuse(
+        self,
+        vector: Dict[str, list],
+        keyword: Dict[str, list] | None,
+        query_embedding: List[float],
+        user_id: int,
+        n_results: int
+    ) -> Dict[str, list]:
+        if not keyword or not keyword["ids"]:
+            return {key: values[:n_results] for key, values in vector.items()}
+        
+        items = {
+            id_: (document, metadata, distance)
+            for id_, document, metadata, distance in zip(
+                vector["ids"], vector["documents"], vector["metadatas"], vector["distances"]
+            )
+        }
+        for id_, document, metadata in zip(keyword["ids"], keyword["documents"], keyword["metadatas"]):
+            items.setdefault(id_, (document, metadata, None))
+        
+        fused = reciprocal_rank_fusion([vector["ids"], keyword["ids"]], settings.RRF_K)[:n_results]
+        distances = await self.embedding_service.distances_for_ids(
+            query_embedding,
+            [id_ for id_ in fused if items[id_][2] is None],
+            user_id
+        )
+        
+        keyword_ids = set(keyword["ids"])
+        return {
+            "ids": fused,
+            "documents": [items[id_][0] for id_ in fused],
+            "metadatas": [items[id_][1] for id_ in fused],
+            "distances": [
+                items[id_][2] if items[id_][2] is not None else distances.get(id_, 1.0)
+                for id_ in fused
+            ],
+            # Chunks ranked by the keyword search bypass the similarity cutoff.
+            "lexical": [id_ in keyword_ids for id_ in fused]
+        }
+    
+    async def _cached_response(self, key: str, query_embedding: List[float]) -> str | None:
+        try:
+            response = await self.response_cache.lookup(key, query_embedding)
+        except Exception as e:
+            logger.warning("Response cache lookup failed", error=str(e))
+            response = None
+        RESPONSE_CACHE_REQUESTS.labels(result="hit" if response is not None else "miss").inc()
+        return response
+    
+    async def _cache_response(self, turn: Dict[str, Any], response: str):
+        if turn["cache_key"] is None:
+            return
+        try:
+            await self.response_cache.store(turn["cache_key"], turn["query_embedding"], response)
+        except Exception as e:
+            logger.warning("Response cache update failed", error=str(e))
+    
+    def _history_overflows(self, turn: Dict[str, Any], user_message: str, assistant_message: str) -> bool:
+        # Whether the turns since the summary no longer fit the history
+        # budget and the oldest should be folded into the summary.
+        new_turn = [{"content": user_message}, {"content": assistant_message}]
+        return turn["history_tokens"] + history_tokens(new_turn) > settings.CHAT_MAX_HISTORY_TOKENS
+    
+    def _build_system_prompt(self, context: str, summary: str | None = None) -> str:
+        prompt = f"""You are an AI assistant that helps users understand and analyze their documents. 
         Use the following context from the user's documents to answer their questions accurately and helpfully.
         
         Context from documents:
@@ -90,6 +495,12 @@ class ChatService:
         - Be concise but thorough in your responses
         - Cite specific parts of documents when relevant
         - If asked about something not in the context, politely explain the limitation"""
+        if summary:
+            prompt += f"""
+        
+        Summary of the earlier conversation:
+        {summary}"""
+        return prompt
     
     def _build_messages(
         self, 
@@ -99,31 +510,13 @@ class ChatService:
     ) -> List[Dict[str, str]]:
         messages = [{"role": "system", "content": system_prompt}]
         
-        for msg in conversation_history[-10:]:  # Last 10 messages for context
+        for msg in conversation_history:
             messages.append({"role": msg["role"], "content": msg["content"]})
         
         messages.append({"role": "user", "content": user_message})
         
         return messages
     
-    async def _get_conversation_history(
-        self, 
-        conversation_id: str, 
-        db: AsyncSession
-    ) -> List[Dict[str, str]]:
-        result = await db.execute(
-            select(Message)
-            .where(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at)
-            .limit(20)
-        )
-        messages = result.scalars().all()
-        
-        return [
-            {"role": msg.role, "content": msg.content}
-            for msg in messages
-        ]
-    
     async def _save_messages(
         self,
         conversation_id: str,
@@ -131,16 +524,21 @@ class ChatService:
         assistant_message: str,
         db: AsyncSession
     ):
+        # The database clock is fixed for the transaction, which would give
+        # both messages the same timestamp and no defined order.
+        created_at = datetime.now(timezone.utc)
         user_msg = Message(
             conversation_id=conversation_id,
             role="user",
-            content=user_message
+            content=user_message,
+            created_at=created_at
         )
         
         assistant_msg = Message(
             conversation_id=conversation_id,
             role="assistant",
-            content=assistant_message
+            content=assistant_message,
+            created_at=created_at + timedelta(microseconds=1)
         )
         
         db.add(user_msg)
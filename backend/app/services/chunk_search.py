@@ -0,0 +1,155 @@
+import html
+import re
+import uuid
+from typing import Any, Dict, List, Tuple
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.models.document import Document, DocumentChunk
+
+SEARCH_CONFIG = "english"
+# ts_headline output is escaped before highlighting, so the markers must
+# survive html.escape and cannot occur in ordinary text.
+START_MARKER = "[[mark]]"
+STOP_MARKER = "[[/mark]]"
+HEADLINE_OPTIONS = (
+    f'StartSel="{START_MARKER}", StopSel="{STOP_MARKER}", '
+    'MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=" ... "'
+)
+FALLBACK_SCAN_LIMIT = 1000
+SNIPPET_CHARS = 200
+
+
+async def ensure_search_index(conn: AsyncConnection):
+    # create_all does not add columns to existing tables, so the generated
+    # tsvector column and its GIN index are added here. The first run
+    # rewrites document_chunks once.
+    if conn.dialect.name != "postgresql":
+        return
+    await conn.execute(text(
+        "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', content)) STORED"
+    ))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_document_chunks_content_tsv "
+        "ON document_chunks USING gin (content_tsv)"
+    ))
+
+
+async def search_chunks(
+    db: AsyncSession,
+    owner_id: int,
+    query: str,
+    limit: int,
+    offset: int,
+    document_id: uuid.UUID | None = None
+) -> Tuple[int, List[Dict[str, Any]]]:
+    # Returns (total matches, one page of hits). Postgres uses the GIN index;
+    # other databases (SQLite in development and tests) fall back to a
+    # substring scan.
+    connection = await db.connection()
+    if connection.dialect.name == "postgresql":
+        return await _search_postgres(db, owner_id, query, limit, offset, document_id)
+    return await _search_fallback(db, owner_id, query, limit, offset, document_id)
+
+
+async def _search_postgres(db, owner_id, query, limit, offset, document_id):
+    document_clause = "AND c.document_id = :document_id" if document_id else ""
+    # Headlines are only computed for the rows of the requested page.
+    rows = (await db.execute(
+        text(
+            f"WITH query AS (SELECT websearch_to_tsquery('{SEARCH_CONFIG}', :query) AS q), "
+            "matches AS ("
+            " SELECT c.id, c.document_id, c.chunk_index, c.content, d.filename,"
+            " ts_rank_cd(c.content_tsv, query.q) AS rank, count(*) OVER () AS total"
+            " FROM document_chunks c"
+            " JOIN documents d ON d.id = c.document_id"
+            " CROSS JOIN query"
+            f" WHERE d.owner_id = :owner_id AND c.content_tsv @@ query.q {document_clause}"
+            " ORDER BY rank DESC, c.document_id, c.chunk_index"
+            " LIMIT :limit OFFSET :offset"
+            ") "
+            "SELECT matches.id, matches.document_id, matches.chunk_index, matches.filename,"
+            " matches.rank, matches.total,"
+            f" ts_headline('{SEARCH_CONFIG}', matches.content, query.q, :options) AS snippet"
+            " FROM matches CROSS JOIN query"
+            " ORDER BY matches.rank DESC, matches.document_id, matches.chunk_index"
+        ),
+        {
+            "query": query,
+            "owner_id": owner_id,
+            "document_id": document_id,
+            "limit": limit,
+            "offset": offset,
+            "options": HEADLINE_OPTIONS,
+        }
+    )).all()
+    
+    if rows:
+        total = rows[0].total
+    elif offset:
+        total = (await db.execute(
+            text(
+                "SELECT count(*) FROM document_chunks c JOIN documents d ON d.id = c.document_id "
+                "WHERE d.owner_id = :owner_id "
+                f"AND c.content_tsv @@ websearch_to_tsquery('{SEARCH_CONFIG}', :query) {document_clause}"
+            ),
+            {"query": query, "owner_id": owner_id, "document_id": document_id}
+        )).scalar_one()
+    else:
+        total = 0
+    
+    return total, [
+        {
+            "chunk_id": row.id,
+            "document_id": row.document_id,
+            "filename": row.filename,
+            "chunk_index": row.chunk_index,
+            "snippet": _highlight_markers(row.snippet),
+            "rank": float(row.rank),
+        }
+        for row in rows
+    ]
+
+
+async def _search_fallback(db, owner_id, query, limit, offset, document_id):
+    terms = [term for term in re.findall(r"\w+", query.lower()) if len(term) > 1]
+    if not terms:
+        return 0, []
+    
+    statement = (
+        select(DocumentChunk, Document.filename)
+        .join(Document, Document.id == DocumentChunk.document_id)
+        .where(Document.owner_id == owner_id)
+        .limit(FALLBACK_SCAN_LIMIT)
+    )
+    for term in terms:
+        statement = statement.where(func.lower(DocumentChunk.content).contains(term))
+    if document_id:
+        statement = statement.where(DocumentChunk.document_id == document_id)
+    
+    hits = []
+    for chunk, filename in await db.execute(statement):
+        content = chunk.content.lower()
+        hits.append({
+            "chunk_id": chunk.id,
+            "document_id": chunk.document_id,
+            "filename": filename,
+            "chunk_index": chunk.chunk_index,
+            "snippet": _fallback_snippet(chunk.content, terms),
+            "rank": float(sum(content.count(term) for term in terms)),
+        })
+    hits.sort(key=lambda hit: (-hit["rank"], str(hit["document_id"]), hit["chunk_index"]))
+    return len(hits), hits[offset:offset + limit]
+
+
+def _highlight_markers(snippet: str) -> str:
+    return html.escape(snippet).replace(START_MARKER, "<mark>").replace(STOP_MARKER, "</mark>")
+
+
+def _fallback_snippet(content: str, terms: List[str]) -> str:
+    first = min(content.lower().find(term) for term in terms)
+    start = max(0, first - SNIPPET_CHARS // 4)
+    snippet = content[start:start + SNIPPET_CHARS]
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    return _highlight_markers(pattern.sub(lambda match: f"{START_MARKER}{match.group()}{STOP_MARKER}", snippet))
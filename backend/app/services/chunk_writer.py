@@ -0,0 +1,39 @@
+import uuid
+from typing import Any, Dict, List
+import structlog
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.document import DocumentChunk
+
+logger = structlog.get_logger()
+
+CHUNK_COLUMNS = [
+    "id", "document_id", "chunk_index", "content", "content_hash", "embedding_id", "tokens"
+]
+
+
+class ChunkWriter:
+    # Writes chunk rows in a single round trip: COPY on asyncpg, a batched
+    # executemany INSERT on any other driver. Rows bypass the ORM unit of
+    # work, so no DocumentChunk instances are created or tracked.
+    
+    async def write(self, db: AsyncSession, rows: List[Dict[str, Any]]) -> List[uuid.UUID]:
+        if not rows:
+            return []
+        
+        records = [{**row, "id": row.get("id") or uuid.uuid4()} for row in rows]
+        connection = await db.connection()
+        
+        if connection.dialect.name == "postgresql" and connection.dialect.driver == "asyncpg":
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                DocumentChunk.__tablename__,
+                records=[tuple(record.get(column) for column in CHUNK_COLUMNS) for record in records],
+                columns=CHUNK_COLUMNS
+            )
+        else:
+            await db.execute(insert(DocumentChunk.__table__), records)
+        
+        logger.debug("Chunk rows written", count=len(records))
+        return [record["id"] for record in records]
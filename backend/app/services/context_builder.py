@@ -0,0 +1,190 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+
+from app.core.config import settings
+from app.services.text_chunker import get_encoding
+
+# Per-message framing of the chat format, plus the tokens that prime the
+# assistant's reply.
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_PRIMING_TOKENS = 3
+CONTEXT_SEPARATOR = "\n\n"
+# Shorter matches at a chunk boundary are treated as coincidence.
+MIN_OVERLAP_CHARS = 16
+
+
+@dataclass
+class ContextChunk:
+    id: str
+    content: str
+    metadata: Dict[str, Any]
+    similarity: float
+
+
+@dataclass
+class PackedContext:
+    context: str
+    history: List[Dict[str, str]]
+    # Chunks that made it into the context, in relevance order.
+    chunks: List[ContextChunk] = field(default_factory=list)
+    tokens: int = 0
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding(settings.LLM_MODEL).encode(text, disallowed_special=()))
+
+
+def context_candidates(results: Dict[str, list]) -> List[ContextChunk]:
+    # Chunks below the similarity cutoff are dropped, so a question with a
+    # few strong matches sends only those. Keyword matches are kept: an exact
+    # identifier can match a chunk whose embedding is far from the question.
+    lexical = results.get("lexical") or [False] * len(results["ids"])
+    return [
+        ContextChunk(id_, document, metadata or {}, 1 - distance)
+        for id_, document, metadata, distance, keyword_match in zip(
+            results["ids"], results["documents"], results["metadatas"], results["distances"], lexical
+        )
+        if keyword_match or 1 - distance >= settings.CHAT_CONTEXT_MIN_SIMILARITY
+    ]
+
+
+def select_context(
+    candidates: List[ContextChunk],
+    embeddings: Dict[str, List[float]],
+    limit: Optional[int] = None
+) -> List[ContextChunk]:
+    # Maximal marginal relevance: each pick trades relevance to the query
+    # against similarity to the chunks already picked. Candidates nearly
+    # identical to a picked chunk are dropped outright.
+    if len(candidates) < 2:
+        return candidates[:limit]
+    
+    dimensions = len(next(iter(embeddings.values()), []))
+    vectors = np.zeros((len(candidates), dimensions), dtype=np.float32)
+    for row, chunk in enumerate(candidates):
+        if chunk.id in embeddings:
+            vectors[row] = embeddings[chunk.id]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1.0, norms)
+    pairwise = vectors @ vectors.T
+    relevance = np.array([chunk.similarity for chunk in candidates], dtype=np.float32)
+    
+    weight = settings.CHAT_MMR_LAMBDA
+    remaining = list(range(len(candidates)))
+    picked: List[int] = []
+    while remaining and (limit is None or len(picked) < limit):
+        redundancy = (
+            pairwise[np.ix_(remaining, picked)].max(axis=1) if picked
+            else np.zeros(len(remaining), dtype=np.float32)
+        )
+        keep = redundancy < settings.CHAT_DUPLICATE_SIMILARITY
+        remaining = [index for index, kept in zip(remaining, keep) if kept]
+        if not remaining:
+            break
+        scores = weight * relevance[remaining] - (1 - weight) * redundancy[keep]
+        picked.append(remaining.pop(int(np.argmax(scores))))
+    
+    return [candidates[index] for index in picked]
+
+
+def merge_overlapping(first: str, second: str) -> str:
+    # Consecutive chunks of a document repeat CHUNK_OVERLAP_TOKENS of text;
+    # the repeated part is kept once.
+    anchor = second[:MIN_OVERLAP_CHARS]
+    if len(anchor) < MIN_OVERLAP_CHARS:
+        return f"{first}\n{second}"
+    position = first.find(anchor, max(0, len(first) - len(second)))
+    while position != -1:
+        if second.startswith(first[position:]):
+            return first + second[len(first) - position:]
+        position = first.find(anchor, position + 1)
+    return f"{first}\n{second}"
+
+
+def render_context(chunks: List[ContextChunk]) -> str:
+    # Chunks with consecutive indices in the same document are merged into
+    # one passage, placed where the most relevant of them ranked.
+    groups: List[List[ContextChunk]] = []
+    for chunk in sorted(chunks, key=_document_position):
+        previous = groups[-1][-1] if groups else None
+        if (
+            previous is not None
+            and _document_position(previous)[0] == _document_position(chunk)[0]
+            and _document_position(chunk)[1] == _document_position(previous)[1] + 1
+        ):
+            groups[-1].append(chunk)
+        else:
+            groups.append([chunk])
+    
+    rank = {chunk.id: position for position, chunk in enumerate(chunks)}
+    groups.sort(key=lambda group: min(rank[chunk.id] for chunk in group))
+    
+    passages = []
+    for group in groups:
+        text = group[0].content
+        for chunk in group[1:]:
+            text = merge_overlapping(text, chunk.content)
+        passages.append(f"Document: {text}")
+    return CONTEXT_SEPARATOR.join(passages)
+
+
+def pack_context(
+    system_prompt: Callable[[str], str],
+    history: List[Dict[str, str]],
+    user_message: str,
+    chunks: List[ContextChunk]
+) -> PackedContext:
+    # Fills CHAT_MAX_PROMPT_TOKENS, counted with the model's tokenizer: the
+    # system prompt and the question always go, then the most recent history
+    # up to CHAT_MAX_HISTORY_TOKENS, then context chunks in relevance order.
+    fixed = (
+        count_tokens(system_prompt(""))
+        + count_tokens(user_message)
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+        + REPLY_PRIMING_TOKENS
+    )
+    
+    history_budget = min(settings.CHAT_MAX_HISTORY_TOKENS, settings.CHAT_MAX_PROMPT_TOKENS - fixed)
+    kept_history: List[Dict[str, str]] = []
+    history_tokens = 0
+    for message in reversed(history):
+        cost = count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+        if history_tokens + cost > history_budget:
+            break
+        kept_history.insert(0, message)
+        history_tokens += cost
+    
+    # Per-chunk counts plus a separator are an estimate of the rendered
+    # context; merging can only shorten it, and the total is checked
+    # exactly below.
+    budget = settings.CHAT_MAX_PROMPT_TOKENS - fixed - history_tokens
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR + "Document: ")
+    selected: List[ContextChunk] = []
+    used = 0
+    for chunk in chunks:
+        cost = count_tokens(chunk.content) + separator_tokens
+        if used + cost > budget and count_tokens(render_context(selected + [chunk])) > budget:
+            continue
+        selected.append(chunk)
+        used += cost
+    
+    while True:
+        context = render_context(selected)
+        tokens = (
+            count_tokens(system_prompt(context))
+            + count_tokens(user_message)
+            + 2 * MESSAGE_OVERHEAD_TOKENS
+            + REPLY_PRIMING_TOKENS
+            + history_tokens
+        )
+        if tokens <= settings.CHAT_MAX_PROMPT_TOKENS or not selected:
+            return PackedContext(context, kept_history, selected, tokens)
+        selected.pop()
+
+
+def _document_position(chunk: ContextChunk) -> tuple:
+    return (
+        str(chunk.metadata.get("document_id", chunk.id)),
+        chunk.metadata.get("chunk_index", 0)
+    )
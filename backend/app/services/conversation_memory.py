@@ -0,0 +1,129 @@
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List
+import openai
+import structlog
+from sqlalchemy import DateTime, inspect, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core.config import settings
+from app.models.conversation import Conversation, Message
+from app.services.context_builder import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+logger = structlog.get_logger()
+
+SUMMARY_PROMPT = (
+    "You keep a running summary of a conversation between a user and an assistant "
+    "about the user's documents. Rewrite the summary so it also covers the new "
+    "messages. Keep names, figures, decisions and open questions the user may refer "
+    "back to, and drop small talk. Reply with the summary only, in at most {words} words."
+)
+
+
+@dataclass
+class ConversationMemory:
+    # The rolling summary of compacted turns and the newest turns after it,
+    # oldest first.
+    summary: str | None = None
+    messages: List[Dict[str, str]] = field(default_factory=list)
+
+
+async def ensure_memory_columns(conn: AsyncConnection):
+    # create_all does not add columns to existing tables.
+    columns = await conn.run_sync(
+        lambda sync_conn: {column["name"] for column in inspect(sync_conn).get_columns("conversations")}
+    )
+    if "summary" not in columns:
+        await conn.execute(text("ALTER TABLE conversations ADD COLUMN summary TEXT"))
+    if "summary_until" not in columns:
+        column_type = DateTime(timezone=True).compile(dialect=conn.dialect)
+        await conn.execute(text(f"ALTER TABLE conversations ADD COLUMN summary_until {column_type}"))
+
+
+def history_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+async def load_memory(db: AsyncSession, conversation_id: str) -> ConversationMemory:
+    # Only turns newer than the summary are loaded, newest first and capped,
+    # so the cost stays flat however long the conversation gets.
+    conversation = (await db.execute(
+        select(Conversation.summary, Conversation.summary_until)
+        .where(Conversation.id == uuid.UUID(str(conversation_id)))
+    )).one_or_none()
+    summary, summary_until = conversation if conversation else (None, None)
+    
+    statement = select(Message.role, Message.content).where(
+        Message.conversation_id == uuid.UUID(str(conversation_id))
+    )
+    if summary_until is not None:
+        statement = statement.where(Message.created_at > summary_until)
+    rows = (await db.execute(
+        statement.order_by(Message.created_at.desc()).limit(settings.CHAT_HISTORY_MAX_MESSAGES)
+    )).all()
+    
+    return ConversationMemory(
+        summary=summary,
+        messages=[{"role": role, "content": content} for role, content in reversed(rows)]
+    )
+
+
+async def compact_memory(db: AsyncSession, conversation_id: str, client: openai.AsyncOpenAI) -> bool:
+    # Folds the oldest unsummarized turns into the summary until the rest
+    # fit in half of CHAT_MAX_HISTORY_TOKENS, so a compaction is followed by
+    # several turns that need none. Returns whether the summary changed.
+    conversation = await db.get(Conversation, uuid.UUID(str(conversation_id)))
+    if conversation is None:
+        return False
+    previous_until = conversation.summary_until
+    
+    statement = select(Message).where(Message.conversation_id == conversation.id)
+    if previous_until is not None:
+        statement = statement.where(Message.created_at > previous_until)
+    messages = (await db.execute(statement.order_by(Message.created_at))).scalars().all()
+    
+    turns = [{"role": message.role, "content": message.content} for message in messages]
+    if history_tokens(turns) <= settings.CHAT_MAX_HISTORY_TOKENS:
+        return False
+    
+    folded = 0
+    remaining = history_tokens(turns)
+    while folded < len(turns) and remaining > settings.CHAT_MAX_HISTORY_TOKENS // 2:
+        remaining -= history_tokens([turns[folded]])
+        folded += 1
+    
+    transcript = "\n\n".join(f"{turn['role']}: {turn['content']}" for turn in turns[:folded])
+    response = await client.chat.completions.create(
+        model=settings.LLM_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT.format(words=settings.CHAT_SUMMARY_MAX_TOKENS * 3 // 4)},
+            {
+                "role": "user",
+                "content": f"Current summary:\n{conversation.summary or '(none)'}\n\nNew messages:\n{transcript}"
+            },
+        ],
+        temperature=0,
+        max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS
+    )
+    summary = response.choices[0].message.content.strip()
+    
+    # Another compaction may have finished meanwhile; its summary wins.
+    statement = (
+        update(Conversation)
+        .where(Conversation.id == conversation.id)
+        .values(summary=summary, summary_until=messages[folded - 1].created_at)
+    )
+    if previous_until is None:
+        statement = statement.where(Conversation.summary_until.is_(None))
+    else:
+        statement = statement.where(Conversation.summary_until == previous_until)
+    result = await db.execute(statement)
+    await db.commit()
+    
+    logger.info(
+        "Conversation history compacted",
+        conversation_id=str(conversation_id),
+        folded_messages=folded,
+        updated=bool(result.rowcount)
+    )
+    return bool(result.rowcount)
@@ -1,43 +1,38 @@
+import asyncio
+import codecs
 import os
 import mimetypes
+from collections import deque
 from pathlib import Path
-from typing import BinaryIO
-import PyPDF2
-from PIL import Image
-import pytesseract
+from typing import AsyncIterator, BinaryIO
 import structlog
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from app.core.config import settings
+from app.core.logging import DOCUMENT_PROCESSING_DURATION, EXTRACTION_PAGE_TIMEOUTS
+from app.services.extraction_pool import (
+    count_pdf_pages,
+    extract_pdf_page_range,
+    pool_size,
+    run_in_process_pool,
+)
+from app.services.ocr import ocr_image, ocr_pdf_page
+from app.services.text_chunker import TextChunk, TokenTextChunker
 
 logger = structlog.get_logger()
 
 
 class DocumentProcessor:
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
+        self.chunker = TokenTextChunker(
+            chunk_size=settings.CHUNK_SIZE_TOKENS,
+            chunk_overlap=settings.CHUNK_OVERLAP_TOKENS,
+            model=settings.EMBEDDING_MODEL,
             separators=["\n\n", "\n", " ", ""]
         )
     
     async def process_file(self, file: BinaryIO, filename: str) -> dict[str, any]:
-        file_extension = Path(filename).suffix.lower()
-        
-        if file_extension not in settings.ALLOWED_EXTENSIONS:
-            raise ValueError(f"Unsupported file type: {file_extension}")
-        
         try:
-            if file_extension == ".pdf":
-                content = await self._extract_pdf_text(file)
-            elif file_extension == ".txt":
-                content = await self._extract_text_content(file)
-            elif file_extension in [".jpg", ".jpeg", ".png", ".tiff"]:
-                content = await self._extract_image_text(file)
-            else:
-                raise ValueError(f"Unsupported file type: {file_extension}")
-            
+            content = "".join([text async for text, _ in self.iter_text(file, filename)])
             chunks = self._split_text(content)
             
             return {
@@ -45,7 +40,7 @@ class DocumentProcessor:
                 "chunks": chunks,
                 "metadata": {
                     "filename": filename,
-                    "file_type": file_extension,
+                    "file_type": Path(filename).suffix.lower(),
                     "chunk_count": len(chunks),
                     "character_count": len(content)
                 }
@@ -55,41 +50,179 @@ class DocumentProcessor:
             logger.error("Document processing failed", filename=filename, error=str(e))
             raise
     
-    async def _extract_pdf_text(self, file: BinaryIO) -> str:
-        content = []
+    async def iter_text(
+        self,
+        file: BinaryIO,
+        filename: str
+    ) -> AsyncIterator[tuple[str, float]]:
+        # Yields consecutive pieces of the document text together with the
+        # fraction of the source consumed so far.
+        file_extension = Path(filename).suffix.lower()
+        
+        if file_extension not in settings.ALLOWED_EXTENSIONS:
+            raise ValueError(f"Unsupported file type: {file_extension}")
+        
+        if file_extension == ".pdf":
+            texts = self._iter_pdf_text(file)
+        elif file_extension == ".txt":
+            texts = self._iter_text_content(file)
+        elif file_extension in [".jpg", ".jpeg", ".png", ".tiff"]:
+            texts = self._iter_image_text(file, file_extension)
+        else:
+            raise ValueError(f"Unsupported file type: {file_extension}")
+        
+        async for text, progress in texts:
+            yield text, progress
+    
+    async def split_stream(
+        self,
+        texts: AsyncIterator[tuple[str, float]]
+    ) -> AsyncIterator[tuple[TextChunk, float]]:
+        buffer = ""
+        progress = 0.0
+        
+        async for text, progress in texts:
+            buffer += text
+            if len(buffer) < settings.STREAM_SPLIT_WINDOW:
+                continue
+            
+            chunks, buffer = await asyncio.to_thread(self.chunker.split_partial, buffer)
+            for chunk in chunks:
+                yield chunk, progress
+        
+        for chunk in await asyncio.to_thread(self.chunker.split_text, buffer):
+            yield chunk, progress
+    
+    async def _iter_pdf_text(self, file: BinaryIO) -> AsyncIterator[tuple[str, float]]:
+        source = self._pool_source(file)
+        pending: deque[asyncio.Future] = deque()
         try:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text = page.extract_text()
-                if text.strip():
-                    content.append(text)
-            return "\n\n".join(content)
+            page_count = await asyncio.to_thread(count_pdf_pages, source)
+            ranges = [
+                (start, min(start + settings.PDF_PAGES_PER_TASK, page_count))
+                for start in range(0, page_count, settings.PDF_PAGES_PER_TASK)
+            ]
+            # Short documents go through the pool as well: the per-page
+            # timeout relies on SIGALRM, which only works in a pool worker's
+            # main thread.
+            remaining = iter(ranges)
+            
+            def schedule_next():
+                for start, end in remaining:
+                    pending.append(asyncio.ensure_future(run_in_process_pool(
+                        extract_pdf_page_range, source, start, end, settings.PDF_PAGE_TIMEOUT
+                    )))
+                    return
+            
+            # Keep only as many ranges in flight as the pool can work on, so
+            # extracted text never piles up ahead of the consumer.
+            for _ in range(pool_size()):
+                schedule_next()
+            
+            first = True
+            while pending:
+                pages = await pending.popleft()
+                schedule_next()
+                
+                for page in await self._ocr_image_only_pages(source, pages):
+                    if not page["text"].strip():
+                        continue
+                    yield ("" if first else "\n\n") + page["text"], (page["page"] + 1) / page_count
+                    first = False
         except Exception as e:
             logger.error("PDF text extraction failed", error=str(e))
             raise ValueError(f"Failed to extract text from PDF: {str(e)}")
+        finally:
+            for task in pending:
+                task.cancel()
     
-    async def _extract_text_content(self, file: BinaryIO) -> str:
+    async def _ocr_image_only_pages(self, source: str | bytes, pages: list[dict]) -> list[dict]:
+        for page in pages:
+            if page["error"]:
+                EXTRACTION_PAGE_TIMEOUTS.labels(file_type=".pdf").inc()
+                logger.warning("PDF page skipped", page=page["page"], error=page["error"])
+        
+        image_only = [page["page"] for page in pages if not page["text"].strip()]
+        if not image_only or not settings.OCR_ENABLED:
+            return pages
+        
+        ocr_pages = await asyncio.gather(*(
+            run_in_process_pool(ocr_pdf_page, source, index, self._ocr_options())
+            for index in image_only
+        ), return_exceptions=True)
+        
+        ocr_text = {}
+        for index, page in zip(image_only, ocr_pages):
+            if isinstance(page, Exception):
+                logger.warning("PDF page OCR failed", page=index, error=str(page))
+                continue
+            DOCUMENT_PROCESSING_DURATION.labels(file_type=".pdf_ocr").observe(page["duration"])
+            ocr_text[page["page"]] = page["text"]
+        
+        for page in pages:
+            page["text"] = ocr_text.get(page["page"], page["text"])
+        return pages
+    
+    def _pool_source(self, file: BinaryIO) -> str | bytes:
+        # Workers reopen files by path instead of receiving a pickled copy.
+        name = getattr(file, "name", None)
+        if isinstance(name, str) and os.path.isfile(name):
+            return name
+        return file.read()
+    
+    async def _iter_text_content(self, file: BinaryIO) -> AsyncIterator[tuple[str, float]]:
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        total_size = self._file_size(file) or 1
+        read = 0
         try:
-            content = file.read()
-            if isinstance(content, bytes):
-                content = content.decode('utf-8')
-            return content
+            while True:
+                block = await asyncio.to_thread(file.read, settings.TEXT_READ_BLOCK_SIZE)
+                if not block:
+                    break
+                read += len(block)
+                text = decoder.decode(block) if isinstance(block, bytes) else block
+                if text:
+                    yield text, min(read / total_size, 1.0)
+            
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield text, 1.0
         except UnicodeDecodeError:
             logger.error("Text file encoding error")
             raise ValueError("Unable to decode text file. Please ensure it's UTF-8 encoded.")
     
-    async def _extract_image_text(self, file: BinaryIO) -> str:
+    async def _iter_image_text(
+        self,
+        file: BinaryIO,
+        file_extension: str
+    ) -> AsyncIterator[tuple[str, float]]:
         try:
-            image = Image.open(file)
-            text = pytesseract.image_to_string(image)
-            return text.strip()
+            result = await run_in_process_pool(
+                ocr_image, self._pool_source(file), self._ocr_options()
+            )
+            DOCUMENT_PROCESSING_DURATION.labels(file_type=f"{file_extension}_ocr").observe(result["duration"])
         except Exception as e:
             logger.error("OCR processing failed", error=str(e))
             raise ValueError(f"Failed to extract text from image: {str(e)}")
+        
+        yield result["text"], 1.0
+    
+    def _file_size(self, file: BinaryIO) -> int:
+        position = file.tell()
+        size = file.seek(0, os.SEEK_END)
+        file.seek(position)
+        return size - position
+    
+    def _ocr_options(self) -> dict[str, any]:
+        return {
+            "language": settings.OCR_LANGUAGE,
+            "target_dpi": settings.OCR_TARGET_DPI,
+            "threshold": settings.OCR_BINARIZE_THRESHOLD,
+            "timeout": settings.OCR_PAGE_TIMEOUT,
+        }
     
     def _split_text(self, content: str) -> list[str]:
         if not content or not content.strip():
             return []
         
-        chunks = self.text_splitter.split_text(content)
-        return [chunk.strip() for chunk in chunks if chunk.strip()]
\ No newline at end of file
+        return [chunk.content for chunk in self.chunker.split_text(content)]
@@ -0,0 +1,308 @@
+import asyncio
+import hashlib
+import sqlite3
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import redis.asyncio as redis
+import structlog
+
+from app.core.config import settings
+from app.core.logging import (
+    EMBEDDING_CACHE_REQUESTS,
+    EMBEDDING_CACHE_EVICTIONS,
+    QUERY_EMBEDDING_CACHE_ENTRIES,
+    QUERY_EMBEDDING_CACHE_REQUESTS,
+)
+
+logger = structlog.get_logger()
+
+SQLITE_MAX_VARIABLES = 900
+WHITESPACE = re.compile(r"\s+")
+
+
+def embedding_cache_key(model: str, text: str) -> str:
+    return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+def normalize_query(text: str) -> str:
+    # Case is kept: it matters for identifiers and the embeddings see it.
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def _encode_vector(embedding: List[float]) -> bytes:
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+def _decode_vector(data: bytes) -> List[float]:
+    return np.frombuffer(data, dtype=np.float32).tolist()
+
+
+class EmbeddingCache:
+    backend = "none"
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        raise NotImplementedError
+    
+    async def set_many(self, items: Dict[str, List[float]]):
+        raise NotImplementedError
+    
+    async def close(self):
+        pass
+    
+    def _record(self, results: List[Optional[List[float]]]):
+        hits = sum(1 for result in results if result is not None)
+        if hits:
+            EMBEDDING_CACHE_REQUESTS.labels(backend=self.backend, result="hit").inc(hits)
+        if len(results) - hits:
+            EMBEDDING_CACHE_REQUESTS.labels(backend=self.backend, result="miss").inc(len(results) - hits)
+
+
+class RedisEmbeddingCache(EmbeddingCache):
+    backend = "redis"
+    
+    def __init__(
+        self,
+        url: str,
+        max_entries: int,
+        ttl: int,
+        prefix: str = "embedding"
+    ):
+        self.redis = redis.from_url(url)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prefix = prefix
+        self.index_key = f"{prefix}:lru"
+    
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        if not keys:
+            return []
+        
+        values = await self.redis.mget([self._key(key) for key in keys])
+        
+        # Hits move to the back of the LRU index and get a fresh TTL; keys
+        # that expired are dropped from the index so they are not counted or
+        # refreshed.
+        now = time.time()
+        hits = [key for key, value in zip(keys, values) if value is not None]
+        expired = [key for key, value in zip(keys, values) if value is None]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if hits:
+                pipe.zadd(self.index_key, {key: now for key in hits}, xx=True)
+                for key in hits:
+                    pipe.expire(self._key(key), self.ttl)
+            if expired:
+                pipe.zrem(self.index_key, *expired)
+            await pipe.execute()
+        
+        results = [_decode_vector(value) if value is not None else None for value in values]
+        self._record(results)
+        return results
+    
+    async def set_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, embedding in items.items():
+                pipe.set(self._key(key), _encode_vector(embedding), ex=self.ttl)
+            pipe.zadd(self.index_key, {key: now for key in items})
+            pipe.zcard(self.index_key)
+            results = await pipe.execute()
+        
+        overflow = results[-1] - self.max_entries
+        if overflow > 0:
+            evicted = await self.redis.zpopmin(self.index_key, overflow)
+            if evicted:
+                await self.redis.delete(*[self._key(key.decode()) for key, _ in evicted])
+                EMBEDDING_CACHE_EVICTIONS.labels(backend=self.backend).inc(len(evicted))
+    
+    async def close(self):
+        await self.redis.aclose()
+
+
+class DiskEmbeddingCache(EmbeddingCache):
+    backend = "disk"
+    
+    def __init__(self, path: str, max_entries: int):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_embeddings_accessed_at ON embeddings (accessed_at)"
+        )
+        self._conn.commit()
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        if not keys:
+            return []
+        
+        found = await asyncio.to_thread(self._get_many, keys)
+        results = [_decode_vector(found[key]) if key in found else None for key in keys]
+        self._record(results)
+        return results
+    
+    async def set_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        
+        rows = [(key, _encode_vector(embedding)) for key, embedding in items.items()]
+        await asyncio.to_thread(self._set_many, rows)
+    
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+    
+    def _get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                batch = keys[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                found.update(rows)
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET accessed_at = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+        return found
+    
+    def _set_many(self, rows: List[tuple]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, accessed_at) VALUES (?, ?, ?)",
+                [(key, embedding, now) for key, embedding in rows]
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY accessed_at LIMIT ?)",
+                    (overflow,)
+                )
+                EMBEDDING_CACHE_EVICTIONS.labels(backend=self.backend).inc(overflow)
+            self._conn.commit()
+
+
+class QueryEmbeddingCache:
+    # Per-process LRU of query embeddings with a TTL. With a Redis URL,
+    # misses fall through to entries shared by every worker; Redis bounds
+    # those with the TTL alone, since a query lookup should cost one GET.
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: int,
+        redis_url: str | None = None,
+        prefix: str = "query_embedding"
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prefix = prefix
+        self.redis = redis.from_url(redis_url) if redis_url else None
+        self._entries: OrderedDict[str, tuple[float, List[float]]] = OrderedDict()
+    
+    async def get(self, key: str) -> Optional[List[float]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                QUERY_EMBEDDING_CACHE_REQUESTS.labels(layer="memory", result="hit").inc()
+                return entry[1]
+            del self._entries[key]
+        QUERY_EMBEDDING_CACHE_REQUESTS.labels(layer="memory", result="miss").inc()
+        
+        if not self.redis:
+            return None
+        
+        try:
+            value = await self.redis.get(f"{self.prefix}:{key}")
+        except Exception as e:
+            logger.warning("Query embedding cache lookup failed", error=str(e))
+            return None
+        
+        QUERY_EMBEDDING_CACHE_REQUESTS.labels(
+            layer="redis", result="hit" if value is not None else "miss"
+        ).inc()
+        if value is None:
+            return None
+        embedding = _decode_vector(value)
+        self._put(key, embedding)
+        return embedding
+    
+    async def set(self, key: str, embedding: List[float]):
+        self._put(key, embedding)
+        if not self.redis:
+            return
+        try:
+            await self.redis.set(f"{self.prefix}:{key}", _encode_vector(embedding), ex=self.ttl)
+        except Exception as e:
+            logger.warning("Query embedding cache update failed", error=str(e))
+    
+    async def close(self):
+        if self.redis:
+            await self.redis.aclose()
+    
+    def _put(self, key: str, embedding: List[float]):
+        self._entries[key] = (time.monotonic() + self.ttl, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        QUERY_EMBEDDING_CACHE_ENTRIES.set(len(self._entries))
+
+
+def create_embedding_cache() -> Optional[EmbeddingCache]:
+    backend = settings.EMBEDDING_CACHE_BACKEND.lower()
+    
+    if backend == "redis":
+        return RedisEmbeddingCache(
+            settings.REDIS_URL,
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+            ttl=settings.EMBEDDING_CACHE_TTL
+        )
+    if backend == "disk":
+        return DiskEmbeddingCache(
+            settings.EMBEDDING_CACHE_PATH,
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+        )
+    if backend == "none":
+        return None
+    
+    raise ValueError(f"Unsupported embedding cache backend: {backend}")
+
+
+def create_query_embedding_cache() -> Optional[QueryEmbeddingCache]:
+    backend = settings.QUERY_EMBEDDING_CACHE_BACKEND.lower()
+    
+    if backend == "none":
+        return None
+    if backend in ("memory", "redis"):
+        return QueryEmbeddingCache(
+            max_entries=settings.QUERY_EMBEDDING_CACHE_MAX_ENTRIES,
+            ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+            redis_url=settings.REDIS_URL if backend == "redis" else None
+        )
+    
+    raise ValueError(f"Unsupported query embedding cache backend: {backend}")
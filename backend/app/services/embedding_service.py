@@ -1,78 +1,364 @@
-import uuid
-from typing import List
+import asyncio
+import time
+import zlib
+from typing import Any, Dict, List
+import numpy as np
 import openai
 import structlog
-import chromadb
-from chromadb.config import Settings as ChromaSettings
 
 from app.core.config import settings
+from app.core.logging import EMBEDDING_GENERATION_DURATION, VECTOR_COLLECTION_ITEMS
+from app.services.embedding_cache import (
+    create_embedding_cache,
+    create_query_embedding_cache,
+    embedding_cache_key,
+    normalize_query,
+)
+from app.services.openai_client import NO_RETRY_HEADER, create_openai_client
+from app.services.text_chunker import get_encoding
+from app.services.vector_store import VectorStore, create_vector_store
 
 logger = structlog.get_logger()
 
+WARM_UP_TIMEOUT = 5.0
+
+
+def truncate_embeddings(embeddings: List[List[float]], dimensions: int) -> List[List[float]]:
+    # text-embedding-3 models are trained so that a renormalized prefix is
+    # the same vector the API returns when asked for fewer dimensions.
+    vectors = np.asarray(embeddings, dtype=np.float32)[:, :dimensions]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1.0, norms)).tolist()
+
 
 class EmbeddingService:
-    def __init__(self):
-        self.client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        self.chroma_client = chromadb.PersistentClient(
-            path=settings.CHROMA_PERSIST_DIRECTORY,
-            settings=ChromaSettings(anonymized_telemetry=False)
-        )
-        self.collection = self.chroma_client.get_or_create_collection(
-            name=settings.CHROMA_COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine"}
-        )
+    def __init__(
+        self,
+        client: openai.AsyncOpenAI | None = None,
+        vector_store: VectorStore | None = None
+    ):
+        self.client = client or create_openai_client()
+        self.vector_store = vector_store or create_vector_store()
+        self._partitions: Dict[str, VectorStore] = {}
+        self._semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+        self.cache = create_embedding_cache()
+        self.query_cache = create_query_embedding_cache()
+        self._pending_queries: Dict[str, asyncio.Future] = {}
     
-    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+    async def warm_up(self):
+        # Loads the vector index and opens a pooled connection to the
+        # embeddings API, so the first user request does not pay for either.
+        item_count = await self.vector_store.warm_up()
+        VECTOR_COLLECTION_ITEMS.set(item_count)
+        
+        # A single short attempt, so an unreachable provider does not hold
+        # up startup.
+        try:
+            await self.client.models.retrieve(
+                settings.EMBEDDING_MODEL,
+                extra_headers={NO_RETRY_HEADER: "1"},
+                timeout=WARM_UP_TIMEOUT
+            )
+        except Exception as e:
+            logger.warning("Embedding client warm-up failed", error=str(e))
+        
+        logger.info("Embedding service warmed up", collection_items=item_count)
+    
+    async def close(self):
+        await self.client.close()
+        # Partitions share the root store's client and executor.
+        await self.vector_store.close()
+        if self.cache:
+            await self.cache.close()
+        if self.query_cache:
+            await self.query_cache.close()
+    
+    def partition_name(self, owner_id: int | None) -> str | None:
+        mode = settings.VECTOR_PARTITION_MODE
+        if mode == "global":
+            return None
+        if owner_id is None:
+            raise ValueError("owner_id is required when vectors are partitioned")
+        if mode == "owner":
+            return f"{settings.CHROMA_COLLECTION_NAME}_owner_{owner_id}"
+        if mode == "bucket":
+            bucket = zlib.crc32(str(owner_id).encode()) % settings.VECTOR_PARTITION_BUCKETS
+            return f"{settings.CHROMA_COLLECTION_NAME}_bucket_{bucket}"
+        raise ValueError(f"Unsupported vector partition mode: {mode}")
+    
+    async def store_for_owner(self, owner_id: int | None) -> VectorStore:
+        name = self.partition_name(owner_id)
+        if name is None:
+            return self.vector_store
+        if name not in self._partitions:
+            self._partitions[name] = await self.vector_store.partition(name)
+        return self._partitions[name]
+    
+    async def coarse_store_for_owner(self, owner_id: int | None) -> VectorStore | None:
+        # The truncated first-pass index mirrors the owner's store.
+        dimensions = settings.VECTOR_COARSE_DIMENSIONS
+        if not dimensions:
+            return None
+        name = f"{self.partition_name(owner_id) or settings.CHROMA_COLLECTION_NAME}_d{dimensions}"
+        if name not in self._partitions:
+            self._partitions[name] = await self.vector_store.partition(name, dimensions=dimensions)
+        return self._partitions[name]
+    
+    async def stores_for_owner(self, owner_id: int | None) -> List[VectorStore]:
+        stores = [await self.store_for_owner(owner_id)]
+        coarse = await self.coarse_store_for_owner(owner_id)
+        if coarse:
+            stores.append(coarse)
+        return stores
+    
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if not self.cache or not texts:
+            return await self.generate_embeddings(texts)
+        
+        keys = [embedding_cache_key(settings.EMBEDDING_MODEL, text) for text in texts]
+        
         try:
+            cached = await self.cache.get_many(keys)
+        except Exception as e:
+            logger.warning("Embedding cache lookup failed", error=str(e))
+            cached = [None] * len(texts)
+        
+        missing = {}
+        for key, text, embedding in zip(keys, texts, cached):
+            if embedding is None:
+                missing.setdefault(key, text)
+        
+        if missing:
+            generated = dict(zip(
+                missing.keys(),
+                await self.generate_embeddings(list(missing.values()))
+            ))
+            
+            try:
+                await self.cache.set_many(generated)
+            except Exception as e:
+                logger.warning("Embedding cache update failed", error=str(e))
+            
+            cached = [
+                embedding if embedding is not None else generated[key]
+                for key, embedding in zip(keys, cached)
+            ]
+        
+        return cached
+    
+    async def embed_query(self, query: str) -> List[float]:
+        if not self.query_cache:
+            return (await self.get_embeddings([query]))[0]
+        
+        text = normalize_query(query)
+        key = embedding_cache_key(settings.EMBEDDING_MODEL, text)
+        embedding = await self.query_cache.get(key)
+        if embedding is not None:
+            return embedding
+        
+        # Concurrent misses for the same query share one API call, which
+        # keeps running if one of the waiting requests is cancelled.
+        pending = self._pending_queries.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._embed_uncached_query(key, text))
+            self._pending_queries[key] = pending
+            pending.add_done_callback(lambda _: self._pending_queries.pop(key, None))
+        return await asyncio.shield(pending)
+    
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        # Batch form of embed_query: cached queries are read from the query
+        # cache and the rest are looked up in the embedding cache or embedded
+        # in one request, in input order.
+        if not self.query_cache:
+            return await self.get_embeddings(queries)
+        
+        texts = [normalize_query(query) for query in queries]
+        keys = [embedding_cache_key(settings.EMBEDDING_MODEL, text) for text in texts]
+        embeddings = await asyncio.gather(*(self.query_cache.get(key) for key in keys))
+        
+        missing = {}
+        for key, text, embedding in zip(keys, texts, embeddings):
+            if embedding is None:
+                missing.setdefault(key, text)
+        if not missing:
+            return list(embeddings)
+        
+        generated = dict(zip(missing, await self.get_embeddings(list(missing.values()))))
+        await asyncio.gather(*(self.query_cache.set(key, embedding) for key, embedding in generated.items()))
+        return [
+            embedding if embedding is not None else generated[key]
+            for key, embedding in zip(keys, embeddings)
+        ]
+    
+    async def _embed_uncached_query(self, key: str, text: str) -> List[float]:
+        # Misses fall through to the content-addressed embedding cache.
+        embedding = (await self.get_embeddings([text]))[0]
+        await self.query_cache.set(key, embedding)
+        return embedding
+    
+    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        
+        texts, batches = self._build_batches(texts)
+        # Each request is already retried by the provider client's
+        # transport, so a batch that still fails fails the call.
+        results = await asyncio.gather(
+            *(self._embed_batch([texts[i] for i in batch]) for batch in batches),
+            return_exceptions=True
+        )
+        
+        embeddings: List[List[float] | None] = [None] * len(texts)
+        for batch, result in zip(batches, results):
+            if isinstance(result, BaseException):
+                logger.error(
+                    "Embedding generation failed",
+                    failed_batches=sum(isinstance(other, BaseException) for other in results),
+                    total_batches=len(batches),
+                    error=str(result)
+                )
+                raise result
+            for index, embedding in zip(batch, result):
+                embeddings[index] = embedding
+        
+        return embeddings
+    
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        async with self._semaphore:
+            start_time = time.time()
             response = await self.client.embeddings.create(
                 input=texts,
                 model=settings.EMBEDDING_MODEL
             )
-            return [embedding.embedding for embedding in response.data]
-        except Exception as e:
-            logger.error("Embedding generation failed", error=str(e))
-            raise
+            EMBEDDING_GENERATION_DURATION.observe(time.time() - start_time)
+        return [embedding.embedding for embedding in response.data]
+    
+    def _build_batches(self, texts: List[str]) -> tuple[List[str], List[List[int]]]:
+        encoding = get_encoding(settings.EMBEDDING_MODEL)
+        prepared = []
+        batches = []
+        current: List[int] = []
+        current_tokens = 0
+        
+        for index, text in enumerate(texts):
+            tokens = encoding.encode(text, disallowed_special=())
+            if len(tokens) > settings.EMBEDDING_MAX_INPUT_TOKENS:
+                logger.warning(
+                    "Embedding input truncated",
+                    tokens=len(tokens),
+                    max_tokens=settings.EMBEDDING_MAX_INPUT_TOKENS
+                )
+                tokens = tokens[:settings.EMBEDDING_MAX_INPUT_TOKENS]
+                text = encoding.decode(tokens)
+            prepared.append(text)
+            
+            if current and (
+                current_tokens + len(tokens) > settings.EMBEDDING_BATCH_MAX_TOKENS
+                or len(current) >= settings.EMBEDDING_BATCH_MAX_INPUTS
+            ):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            
+            current.append(index)
+            current_tokens += len(tokens)
+        
+        if current:
+            batches.append(current)
+        
+        return prepared, batches
     
     async def store_document_embeddings(
         self, 
         document_id: str, 
         chunks: List[str], 
-        metadata: dict = None
+        metadata: dict = None,
+        chunk_indices: List[int] = None,
+        chunk_ids: List[str] = None
     ) -> List[str]:
+        if chunk_indices is None:
+            chunk_indices = list(range(len(chunks)))
+        if chunk_ids is None:
+            chunk_ids = [f"{document_id}_{i}" for i in chunk_indices]
+        
+        metadatas = [
+            self.chunk_metadata(document_id, i, chunk, metadata)
+            for i, chunk in zip(chunk_indices, chunks)
+        ]
+        
+        await self.store_embeddings(chunk_ids, chunks, metadatas)
+        
+        logger.info(
+            "Document embeddings stored", 
+            document_id=document_id, 
+            chunk_count=len(chunks)
+        )
+        
+        return chunk_ids
+    
+    def chunk_metadata(
+        self,
+        document_id: str,
+        chunk_index: int,
+        chunk: str,
+        metadata: dict = None
+    ) -> dict:
+        return {
+            "document_id": document_id,
+            "chunk_index": chunk_index,
+            "text_length": len(chunk),
+            **(metadata or {})
+        }
+    
+    async def store_embeddings(
+        self,
+        chunk_ids: List[str],
+        chunks: List[str],
+        metadatas: List[dict]
+    ):
+        # Chunks may belong to several documents, so one embeddings call
+        # can be shared by a whole ingestion batch.
         try:
-            embeddings = await self.generate_embeddings(chunks)
-            
-            chunk_ids = [f"{document_id}_{i}" for i in range(len(chunks))]
-            
-            metadatas = []
-            for i, chunk in enumerate(chunks):
-                chunk_metadata = {
-                    "document_id": document_id,
-                    "chunk_index": i,
-                    "text_length": len(chunk),
-                    **(metadata or {})
-                }
-                metadatas.append(chunk_metadata)
-            
-            self.collection.add(
-                embeddings=embeddings,
-                documents=chunks,
-                metadatas=metadatas,
-                ids=chunk_ids
-            )
-            
-            logger.info(
-                "Document embeddings stored", 
-                document_id=document_id, 
-                chunk_count=len(chunks)
-            )
-            
-            return chunk_ids
+            embeddings = await self.get_embeddings(chunks)
+            await self.add_embeddings(chunk_ids, embeddings, chunks, metadatas)
         
         except Exception as e:
             logger.error("Failed to store document embeddings", error=str(e))
             raise
     
+    async def add_embeddings(
+        self,
+        chunk_ids: List[str],
+        embeddings: List[List[float]],
+        chunks: List[str],
+        metadatas: List[dict]
+    ):
+        partitions: Dict[Any, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            partitions.setdefault(metadata.get("owner_id"), []).append(i)
+        
+        for owner_id, indices in partitions.items():
+            store = await self.store_for_owner(owner_id)
+            await store.add(
+                ids=[chunk_ids[i] for i in indices],
+                embeddings=[embeddings[i] for i in indices],
+                documents=[chunks[i] for i in indices],
+                metadatas=[metadatas[i] for i in indices]
+            )
+            coarse = await self.coarse_store_for_owner(owner_id)
+            if coarse:
+                # Search results are read from the full store, so the
+                # coarse copy does not repeat the chunk text.
+                await coarse.add(
+                    ids=[chunk_ids[i] for i in indices],
+                    embeddings=truncate_embeddings(
+                        [embeddings[i] for i in indices],
+                        settings.VECTOR_COARSE_DIMENSIONS
+                    ),
+                    documents=["" for _ in indices],
+                    metadatas=[metadatas[i] for i in indices]
+                )
+    
     async def search_similar_documents(
         self, 
         query: str, 
@@ -80,32 +366,159 @@ class EmbeddingService:
         document_filter: dict = None
     ) -> dict:
         try:
-            query_embedding = await self.generate_embeddings([query])
-            
-            where_clause = document_filter if document_filter else None
-            
-            results = self.collection.query(
-                query_embeddings=query_embedding,
-                n_results=n_results,
-                where=where_clause,
-                include=["documents", "metadatas", "distances"]
-            )
-            
-            return {
-                "documents": results["documents"][0] if results["documents"] else [],
-                "metadatas": results["metadatas"][0] if results["metadatas"] else [],
-                "distances": results["distances"][0] if results["distances"] else []
-            }
+            query_embedding = await self.embed_query(query)
+            return await self.search_by_embedding(query_embedding, n_results, document_filter)
         
         except Exception as e:
             logger.error("Document search failed", error=str(e))
             raise
     
-    def delete_document_embeddings(self, document_id: str):
-        try:
-            self.collection.delete(
-                where={"document_id": document_id}
+    async def search_by_embedding(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        document_filter: dict = None
+    ) -> dict:
+        return (await self.search_by_embeddings([query_embedding], n_results, document_filter))[0]
+    
+    async def search_by_embeddings(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 5,
+        document_filter: dict = None
+    ) -> List[dict]:
+        # Several queries against the same owner's vectors share one store
+        # query. Returns one result per query embedding, in order.
+        if not query_embeddings:
+            return []
+        where = dict(document_filter or {})
+        owner_id = where.get("owner_id")
+        store = await self.store_for_owner(owner_id)
+        coarse = await self.coarse_store_for_owner(owner_id)
+        if settings.VECTOR_PARTITION_MODE == "owner":
+            # The partition only holds this owner's vectors.
+            where.pop("owner_id", None)
+        
+        if coarse:
+            return await self._two_pass_search(store, coarse, query_embeddings, n_results, where)
+        
+        results = await store.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where
+        )
+        
+        return [
+            {
+                "ids": ids,
+                "documents": documents,
+                "metadatas": metadatas,
+                "distances": distances
+            }
+            for ids, documents, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"]
             )
+        ]
+    
+    async def distances_for_ids(
+        self,
+        query_embedding: List[float],
+        ids: List[str],
+        owner_id: int | None = None
+    ) -> Dict[str, float]:
+        # Cosine distances of already known chunks, e.g. lexical matches
+        # that the vector search did not return.
+        embeddings = await self.embeddings_for_ids(ids, owner_id)
+        if not embeddings:
+            return {}
+        distances = self._cosine_distances(list(embeddings.values()), query_embedding)
+        return dict(zip(embeddings, distances.tolist()))
+    
+    async def embeddings_for_ids(self, ids: List[str], owner_id: int | None = None) -> Dict[str, List[float]]:
+        if not ids:
+            return {}
+        store = await self.store_for_owner(owner_id)
+        stored = await store.get(ids)
+        return dict(zip(stored["ids"], stored["embeddings"]))
+    
+    async def _two_pass_search(
+        self,
+        store: VectorStore,
+        coarse: VectorStore,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        where: dict
+    ) -> List[dict]:
+        # A wide candidate set comes from the truncated index and is
+        # reranked by exact cosine distance over the full vectors. The full
+        # vectors of all queries' candidates are read at once.
+        candidates = await coarse.query(
+            query_embeddings=truncate_embeddings(query_embeddings, settings.VECTOR_COARSE_DIMENSIONS),
+            n_results=max(n_results, settings.VECTOR_COARSE_CANDIDATES),
+            where=where
+        )
+        candidate_ids = list(dict.fromkeys(id_ for ids in candidates["ids"] for id_ in ids))
+        full = await store.get(candidate_ids) if candidate_ids else {"ids": []}
+        position = {id_: row for row, id_ in enumerate(full["ids"])}
+        
+        results = []
+        for query_embedding, ids in zip(query_embeddings, candidates["ids"]):
+            rows = [position[id_] for id_ in ids if id_ in position]
+            if not rows:
+                results.append({"ids": [], "documents": [], "metadatas": [], "distances": []})
+                continue
+            distances = self._cosine_distances([full["embeddings"][row] for row in rows], query_embedding)
+            top = [rows[i] for i in np.argsort(distances, kind="stable")[:n_results]]
+            ranked = np.sort(distances, kind="stable")[:n_results]
+            results.append({
+                "ids": [full["ids"][row] for row in top],
+                "documents": [full["documents"][row] for row in top],
+                "metadatas": [full["metadatas"][row] for row in top],
+                "distances": [float(distance) for distance in ranked]
+            })
+        return results
+    
+    def _cosine_distances(self, embeddings: List[List[float]], query_embedding: List[float]) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        return 1.0 - vectors @ query / np.maximum(
+            np.linalg.norm(vectors, axis=1) * np.linalg.norm(query),
+            1e-12
+        )
+    
+    async def update_chunk_indices(
+        self,
+        chunk_ids: List[str],
+        chunk_indices: List[int],
+        owner_id: int | None = None
+    ):
+        if not chunk_ids:
+            return
+        try:
+            for store in await self.stores_for_owner(owner_id):
+                await store.update_metadata(
+                    ids=chunk_ids,
+                    metadatas=[{"chunk_index": i} for i in chunk_indices]
+                )
+        except Exception as e:
+            logger.error("Failed to update chunk indices", error=str(e))
+            raise
+    
+    async def delete_embeddings(self, chunk_ids: List[str], owner_id: int | None = None):
+        if not chunk_ids:
+            return
+        try:
+            for store in await self.stores_for_owner(owner_id):
+                await store.delete(ids=chunk_ids)
+            logger.info("Chunk embeddings deleted", chunk_count=len(chunk_ids))
+        except Exception as e:
+            logger.error("Failed to delete chunk embeddings", error=str(e))
+            raise
+    
+    async def delete_document_embeddings(self, document_id: str, owner_id: int | None = None):
+        try:
+            for store in await self.stores_for_owner(owner_id):
+                await store.delete(where={"document_id": document_id})
             logger.info("Document embeddings deleted", document_id=document_id)
         except Exception as e:
             logger.error("Failed to delete document embeddings", error=str(e))
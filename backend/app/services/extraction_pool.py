@@ -0,0 +1,129 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+import PyPDF2
+import structlog
+
+from app.core.config import settings
+from app.core.logging import (
+    EXTRACTION_POOL_WORKERS,
+    EXTRACTION_POOL_IN_FLIGHT,
+    EXTRACTION_POOL_QUEUE_WAIT,
+)
+
+logger = structlog.get_logger()
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+class PageTimeoutError(Exception):
+    pass
+
+
+def pool_size() -> int:
+    return settings.EXTRACTION_POOL_WORKERS or os.cpu_count() or 1
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = pool_size()
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            EXTRACTION_POOL_WORKERS.set(workers)
+            logger.info("Extraction process pool started", workers=workers)
+        return _pool
+
+
+def shutdown_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+            EXTRACTION_POOL_WORKERS.set(0)
+
+
+async def run_in_process_pool(func: Callable[..., Any], *args: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    EXTRACTION_POOL_IN_FLIGHT.inc()
+    try:
+        queue_wait, result = await loop.run_in_executor(
+            get_process_pool(), _timed_call, func, time.time(), args
+        )
+    finally:
+        EXTRACTION_POOL_IN_FLIGHT.dec()
+    
+    EXTRACTION_POOL_QUEUE_WAIT.observe(max(queue_wait, 0.0))
+    return result
+
+
+def _timed_call(func: Callable[..., Any], submitted_at: float, args: tuple) -> tuple[float, Any]:
+    return time.time() - submitted_at, func(*args)
+
+
+@contextmanager
+def time_limit(seconds: float | None) -> Iterator[None]:
+    # SIGALRM can only be delivered to the main thread of a process, which
+    # is where pool workers run; inline callers on other threads run unbounded.
+    if not seconds or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    
+    def _raise_timeout(signum, frame):
+        raise PageTimeoutError(f"Timed out after {seconds}s")
+    
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def open_pdf(source: str | bytes) -> PyPDF2.PdfReader:
+    if isinstance(source, bytes):
+        return PyPDF2.PdfReader(io.BytesIO(source))
+    return PyPDF2.PdfReader(source)
+
+
+def count_pdf_pages(source: str | bytes) -> int:
+    return len(open_pdf(source).pages)
+
+
+def extract_pdf_page_range(
+    source: str | bytes,
+    start: int,
+    end: int,
+    page_timeout: float | None = None
+) -> list[dict[str, Any]]:
+    reader = open_pdf(source)
+    pages = []
+    for index in range(start, end):
+        page_start = time.time()
+        try:
+            with time_limit(page_timeout):
+                text = reader.pages[index].extract_text() or ""
+            error = None
+        except PageTimeoutError as e:
+            text = ""
+            error = str(e)
+        pages.append({
+            "page": index,
+            "text": text,
+            "duration": time.time() - page_start,
+            "error": error,
+        })
+    return pages
@@ -0,0 +1,620 @@
+import asyncio
+import hashlib
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Deque, Dict, List
+import structlog
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy import select, delete, update, bindparam, inspect, text
+
+from app.core.config import settings
+from app.core.logging import log_document_processing
+from app.models.document import Document, DocumentChunk
+from app.services.chunk_writer import ChunkWriter
+from app.services.document_processor import DocumentProcessor
+from app.services.embedding_service import EmbeddingService
+from app.services.lexical_index import LexicalIndex
+from app.services.text_chunker import TextChunk
+
+logger = structlog.get_logger()
+
+VECTOR_UPDATE_ATTEMPTS = 3
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+async def ensure_document_columns(conn: AsyncConnection):
+    # create_all does not add columns to existing tables.
+    columns = await conn.run_sync(
+        lambda sync_conn: {column["name"] for column in inspect(sync_conn).get_columns("documents")}
+    )
+    if "file_path" not in columns:
+        await conn.execute(text("ALTER TABLE documents ADD COLUMN file_path VARCHAR"))
+    if "processing_progress" not in columns:
+        await conn.execute(text("ALTER TABLE documents ADD COLUMN processing_progress INTEGER DEFAULT 0"))
+        await conn.execute(text(
+            "UPDATE documents SET processing_progress = 100 WHERE processing_status = 'completed'"
+        ))
+    
+    chunk_columns = await conn.run_sync(
+        lambda sync_conn: {column["name"] for column in inspect(sync_conn).get_columns("document_chunks")}
+    )
+    if "content_hash" not in chunk_columns:
+        await conn.execute(text("ALTER TABLE document_chunks ADD COLUMN content_hash VARCHAR(64)"))
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text(
+                "UPDATE document_chunks "
+                "SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')"
+            ))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_document_chunks_content_hash ON document_chunks (content_hash)"
+    ))
+
+
+class IngestionService:
+    def __init__(
+        self,
+        processor: DocumentProcessor | None = None,
+        embedding_service: EmbeddingService | None = None,
+        chunk_writer: ChunkWriter | None = None,
+        lexical_index: LexicalIndex | None = None
+    ):
+        self.processor = processor or DocumentProcessor()
+        self.embedding_service = embedding_service or EmbeddingService()
+        self.chunk_writer = chunk_writer or ChunkWriter()
+        self.lexical_index = lexical_index or LexicalIndex()
+    
+    async def process_document(self, document_id: str, db: AsyncSession) -> Document | None:
+        document = await self._load_document(document_id, db)
+        if not document:
+            return None
+        if document.processing_status == "completed":
+            # Redelivered after the first run finished (acks_late).
+            logger.info("Document already processed", document_id=str(document.id))
+            return document
+        
+        start_time = time.time()
+        
+        try:
+            await self._remove_leftovers(document, db)
+            await self._update_progress(document, db, "processing", 0)
+            stats = {"character_count": 0, "preview": []}
+            chunk_count = 0
+            batch: List[TextChunk] = []
+            
+            async for chunk, progress in self._iter_chunks(document, stats):
+                batch.append(chunk)
+                if len(batch) < settings.INGEST_CHUNK_BATCH_SIZE:
+                    continue
+                
+                await self._store_chunks(document, batch, list(range(chunk_count, chunk_count + len(batch))), db)
+                chunk_count += len(batch)
+                batch = []
+                await self._update_progress(document, db, "processing", int(progress * 95))
+            
+            if batch:
+                await self._store_chunks(document, batch, list(range(chunk_count, chunk_count + len(batch))), db)
+                chunk_count += len(batch)
+            
+            await self._complete(document, db, stats, chunk_count, start_time)
+            return document
+        
+        except Exception as e:
+            await db.rollback()
+            await db.refresh(document)
+            await self._discard_chunks(document, db)
+            await self._fail(document, db, e, start_time)
+            raise
+    
+    async def reindex_document(
+        self,
+        document_id: str,
+        db: AsyncSession,
+        replacement: Dict[str, Any] | None = None
+    ) -> Document | None:
+        # Re-chunks the current file of an already ingested document, or the
+        # replacement file, and matches chunks by content hash: unchanged
+        # chunks keep their rows and vectors, only new chunks are embedded and
+        # only stale vectors are deleted.
+        document = await self._load_document(document_id, db)
+        if not document:
+            return None
+        
+        start_time = time.time()
+        await self._update_progress(document, db, "processing", 0)
+        
+        existing = await self._load_existing_chunks(document, db)
+        # Vectors a previous reindex failed to delete; new ids must not
+        # reuse theirs.
+        leftover_ids: List[str] = list((document.metadata or {}).get("stale_vectors", []))
+        next_vector_index = 1 + max(
+            [
+                self._vector_index(row.embedding_id)
+                for rows in existing.values()
+                for row in rows
+            ] + [self._vector_index(vector_id) for vector_id in leftover_ids],
+            default=-1
+        )
+        # New rows stay in the open transaction and new vectors are held
+        # back until the swap, so searches see only the old version until
+        # the final commit.
+        pending: Dict[str, list] = {"ids": [], "embeddings": [], "contents": [], "metadatas": []}
+        added_ids: List[str] = pending["ids"]
+        
+        try:
+            # The replacement file's attributes (file_path, filename, ...)
+            # are only flushed by the commit that completes the reindex, so a
+            # failed reindex keeps the previous version and the row stays
+            # unlocked for progress updates.
+            with db.no_autoflush:
+                for key, value in (replacement or {}).items():
+                    setattr(document, key, value)
+                
+                stats = {"character_count": 0, "preview": []}
+                chunk_count = 0
+                moved: List[tuple[DocumentChunk, int]] = []
+                kept = 0
+                batch: List[TextChunk] = []
+                batch_indices: List[int] = []
+                
+                async for chunk, progress in self._iter_chunks(document, stats):
+                    index = chunk_count
+                    chunk_count += 1
+                    
+                    matches = existing.get(content_hash(chunk.content))
+                    if matches:
+                        row = matches.popleft()
+                        kept += 1
+                        if row.chunk_index != index:
+                            moved.append((row, index))
+                        continue
+                    
+                    batch.append(chunk)
+                    batch_indices.append(index)
+                    if len(batch) < settings.INGEST_CHUNK_BATCH_SIZE:
+                        continue
+                    
+                    vector_ids = [f"{document.id}_{next_vector_index + i}" for i in range(len(batch))]
+                    next_vector_index += len(batch)
+                    await self._stage_chunks(document, batch, batch_indices, vector_ids, db, pending)
+                    batch, batch_indices = [], []
+                    await self._report_progress(document, db, int(progress * 95))
+                
+                if batch:
+                    vector_ids = [f"{document.id}_{next_vector_index + i}" for i in range(len(batch))]
+                    await self._stage_chunks(document, batch, batch_indices, vector_ids, db, pending)
+                
+                if moved:
+                    await db.execute(
+                        update(DocumentChunk.__table__)
+                        .where(DocumentChunk.__table__.c.id == bindparam("row_id"))
+                        .values(chunk_index=bindparam("new_index")),
+                        [{"row_id": row.id, "new_index": index} for row, index in moved]
+                    )
+                
+                stale = [row for rows in existing.values() for row in rows]
+                if stale:
+                    await self.lexical_index.remove_chunks(db, [row.id for row in stale])
+                    await db.execute(
+                        delete(DocumentChunk).where(DocumentChunk.id.in_([row.id for row in stale]))
+                    )
+                
+                if added_ids:
+                    await self.embedding_service.add_embeddings(
+                        pending["ids"], pending["embeddings"], pending["contents"], pending["metadatas"]
+                    )
+            
+            await self._complete(
+                document,
+                db,
+                stats,
+                chunk_count,
+                start_time,
+                {"reindex": {"kept": kept, "added": len(added_ids), "removed": len(stale)}}
+            )
+        
+        except Exception as e:
+            await db.rollback()
+            await db.refresh(document)
+            try:
+                await self.embedding_service.delete_embeddings(added_ids, document.owner_id)
+            except Exception as cleanup_error:
+                logger.warning("Failed to discard new embeddings", error=str(cleanup_error))
+            await self._fail(document, db, e, start_time)
+            raise
+        
+        # Vector updates go last: until the rows are committed the old
+        # version stays fully searchable. The document is already completed,
+        # so failures here are retried and then only logged; stale ids that
+        # could not be deleted are kept for the next reindex.
+        await self._retry_vector_update(
+            "update_chunk_indices",
+            self.embedding_service.update_chunk_indices,
+            [row.embedding_id for row, _ in moved],
+            [index for _, index in moved],
+            document.owner_id
+        )
+        stale_ids = [row.embedding_id for row in stale if row.embedding_id] + leftover_ids
+        if not await self._retry_vector_update(
+            "delete_embeddings", self.embedding_service.delete_embeddings, stale_ids, document.owner_id
+        ):
+            document.metadata = {**document.metadata, "stale_vectors": stale_ids}
+            await db.commit()
+        
+        logger.info(
+            "Document reindexed",
+            document_id=str(document.id),
+            kept=kept,
+            added=len(added_ids),
+            removed=len(stale)
+        )
+        return document
+    
+    async def process_documents(self, document_ids: List[str], db: AsyncSession) -> Dict[str, str]:
+        # Bulk ingestion: documents are extracted concurrently and their
+        # chunks pooled, so embedding calls, chunk writes and commits are
+        # shared across documents. A failing document is marked failed
+        # without affecting the rest of the batch.
+        result = await db.execute(select(Document).where(Document.id.in_(document_ids)))
+        loaded = result.scalars().all()
+        if len(loaded) < len(document_ids):
+            logger.warning(
+                "Documents to process not found",
+                missing=len(document_ids) - len(loaded)
+            )
+        
+        documents = [document for document in loaded if document.processing_status != "completed"]
+        for document in documents:
+            await self._remove_leftovers(document, db)
+            document.processing_status = "processing"
+            document.processing_progress = 0
+        await db.commit()
+        
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_CHUNK_BATCH_SIZE)
+        semaphore = asyncio.Semaphore(settings.BULK_INGEST_CONCURRENCY)
+        start_times: Dict[Any, float] = {}
+        failed: set = set()
+        
+        async def extract(document: Document):
+            async with semaphore:
+                start_times[document.id] = time.time()
+                stats = {"character_count": 0, "preview": []}
+                try:
+                    async for chunk, progress in self._iter_chunks(document, stats):
+                        if document.id in failed:
+                            return
+                        await queue.put(("chunk", document, (chunk, progress)))
+                    await queue.put(("done", document, stats))
+                except Exception as e:
+                    await queue.put(("failed", document, e))
+        
+        async def extract_all():
+            await asyncio.gather(*(extract(document) for document in documents))
+            await queue.put(None)
+        
+        entries: List[tuple[Document, TextChunk, int, str]] = []
+        finished: List[tuple[Document, dict]] = []
+        chunk_counts: Dict[Any, int] = defaultdict(int)
+        progress: Dict[Any, float] = {}
+        
+        async def fail(document: Document, error: Exception):
+            failed.add(document.id)
+            progress.pop(document.id, None)
+            await self._discard_chunks(document, db)
+            document.processing_status = "failed"
+            document.error_message = str(error)
+            await db.commit()
+            self._log_result(document, start_times.get(document.id, time.time()), error)
+        
+        async def flush():
+            nonlocal entries, finished
+            batch, entries = entries, []
+            done, finished = finished, []
+            try:
+                if batch:
+                    await self._store_entries(batch, db)
+                for document, stats in done:
+                    self._mark_completed(document, stats, chunk_counts[document.id])
+                    progress.pop(document.id, None)
+                for document in documents:
+                    if document.id in progress:
+                        document.processing_progress = int(progress.pop(document.id) * 95)
+                await db.commit()
+            except Exception as e:
+                logger.error("Bulk ingestion batch failed", error=str(e))
+                await db.rollback()
+                for document in documents:
+                    await db.refresh(document)
+                affected = {document.id: document for document, *_ in batch}
+                affected.update((document.id, document) for document, _ in done)
+                for document in affected.values():
+                    await fail(document, e)
+                return
+            
+            for document, _ in done:
+                self._log_result(document, start_times[document.id])
+        
+        extractor = asyncio.create_task(extract_all())
+        try:
+            while (item := await queue.get()) is not None:
+                kind, document, payload = item
+                if document.id in failed:
+                    continue
+                
+                if kind == "chunk":
+                    chunk, progress[document.id] = payload
+                    index = chunk_counts[document.id]
+                    chunk_counts[document.id] += 1
+                    entries.append((document, chunk, index, f"{document.id}_{index}"))
+                    if len(entries) >= settings.INGEST_CHUNK_BATCH_SIZE:
+                        await flush()
+                elif kind == "done":
+                    finished.append((document, payload))
+                else:
+                    entries = [entry for entry in entries if entry[0].id != document.id]
+                    await fail(document, payload)
+            
+            await flush()
+            await extractor
+        finally:
+            extractor.cancel()
+        
+        return {str(document.id): document.processing_status for document in loaded}
+    
+    async def _load_document(self, document_id: str, db: AsyncSession) -> Document | None:
+        result = await db.execute(select(Document).where(Document.id == document_id))
+        document = result.scalar_one_or_none()
+        if not document:
+            logger.warning("Document to process not found", document_id=document_id)
+        return document
+    
+    async def _load_existing_chunks(
+        self,
+        document: Document,
+        db: AsyncSession
+    ) -> Dict[str, Deque[DocumentChunk]]:
+        result = await db.execute(
+            select(DocumentChunk)
+            .where(DocumentChunk.document_id == document.id)
+            .order_by(DocumentChunk.chunk_index)
+        )
+        existing: Dict[str, Deque[DocumentChunk]] = defaultdict(deque)
+        missing: List[DocumentChunk] = []
+        for row in result.scalars():
+            if row.content_hash is None:
+                missing.append(row)
+            existing[row.content_hash or content_hash(row.content)].append(row)
+        
+        # Chunks stored before content hashes were recorded get them here,
+        # in the reindex transaction.
+        if missing:
+            await db.execute(
+                update(DocumentChunk.__table__)
+                .where(DocumentChunk.__table__.c.id == bindparam("row_id"))
+                .values(content_hash=bindparam("hash")),
+                [{"row_id": row.id, "hash": content_hash(row.content)} for row in missing]
+            )
+        return existing
+    
+    def _vector_index(self, embedding_id: str | None) -> int:
+        try:
+            return int(embedding_id.rsplit("_", 1)[1])
+        except (AttributeError, IndexError, ValueError):
+            return -1
+    
+    def _iter_chunks(
+        self,
+        document: Document,
+        stats: dict
+    ) -> AsyncIterator[tuple[TextChunk, float]]:
+        return self.processor.split_stream(
+            self._track_text(self._iter_file_text(document), stats)
+        )
+    
+    async def _iter_file_text(self, document: Document) -> AsyncIterator[tuple[str, float]]:
+        with open(document.file_path, "rb") as file:
+            async for text, progress in self.processor.iter_text(file, document.filename):
+                yield text, progress
+    
+    async def _track_text(
+        self,
+        texts: AsyncIterator[tuple[str, float]],
+        stats: dict
+    ) -> AsyncIterator[tuple[str, float]]:
+        async for text, progress in texts:
+            remaining = settings.DOCUMENT_CONTENT_PREVIEW_CHARS - stats["character_count"]
+            if remaining > 0:
+                stats["preview"].append(text[:remaining])
+            stats["character_count"] += len(text)
+            yield text, progress
+    
+    async def _store_chunks(
+        self,
+        document: Document,
+        chunks: List[TextChunk],
+        chunk_indices: List[int],
+        db: AsyncSession
+    ):
+        vector_ids = [f"{document.id}_{i}" for i in chunk_indices]
+        entries = list(zip([document] * len(chunks), chunks, chunk_indices, vector_ids))
+        await self._store_entries(entries, db)
+    
+    async def _store_entries(
+        self,
+        entries: List[tuple[Document, TextChunk, int, str]],
+        db: AsyncSession
+    ):
+        # Entries may span several documents; they share one embeddings call
+        # and one chunk write.
+        await self.embedding_service.store_embeddings(
+            [vector_id for _, _, _, vector_id in entries],
+            [chunk.content for _, chunk, _, _ in entries],
+            self._entry_metadatas(entries)
+        )
+        await self._write_entries(entries, db)
+    
+    async def _stage_chunks(
+        self,
+        document: Document,
+        chunks: List[TextChunk],
+        chunk_indices: List[int],
+        vector_ids: List[str],
+        db: AsyncSession,
+        pending: Dict[str, list]
+    ):
+        # Embeds and writes the rows without committing; the vectors are
+        # collected in pending for the caller to store.
+        entries = list(zip([document] * len(chunks), chunks, chunk_indices, vector_ids))
+        contents = [chunk.content for chunk in chunks]
+        embeddings = await self.embedding_service.get_embeddings(contents)
+        await self._write_entries(entries, db)
+        pending["ids"].extend(vector_ids)
+        pending["embeddings"].extend(embeddings)
+        pending["contents"].extend(contents)
+        pending["metadatas"].extend(self._entry_metadatas(entries))
+    
+    def _entry_metadatas(self, entries: List[tuple[Document, TextChunk, int, str]]) -> List[dict]:
+        return [
+            self.embedding_service.chunk_metadata(
+                str(document.id),
+                index,
+                chunk.content,
+                {"filename": document.filename, "owner_id": document.owner_id}
+            )
+            for document, chunk, index, _ in entries
+        ]
+    
+    async def _write_entries(
+        self,
+        entries: List[tuple[Document, TextChunk, int, str]],
+        db: AsyncSession
+    ):
+        chunk_ids = await self.chunk_writer.write(db, [
+            {
+                "document_id": document.id,
+                "chunk_index": index,
+                "content": chunk.content,
+                "content_hash": content_hash(chunk.content),
+                "embedding_id": vector_id,
+                "tokens": chunk.tokens,
+            }
+            for document, chunk, index, vector_id in entries
+        ])
+        
+        await self.lexical_index.add(db, [
+            {
+                "owner_id": document.owner_id,
+                "document_id": document.id,
+                "chunk_id": chunk_id,
+                "content": chunk.content,
+                "tokens": chunk.tokens,
+            }
+            for (document, chunk, _, _), chunk_id in zip(entries, chunk_ids)
+        ])
+    
+    async def _complete(
+        self,
+        document: Document,
+        db: AsyncSession,
+        stats: dict,
+        chunk_count: int,
+        start_time: float,
+        extra_metadata: dict | None = None
+    ):
+        self._mark_completed(document, stats, chunk_count, extra_metadata)
+        await db.commit()
+        self._log_result(document, start_time)
+    
+    def _mark_completed(
+        self,
+        document: Document,
+        stats: dict,
+        chunk_count: int,
+        extra_metadata: dict | None = None
+    ):
+        document.content = "".join(stats["preview"])
+        document.metadata = {
+            "filename": document.filename,
+            "file_type": Path(document.filename).suffix.lower(),
+            "chunk_count": chunk_count,
+            "character_count": stats["character_count"],
+            **(extra_metadata or {})
+        }
+        document.error_message = None
+        document.processed_at = datetime.now(timezone.utc)
+        document.processing_status = "completed"
+        document.processing_progress = 100
+    
+    async def _fail(
+        self,
+        document: Document,
+        db: AsyncSession,
+        error: Exception,
+        start_time: float
+    ):
+        document.processing_status = "failed"
+        document.error_message = str(error)
+        await db.commit()
+        self._log_result(document, start_time, error)
+    
+    def _log_result(self, document: Document, start_time: float, error: Exception | None = None):
+        log_document_processing(
+            filename=document.filename,
+            file_type=Path(document.filename).suffix.lower(),
+            duration=time.time() - start_time,
+            status="failed" if error else "completed",
+            user_id=document.owner_id,
+            error=str(error) if error else None
+        )
+    
+    async def _remove_leftovers(self, document: Document, db: AsyncSession):
+        # A task redelivered after a worker died mid-run finds the chunks of
+        # the killed attempt; they are removed so they are not stored twice.
+        if document.processing_status != "pending":
+            await self._remove_chunks(document, db)
+    
+    async def _remove_chunks(self, document: Document, db: AsyncSession):
+        await self.embedding_service.delete_document_embeddings(str(document.id), document.owner_id)
+        await self.lexical_index.remove_document(db, document.id)
+        await db.execute(delete(DocumentChunk).where(DocumentChunk.document_id == document.id))
+    
+    async def _discard_chunks(self, document: Document, db: AsyncSession):
+        try:
+            await self._remove_chunks(document, db)
+        except Exception as e:
+            logger.warning("Failed to discard partial chunks", document_id=str(document.id), error=str(e))
+    
+    async def _retry_vector_update(self, operation: str, func, *args) -> bool:
+        for attempt in range(1, VECTOR_UPDATE_ATTEMPTS + 1):
+            try:
+                await func(*args)
+                return True
+            except Exception as e:
+                logger.warning("Vector store update failed", operation=operation, attempt=attempt, error=str(e))
+                if attempt < VECTOR_UPDATE_ATTEMPTS:
+                    await asyncio.sleep(attempt)
+        return False
+    
+    async def _update_progress(
+        self,
+        document: Document,
+        db: AsyncSession,
+        status: str,
+        progress: int
+    ):
+        document.processing_status = status
+        document.processing_progress = progress
+        await db.commit()
+    
+    async def _report_progress(self, document: Document, db: AsyncSession, progress: int):
+        # Written from its own session so that the caller's transaction
+        # stays open.
+        async with AsyncSession(db.bind) as progress_db:
+            await progress_db.execute(
+                update(Document).where(Document.id == document.id).values(processing_progress=progress)
+            )
+            await progress_db.commit()
@@ -0,0 +1,168 @@
+import math
+import re
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+from sqlalchemy import case, delete, desc, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.document import ChunkTerm, Document, DocumentChunk
+
+TERM_PATTERN = re.compile(r"\w+(?:[-./:#]\w+)*")
+PART_PATTERN = re.compile(r"[-./:#]")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the "
+    "this to was were will with".split()
+)
+TERM_COLUMNS = ["owner_id", "term", "chunk_id", "document_id", "frequency", "chunk_length"]
+
+
+def tokenize(text: str) -> List[str]:
+    # Identifiers such as "INV-2023-0042" or "4.2.1" are kept whole and also
+    # split into their parts, so either form of the query matches.
+    terms = []
+    for match in TERM_PATTERN.finditer(text.lower()):
+        term = match.group()
+        parts = PART_PATTERN.split(term)
+        if len(parts) > 1:
+            terms.append(term[:64])
+        terms.extend(part[:64] for part in parts if part and part not in STOPWORDS)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda id_: scores[id_], reverse=True)
+
+
+class LexicalIndex:
+    # Incremental BM25 over DocumentChunk.content, kept as postings in the
+    # chunk_terms table. Chunk counts and average lengths per owner are
+    # cached for LEXICAL_STATS_TTL seconds; BM25 only needs them roughly.
+    def __init__(self):
+        self._stats: Dict[int, Tuple[float, int, float]] = {}
+    
+    async def add(self, db: AsyncSession, chunks: List[Dict[str, Any]]):
+        # chunks: {"owner_id", "document_id", "chunk_id", "content", "tokens"}
+        rows = []
+        for chunk in chunks:
+            for term, frequency in Counter(tokenize(chunk["content"])).items():
+                rows.append({
+                    "owner_id": chunk["owner_id"],
+                    "term": term,
+                    "chunk_id": chunk["chunk_id"],
+                    "document_id": chunk["document_id"],
+                    "frequency": frequency,
+                    "chunk_length": chunk["tokens"] or 1,
+                })
+        if not rows:
+            return
+        
+        connection = await db.connection()
+        if connection.dialect.name == "postgresql" and connection.dialect.driver == "asyncpg":
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                ChunkTerm.__tablename__,
+                records=[tuple(row[column] for column in TERM_COLUMNS) for row in rows],
+                columns=TERM_COLUMNS
+            )
+        else:
+            await db.execute(insert(ChunkTerm.__table__), rows)
+    
+    async def remove_chunks(self, db: AsyncSession, chunk_ids):
+        # chunk_ids may be a list or a select of DocumentChunk ids.
+        await db.execute(delete(ChunkTerm).where(ChunkTerm.chunk_id.in_(chunk_ids)))
+    
+    async def remove_document(self, db: AsyncSession, document_id: uuid.UUID):
+        await db.execute(delete(ChunkTerm).where(ChunkTerm.document_id == document_id))
+    
+    async def search(
+        self,
+        db: AsyncSession,
+        query: str,
+        owner_id: int,
+        n_results: int = 5
+    ) -> Dict[str, list]:
+        # Returns the best BM25 matches in the shape of a vector search, with
+        # embedding ids as "ids" and BM25 scores instead of distances.
+        results = {"ids": [], "documents": [], "metadatas": [], "scores": []}
+        terms = list(dict.fromkeys(tokenize(query)))[:settings.LEXICAL_MAX_QUERY_TERMS]
+        if not terms:
+            return results
+        
+        chunk_count, average_length = await self._owner_stats(db, owner_id)
+        if not chunk_count:
+            return results
+        
+        frequencies = await db.execute(
+            select(ChunkTerm.term, func.count())
+            .where(ChunkTerm.owner_id == owner_id, ChunkTerm.term.in_(terms))
+            .group_by(ChunkTerm.term)
+        )
+        # Terms in most chunks barely change the ranking but dominate the
+        # cost of scoring, so they are left to the vector side.
+        idf = {
+            term: math.log(1 + (chunk_count - df + 0.5) / (df + 0.5))
+            for term, df in frequencies
+            if df <= chunk_count * settings.LEXICAL_MAX_DOCUMENT_FREQUENCY
+        }
+        if not idf:
+            return results
+        
+        k1, b = settings.BM25_K1, settings.BM25_B
+        score = func.sum(
+            case(idf, value=ChunkTerm.term)
+            * ChunkTerm.frequency * (k1 + 1)
+            / (ChunkTerm.frequency + k1 * (1 - b + b * ChunkTerm.chunk_length / average_length))
+        ).label("score")
+        ranked = (await db.execute(
+            select(ChunkTerm.chunk_id, score)
+            .where(ChunkTerm.owner_id == owner_id, ChunkTerm.term.in_(list(idf)))
+            .group_by(ChunkTerm.chunk_id)
+            .order_by(desc("score"))
+            .limit(n_results)
+        )).all()
+        if not ranked:
+            return results
+        
+        rows = await db.execute(
+            select(DocumentChunk, Document.filename)
+            .join(Document, Document.id == DocumentChunk.document_id)
+            .where(DocumentChunk.id.in_([chunk_id for chunk_id, _ in ranked]))
+        )
+        chunks = {chunk.id: (chunk, filename) for chunk, filename in rows}
+        for chunk_id, chunk_score in ranked:
+            if chunk_id not in chunks:
+                continue
+            chunk, filename = chunks[chunk_id]
+            results["ids"].append(chunk.embedding_id)
+            results["documents"].append(chunk.content)
+            results["metadatas"].append({
+                "document_id": str(chunk.document_id),
+                "chunk_index": chunk.chunk_index,
+                "text_length": len(chunk.content),
+                "filename": filename,
+                "owner_id": owner_id,
+            })
+            results["scores"].append(float(chunk_score))
+        return results
+    
+    async def _owner_stats(self, db: AsyncSession, owner_id: int) -> Tuple[int, float]:
+        cached = self._stats.get(owner_id)
+        if cached and time.monotonic() - cached[0] < settings.LEXICAL_STATS_TTL:
+            return cached[1], cached[2]
+        
+        result = await db.execute(
+            select(func.count(DocumentChunk.id), func.avg(DocumentChunk.tokens))
+            .join(Document, Document.id == DocumentChunk.document_id)
+            .where(Document.owner_id == owner_id)
+        )
+        chunk_count, average_length = result.one()
+        stats = (int(chunk_count or 0), float(average_length or 1.0))
+        self._stats[owner_id] = (time.monotonic(), *stats)
+        return stats
@@ -0,0 +1,69 @@
+import io
+import time
+from typing import Any
+from PIL import Image, ImageOps, ImageSequence
+import pytesseract
+
+from app.services.extraction_pool import open_pdf
+
+DEFAULT_IMAGE_DPI = 300
+
+
+def preprocess_image(image: Image.Image, source_dpi: float, target_dpi: int, threshold: int) -> Image.Image:
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("L")
+    
+    if source_dpi > target_dpi:
+        scale = target_dpi / source_dpi
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+    
+    image = ImageOps.autocontrast(image)
+    return image.point(lambda value: 255 if value > threshold else 0, mode="1")
+
+
+def _recognize(image: Image.Image, source_dpi: float, options: dict[str, Any]) -> str:
+    prepared = preprocess_image(
+        image, source_dpi, options["target_dpi"], options["threshold"]
+    )
+    return pytesseract.image_to_string(
+        prepared,
+        lang=options["language"],
+        timeout=options["timeout"]
+    )
+
+
+def ocr_image(source: str | bytes, options: dict[str, Any]) -> dict[str, Any]:
+    start_time = time.time()
+    image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    source_dpi = (image.info.get("dpi") or (DEFAULT_IMAGE_DPI,))[0] or DEFAULT_IMAGE_DPI
+    
+    texts = [
+        _recognize(frame.copy(), source_dpi, options)
+        for frame in ImageSequence.Iterator(image)
+    ]
+    return {
+        "text": "\n\n".join(text.strip() for text in texts if text.strip()),
+        "duration": time.time() - start_time,
+    }
+
+
+def ocr_pdf_page(source: str | bytes, page_index: int, options: dict[str, Any]) -> dict[str, Any]:
+    start_time = time.time()
+    page = open_pdf(source).pages[page_index]
+    page_width_inches = float(page.mediabox.width) / 72 or 1
+    
+    texts = []
+    for embedded in page.images:
+        image = Image.open(io.BytesIO(embedded.data))
+        # Scanned pages are a single image spanning the page, so its pixel
+        # width over the page width gives the effective scan resolution.
+        text = _recognize(image, image.width / page_width_inches, options)
+        if text.strip():
+            texts.append(text.strip())
+    
+    return {
+        "page": page_index,
+        "text": "\n\n".join(texts),
+        "duration": time.time() - start_time,
+    }
@@ -0,0 +1,389 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Dict, Optional
+import httpx
+import openai
+import structlog
+
+from app.core.config import settings
+from app.core.logging import (
+    OPENAI_CIRCUIT_OPEN,
+    OPENAI_CIRCUIT_REJECTIONS,
+    OPENAI_HEDGED_REQUESTS,
+    OPENAI_RATE_LIMIT_WAIT,
+    OPENAI_REQUESTS,
+    OPENAI_REQUEST_DURATION,
+    OPENAI_REQUESTS_IN_FLIGHT,
+    OPENAI_POOL_CONNECTIONS,
+    OPENAI_RETRIES,
+)
+
+logger = structlog.get_logger()
+
+# Rough size of a token in characters, used to estimate the tokens a request
+# counts against the rate limit without running the tokenizer.
+CHARS_PER_TOKEN = 4
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Requests carrying this header are sent once, without retries or hedging.
+# The header is removed before the request leaves the process.
+NO_RETRY_HEADER = "x-docintell-no-retry"
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncHTTPTransport):
+        self.transport = transport
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = request.url.path
+        OPENAI_REQUESTS_IN_FLIGHT.inc()
+        start_time = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.transport.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            OPENAI_REQUESTS_IN_FLIGHT.dec()
+            OPENAI_REQUEST_DURATION.labels(endpoint=endpoint).observe(time.perf_counter() - start_time)
+            OPENAI_REQUESTS.labels(endpoint=endpoint, status=status).inc()
+            self._record_pool()
+    
+    def _record_pool(self):
+        # httpx does not expose pool statistics; read them from the
+        # underlying httpcore pool when it is available.
+        connections = getattr(getattr(self.transport, "_pool", None), "connections", None)
+        if connections is None:
+            return
+        idle = sum(1 for connection in connections if connection.is_idle())
+        OPENAI_POOL_CONNECTIONS.labels(state="idle").set(idle)
+        OPENAI_POOL_CONNECTIONS.labels(state="active").set(len(connections) - idle)
+    
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class TokenBucket:
+    # Refills at per_minute / 60 per second, up to one minute's worth.
+    # Callers reserve up front and sleep off any deficit, so waiters are
+    # served in arrival order. The bucket holds no asyncio state, because
+    # Celery tasks each run in a new event loop.
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self, amount: float) -> float:
+        # Returns the seconds to wait before the reserved amount is covered.
+        with self._lock:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+    
+    def available(self, amount: float) -> bool:
+        with self._lock:
+            self._refill()
+            return self.tokens >= min(amount, self.capacity)
+    
+    def drain(self):
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class CircuitBreaker:
+    # Opens after failure_threshold consecutive server errors or connection
+    # failures and rejects requests for reset_timeout seconds. Then a
+    # single probe is let through; its outcome closes or reopens the
+    # circuit. A probe that never reports back is replaced after another
+    # reset_timeout.
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                return False
+            self._probe_started = now
+            return True
+    
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+    
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("OpenAI circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self._probe_started = None
+        OPENAI_CIRCUIT_OPEN.set(0)
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            probing = self._probe_started is not None
+            self._probe_started = None
+            if not probing and (self.opened_at is not None or self.failures < self.failure_threshold):
+                return
+            self.opened_at = time.monotonic()
+        logger.warning("OpenAI circuit opened", failures=self.failures, reset_timeout=self.reset_timeout)
+        OPENAI_CIRCUIT_OPEN.set(1)
+
+
+class ProviderGuard:
+    # Rate limits and circuit breaker shared by every OpenAI client of the
+    # process, however many clients and event loops there are.
+    def __init__(
+        self,
+        rate_limits: Dict[str, Dict[str, int]],
+        failure_threshold: int,
+        reset_timeout: float
+    ):
+        self.rate_limits = rate_limits
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._buckets: Dict[str, tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._lock = threading.Lock()
+    
+    def reserve(self, model: Optional[str], tokens: int) -> float:
+        requests, token_bucket = self._buckets_for(model)
+        wait = requests.reserve(1) if requests else 0.0
+        if token_bucket:
+            wait = max(wait, token_bucket.reserve(tokens))
+        return wait
+    
+    def available(self, model: Optional[str], tokens: int) -> bool:
+        requests, token_bucket = self._buckets_for(model)
+        return (
+            (requests is None or requests.available(1))
+            and (token_bucket is None or token_bucket.available(tokens))
+        )
+    
+    def throttle(self, model: Optional[str]):
+        # After a 429 the provider's budget is spent, so the buckets are
+        # emptied and later requests wait for them to refill.
+        for bucket in self._buckets_for(model):
+            if bucket:
+                bucket.drain()
+    
+    def _buckets_for(self, model: Optional[str]) -> tuple[Optional[TokenBucket], Optional[TokenBucket]]:
+        limits = self.rate_limits.get(model) if model else None
+        if not limits:
+            return None, None
+        with self._lock:
+            if model not in self._buckets:
+                self._buckets[model] = (
+                    TokenBucket(limits["rpm"]) if limits.get("rpm") else None,
+                    TokenBucket(limits["tpm"]) if limits.get("tpm") else None,
+                )
+            return self._buckets[model]
+
+
+def request_cost(request: httpx.Request) -> tuple[Optional[str], int, bool]:
+    # The model, an estimate of the tokens counted against its limit (the
+    # prompt plus the completion allowance) and whether the response is
+    # streamed.
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead):
+        return None, 0, False
+    if not isinstance(body, dict):
+        return None, 0, False
+    
+    if "messages" in body:
+        characters = sum(len(str(message.get("content") or "")) for message in body["messages"])
+        tokens = characters // CHARS_PER_TOKEN + (body.get("max_tokens") or 0)
+    else:
+        inputs = body.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        tokens = sum(
+            len(item) // CHARS_PER_TOKEN if isinstance(item, str) else len(item)
+            for item in inputs
+        )
+    return body.get("model"), tokens, bool(body.get("stream"))
+
+
+def backoff_delay(attempt: int) -> float:
+    # Full jitter keeps clients that failed together from retrying together.
+    return random.uniform(0, min(settings.OPENAI_RETRY_MAX_DELAY, settings.OPENAI_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def retry_after(response: httpx.Response) -> float:
+    try:
+        if "retry-after-ms" in response.headers:
+            return float(response.headers["retry-after-ms"]) / 1000
+        return float(response.headers.get("retry-after", 0))
+    except ValueError:
+        return 0.0
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    # Waits for the client-side rate limits, retries retryable failures with
+    # jittered backoff, fails fast while the circuit breaker is open and,
+    # when OPENAI_HEDGE_DELAY is set, duplicates slow requests. The SDK's
+    # own retries are disabled so every attempt passes through here.
+    def __init__(self, transport: httpx.AsyncBaseTransport, guard: ProviderGuard):
+        self.transport = transport
+        self.guard = guard
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = request.url.path
+        model, tokens, streaming = request_cost(request)
+        single_attempt = request.headers.pop(NO_RETRY_HEADER, None) is not None
+        max_retries = 0 if single_attempt else settings.OPENAI_MAX_RETRIES
+        hedge = (
+            settings.OPENAI_HEDGE_DELAY > 0 and request.method == "POST" and not streaming and not single_attempt
+        )
+        
+        for attempt in range(max_retries + 1):
+            if not self.guard.breaker.allow():
+                OPENAI_CIRCUIT_REJECTIONS.labels(endpoint=endpoint).inc()
+                return self._circuit_open_response(request)
+            
+            wait = self.guard.reserve(model, tokens)
+            if model:
+                OPENAI_RATE_LIMIT_WAIT.labels(model=model).observe(wait)
+            if wait:
+                await asyncio.sleep(wait)
+            
+            try:
+                if hedge:
+                    response = await self._send_hedged(request, model, tokens)
+                else:
+                    response = await self.transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                self.guard.breaker.record_failure()
+                if attempt == max_retries:
+                    raise
+                reason = "timeout" if isinstance(e, httpx.TimeoutException) else "connection"
+                delay = backoff_delay(attempt)
+            else:
+                if response.status_code >= 500:
+                    self.guard.breaker.record_failure()
+                else:
+                    self.guard.breaker.record_success()
+                if response.status_code not in RETRYABLE_STATUS or attempt == max_retries:
+                    return response
+                if response.status_code == 429:
+                    self.guard.throttle(model)
+                reason = str(response.status_code)
+                delay = min(
+                    max(backoff_delay(attempt), retry_after(response)),
+                    settings.OPENAI_RETRY_MAX_DELAY
+                )
+                await response.aclose()
+            
+            OPENAI_RETRIES.labels(endpoint=endpoint, reason=reason).inc()
+            logger.warning(
+                "OpenAI request retried",
+                endpoint=endpoint,
+                reason=reason,
+                attempt=attempt + 1,
+                delay=round(delay, 2)
+            )
+            await asyncio.sleep(delay)
+    
+    async def _send_hedged(self, request: httpx.Request, model: Optional[str], tokens: int) -> httpx.Response:
+        # A second copy is sent if the first has not answered within
+        # OPENAI_HEDGE_DELAY and the rate limits have room for it. The first
+        # response wins and the other copy is cancelled.
+        tasks = [asyncio.ensure_future(self.transport.handle_async_request(request))]
+        winner = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=settings.OPENAI_HEDGE_DELAY)
+            if not done and self.guard.available(model, tokens):
+                self.guard.reserve(model, tokens)
+                tasks.append(asyncio.ensure_future(self.transport.handle_async_request(request)))
+            
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in tasks if task in done and task.exception() is None), None)
+            
+            if len(tasks) > 1:
+                label = "none" if winner is None else ("primary" if winner is tasks[0] else "hedge")
+                OPENAI_HEDGED_REQUESTS.labels(endpoint=request.url.path, winner=label).inc()
+            return (winner or tasks[0]).result()
+        finally:
+            for task in tasks:
+                if task is not winner:
+                    task.cancel()
+                    task.add_done_callback(_discard_response)
+    
+    def _circuit_open_response(self, request: httpx.Request) -> httpx.Response:
+        # Surfaces through the SDK as an InternalServerError carrying this
+        # message.
+        return httpx.Response(
+            503,
+            headers={"retry-after": str(round(self.guard.breaker.retry_after(), 1))},
+            json={"error": {
+                "message": "OpenAI requests are paused after repeated failures",
+                "type": "circuit_open",
+            }},
+            request=request,
+        )
+    
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def _discard_response(task: asyncio.Future):
+    if task.cancelled() or task.exception() is not None:
+        return
+    asyncio.ensure_future(task.result().aclose())
+
+
+_provider_guard: Optional[ProviderGuard] = None
+
+
+def provider_guard() -> ProviderGuard:
+    global _provider_guard
+    if _provider_guard is None:
+        _provider_guard = ProviderGuard(
+            settings.OPENAI_RATE_LIMITS,
+            settings.OPENAI_CIRCUIT_FAILURE_THRESHOLD,
+            settings.OPENAI_CIRCUIT_RESET_TIMEOUT
+        )
+    return _provider_guard
+
+
+def create_openai_client(guard: ProviderGuard | None = None) -> openai.AsyncOpenAI:
+    # Clients built here share the process-wide ProviderGuard, so the chat
+    # and embedding services and the Celery tasks draw on the same limits.
+    transport = ResilientTransport(
+        InstrumentedTransport(httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            )
+        )),
+        guard or provider_guard()
+    )
+    return openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        http_client=httpx.AsyncClient(transport=transport, timeout=settings.OPENAI_TIMEOUT),
+        max_retries=0,
+    )
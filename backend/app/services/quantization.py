@@ -0,0 +1,101 @@
+import os
+import tempfile
+from typing import Optional, Tuple
+import numpy as np
+
+QUANTIZATION_MODES = ("none", "float16", "int8")
+
+
+def quantize(vectors: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    # Vectors are unit-normalized. int8 codes carry a per-vector scale so
+    # every row uses the full [-127, 127] range.
+    if mode == "float16":
+        return vectors.astype(np.float16), None
+    if mode == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales
+    raise ValueError(f"Unsupported vector quantization: {mode}")
+
+
+def approximate_scores(
+    codes: np.ndarray,
+    scales: Optional[np.ndarray],
+    queries: np.ndarray,
+    block_size: int = 16384
+) -> np.ndarray:
+    # Dot products against the codes, decoded a block at a time so the
+    # float32 copy never grows beyond block_size rows.
+    scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+    for start in range(0, len(codes), block_size):
+        block = codes[start:start + block_size].astype(np.float32)
+        scores[:, start:start + block_size] = queries @ block.T
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+class FullPrecisionMatrix:
+    # Growable float32 matrix used for exact rescoring. With a directory the
+    # rows live in a memory-mapped file, so they sit in the page cache rather
+    # than on the heap; without one they are kept in memory.
+    def __init__(self, dimensions: int, directory: Optional[str] = None):
+        self.dimensions = dimensions
+        self.path = None
+        self._rows = 0
+        self._data = np.empty((0, dimensions), dtype=np.float32)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            fd, self.path = tempfile.mkstemp(prefix="vectors-", suffix=".f32", dir=directory)
+            os.close(fd)
+    
+    def __len__(self) -> int:
+        return self._rows
+    
+    def __getitem__(self, index) -> np.ndarray:
+        return np.asarray(self._data[:self._rows][index])
+    
+    @property
+    def nbytes(self) -> int:
+        return self._rows * self.dimensions * 4
+    
+    def append(self, vectors: np.ndarray):
+        rows = self._rows + len(vectors)
+        if rows > len(self._data):
+            self._resize(max(rows, 2 * len(self._data), 1024))
+        self._data[self._rows:rows] = vectors
+        self._rows = rows
+    
+    def take(self, indices: np.ndarray) -> np.ndarray:
+        # Sorted reads keep page faults on the mapped file sequential.
+        order = np.argsort(indices, kind="stable")
+        rows = np.empty((len(indices), self.dimensions), dtype=np.float32)
+        rows[order] = self._data[indices[order]]
+        return rows
+    
+    def keep(self, indices: np.ndarray, block_size: int = 16384):
+        # Compacts in place. indices are ascending, so every source row sits
+        # at or after its destination and blocks can be copied forward.
+        for start in range(0, len(indices), block_size):
+            block = indices[start:start + block_size]
+            self._data[start:start + len(block)] = self._data[block]
+        self._rows = len(indices)
+    
+    def close(self):
+        self._data = np.empty((0, self.dimensions), dtype=np.float32)
+        self._rows = 0
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+    
+    def _resize(self, capacity: int):
+        if self.path is None:
+            data = np.empty((capacity, self.dimensions), dtype=np.float32)
+            data[:self._rows] = self._data[:self._rows]
+            self._data = data
+            return
+        if isinstance(self._data, np.memmap):
+            self._data.flush()
+        self._data = None
+        os.truncate(self.path, capacity * self.dimensions * 4)
+        self._data = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dimensions))
@@ -0,0 +1,159 @@
+import base64
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+import redis.asyncio as redis
+import structlog
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.document import Document
+
+logger = structlog.get_logger()
+
+
+async def corpus_version(db: AsyncSession, owner_id: int) -> str:
+    # Changes whenever the owner uploads, reprocesses or deletes a document,
+    # so entries of the previous version are never read again and expire.
+    count, updated, processed = (await db.execute(
+        select(
+            func.count(Document.id),
+            func.max(func.coalesce(Document.updated_at, Document.created_at)),
+            func.max(Document.processed_at)
+        ).where(Document.owner_id == owner_id)
+    )).one()
+    return f"{count}:{updated}:{processed}"
+
+
+def response_cache_key(owner_id: int, version: str, chunk_ids: List[str]) -> str:
+    fingerprint = "\n".join([settings.LLM_MODEL, version, *sorted(chunk_ids)])
+    return f"{owner_id}:{hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()}"
+
+
+def _best_match(entries: List[Dict], embedding: List[float], threshold: float) -> Optional[str]:
+    if not entries:
+        return None
+    query = np.asarray(embedding, dtype=np.float32)
+    cached = np.stack([entry["embedding"] for entry in entries])
+    norms = np.linalg.norm(cached, axis=1) * np.linalg.norm(query)
+    similarities = cached @ query / np.where(norms == 0, 1.0, norms)
+    best = int(np.argmax(similarities))
+    return entries[best]["response"] if similarities[best] >= threshold else None
+
+
+class ResponseCache:
+    # Answers grouped by owner, corpus version and retrieved chunk ids. A
+    # lookup hits when a cached query of the same group is within the
+    # similarity threshold of the new one.
+    backend = "none"
+    
+    def __init__(self, similarity: float, ttl: int, entries_per_key: int):
+        self.similarity = similarity
+        self.ttl = ttl
+        self.entries_per_key = entries_per_key
+    
+    async def lookup(self, key: str, embedding: List[float]) -> Optional[str]:
+        return _best_match(await self._entries(key), embedding, self.similarity)
+    
+    async def store(self, key: str, embedding: List[float], response: str):
+        raise NotImplementedError
+    
+    async def close(self):
+        pass
+    
+    async def _entries(self, key: str) -> List[Dict]:
+        raise NotImplementedError
+
+
+class MemoryResponseCache(ResponseCache):
+    backend = "memory"
+    
+    def __init__(self, similarity: float, ttl: int, entries_per_key: int, max_keys: int):
+        super().__init__(similarity, ttl, entries_per_key)
+        self.max_keys = max_keys
+        self._groups: OrderedDict[str, tuple[float, List[Dict]]] = OrderedDict()
+    
+    async def store(self, key: str, embedding: List[float], response: str):
+        entries = await self._entries(key)
+        entries.insert(0, {"embedding": np.asarray(embedding, dtype=np.float32), "response": response})
+        self._groups[key] = (time.monotonic() + self.ttl, entries[:self.entries_per_key])
+        self._groups.move_to_end(key)
+        while len(self._groups) > self.max_keys:
+            self._groups.popitem(last=False)
+    
+    async def _entries(self, key: str) -> List[Dict]:
+        group = self._groups.get(key)
+        if group is None:
+            return []
+        if group[0] <= time.monotonic():
+            del self._groups[key]
+            return []
+        self._groups.move_to_end(key)
+        return list(group[1])
+
+
+class RedisResponseCache(ResponseCache):
+    backend = "redis"
+    
+    def __init__(
+        self,
+        url: str,
+        similarity: float,
+        ttl: int,
+        entries_per_key: int,
+        prefix: str = "response"
+    ):
+        super().__init__(similarity, ttl, entries_per_key)
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+    
+    async def store(self, key: str, embedding: List[float], response: str):
+        entry = json.dumps({
+            "embedding": base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode(),
+            "response": response,
+        })
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lpush(f"{self.prefix}:{key}", entry)
+            pipe.ltrim(f"{self.prefix}:{key}", 0, self.entries_per_key - 1)
+            pipe.expire(f"{self.prefix}:{key}", self.ttl)
+            await pipe.execute()
+    
+    async def close(self):
+        await self.redis.aclose()
+    
+    async def _entries(self, key: str) -> List[Dict]:
+        entries = []
+        for value in await self.redis.lrange(f"{self.prefix}:{key}", 0, -1):
+            entry = json.loads(value)
+            entries.append({
+                "embedding": np.frombuffer(base64.b64decode(entry["embedding"]), dtype=np.float32),
+                "response": entry["response"],
+            })
+        return entries
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    backend = settings.RESPONSE_CACHE_BACKEND.lower()
+    
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return MemoryResponseCache(
+            similarity=settings.RESPONSE_CACHE_SIMILARITY,
+            ttl=settings.RESPONSE_CACHE_TTL,
+            entries_per_key=settings.RESPONSE_CACHE_ENTRIES_PER_KEY,
+            max_keys=settings.RESPONSE_CACHE_MAX_KEYS
+        )
+    if backend == "redis":
+        return RedisResponseCache(
+            settings.REDIS_URL,
+            similarity=settings.RESPONSE_CACHE_SIMILARITY,
+            ttl=settings.RESPONSE_CACHE_TTL,
+            entries_per_key=settings.RESPONSE_CACHE_ENTRIES_PER_KEY
+        )
+    
+    raise ValueError(f"Unsupported response cache backend: {backend}")
@@ -0,0 +1,53 @@
+import asyncio
+import time
+from typing import Awaitable, Dict, TypeVar
+
+from app.core.config import settings
+from app.core.logging import CHAT_STAGE_DURATION, CHAT_STAGE_TIMEOUTS
+
+T = TypeVar("T")
+
+
+class StageTimeout(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Chat stage '{stage}' timed out")
+        self.stage = stage
+
+
+class StageTimer:
+    # Times the stages of one chat turn and enforces CHAT_STAGE_TIMEOUTS.
+    # Stages on concurrent branches overlap, so their durations add up to
+    # more than the total. A stage recorded several times, such as the
+    # per-question stages of a batch, sums its durations.
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._started = time.perf_counter()
+    
+    async def run(self, stage: str, awaitable: Awaitable[T]) -> T:
+        # The timeout cancels the awaited work in place rather than in a new
+        # task, so stages may use the request's database session.
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(settings.CHAT_STAGE_TIMEOUTS.get(stage)):
+                return await awaitable
+        except TimeoutError:
+            CHAT_STAGE_TIMEOUTS.labels(stage=stage).inc()
+            raise StageTimeout(stage) from None
+        finally:
+            self.record(stage, time.perf_counter() - start)
+    
+    def record(self, stage: str, duration: float):
+        self.durations[stage] = self.durations.get(stage, 0.0) + duration
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+        CHAT_STAGE_DURATION.labels(stage=stage).observe(duration)
+    
+    def breakdown(self) -> Dict[str, float]:
+        # Milliseconds per stage, plus the total since the timer was created.
+        # Repeated stages also report how often they ran as <stage>_count.
+        timings = {stage: round(duration * 1000, 1) for stage, duration in self.durations.items()}
+        timings.update(
+            (f"{stage}_count", count) for stage, count in self.counts.items() if count > 1
+        )
+        timings["total"] = round((time.perf_counter() - self._started) * 1000, 1)
+        return timings
@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Sequence
+import numpy as np
+import tiktoken
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@dataclass
+class TextChunk:
+    content: str
+    tokens: int
+
+
+class TokenTextChunker:
+    # Splits on token boundaries: each window of chunk_size tokens is cut at
+    # the last boundary of the highest-priority separator it contains, so
+    # chunks follow the same hierarchy as a recursive character splitter
+    # without re-splitting the text at every level.
+    
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        model: str,
+        separators: Sequence[str] = DEFAULT_SEPARATORS
+    ):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.model = model
+        self.separators = [separator for separator in separators if separator]
+    
+    @property
+    def encoding(self) -> tiktoken.Encoding:
+        return get_encoding(self.model)
+    
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+    
+    def split_text(self, text: str) -> List[TextChunk]:
+        data = text.encode("utf-8")
+        return self._build_chunks(data, self._split_spans(data))
+    
+    def split_partial(self, text: str) -> tuple[List[TextChunk], str]:
+        # Splits a prefix of a longer stream. The last chunk may continue in
+        # text that has not arrived yet, so it is returned unsplit as the
+        # remainder to prepend to the next piece.
+        data = text.encode("utf-8")
+        spans = self._split_spans(data)
+        if len(spans) <= 1:
+            return [], text
+        remainder = data[spans[-1][0]:].decode("utf-8", errors="ignore")
+        return self._build_chunks(data, spans[:-1]), remainder
+    
+    def _build_chunks(self, data: bytes, spans: List[tuple[int, int]]) -> List[TextChunk]:
+        chunks = []
+        for start, end in spans:
+            content = data[start:end].decode("utf-8", errors="ignore").strip()
+            if content:
+                chunks.append(TextChunk(content=content, tokens=self.count_tokens(content)))
+        return chunks
+    
+    def _split_spans(self, data: bytes) -> List[tuple[int, int]]:
+        if not data.strip():
+            return []
+        
+        token_bytes = self.encoding.decode_tokens_bytes(
+            self.encoding.encode(data.decode("utf-8"), disallowed_special=())
+        )
+        token_count = len(token_bytes)
+        starts = np.zeros(token_count + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, token_bytes), dtype=np.int64, count=token_count), out=starts[1:])
+        
+        boundaries = [self._separator_boundaries(data, separator, starts) for separator in self.separators]
+        word_boundaries = boundaries[-1] if boundaries else np.array([], dtype=np.int64)
+        
+        spans = []
+        start = 0
+        end = 0
+        while start < token_count:
+            limit = start + self.chunk_size
+            if limit >= token_count:
+                end = token_count
+            else:
+                # Cutting at or before the previous end would only repeat
+                # the overlap, so the boundary has to move past it.
+                floor = max(start, end)
+                end = limit
+                for level in boundaries:
+                    index = np.searchsorted(level, limit, side="right") - 1
+                    if index >= 0 and level[index] > floor:
+                        end = int(level[index])
+                        break
+            
+            spans.append((int(starts[start]), int(starts[end])))
+            if end >= token_count:
+                break
+            
+            next_start = max(end - self.chunk_overlap, start + 1)
+            index = np.searchsorted(word_boundaries, next_start, side="left")
+            if index < len(word_boundaries) and word_boundaries[index] < end:
+                next_start = int(word_boundaries[index])
+            start = next_start
+        
+        return spans
+    
+    def _separator_boundaries(self, data: bytes, separator: str, starts: np.ndarray) -> np.ndarray:
+        # Token indices where a token begins exactly at the start or the end
+        # of a separator occurrence.
+        text = np.frombuffer(data, dtype=np.uint8)
+        pattern = np.frombuffer(separator.encode("utf-8"), dtype=np.uint8)
+        span = len(text) - len(pattern) + 1
+        if span <= 0:
+            return np.array([], dtype=np.int64)
+        
+        mask = text[:span] == pattern[0]
+        for offset in range(1, len(pattern)):
+            mask &= text[offset:span + offset] == pattern[offset]
+        match_starts = np.flatnonzero(mask)
+        
+        positions = np.concatenate([match_starts, match_starts + len(pattern)])
+        indices = np.searchsorted(starts, positions, side="left")
+        aligned = indices[starts[indices] == positions]
+        return np.unique(aligned[aligned > 0])
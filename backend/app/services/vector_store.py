@@ -0,0 +1,779 @@
+import asyncio
+import copy
+import functools
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+import chromadb
+import numpy as np
+import structlog
+from chromadb.config import Settings as ChromaSettings
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.core.logging import VECTOR_STORE_OPERATION_DURATION, VECTOR_STORE_QUEUE_DEPTH
+from app.services.quantization import (
+    QUANTIZATION_MODES,
+    FullPrecisionMatrix,
+    approximate_scores,
+    quantize,
+)
+
+logger = structlog.get_logger()
+
+QueryResult = Dict[str, List[List[Any]]]
+
+
+class BoundedExecutor:
+    # A dedicated thread pool for blocking store calls. At most
+    # max_workers + queue_size operations are admitted; further callers wait
+    # on the event loop instead of piling up in the executor queue.
+    def __init__(self, backend: str, max_workers: int, queue_size: int):
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f"vector-store-{backend}"
+        )
+        self._slots = asyncio.Semaphore(max_workers + queue_size)
+    
+    async def run(self, operation: str, func: Callable, *args, **kwargs):
+        async with self._slots:
+            VECTOR_STORE_QUEUE_DEPTH.labels(backend=self.backend).inc()
+            start_time = time.perf_counter()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._executor, functools.partial(func, *args, **kwargs)
+                )
+            finally:
+                VECTOR_STORE_QUEUE_DEPTH.labels(backend=self.backend).dec()
+                VECTOR_STORE_OPERATION_DURATION.labels(
+                    backend=self.backend, operation=operation
+                ).observe(time.perf_counter() - start_time)
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class VectorStore:
+    # Distances are cosine distances (1 - cosine similarity). Query results
+    # hold one inner list per query embedding.
+    backend = "none"
+    
+    async def add(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: List[dict]
+    ):
+        raise NotImplementedError
+    
+    async def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        where: Optional[dict] = None
+    ) -> QueryResult:
+        raise NotImplementedError
+    
+    async def update_metadata(self, ids: List[str], metadatas: List[dict]):
+        raise NotImplementedError
+    
+    async def delete(self, ids: Optional[List[str]] = None, where: Optional[dict] = None):
+        raise NotImplementedError
+    
+    async def count(self) -> int:
+        raise NotImplementedError
+    
+    async def get(self, ids: List[str]) -> Dict[str, list]:
+        # Returns {"ids", "embeddings", "documents", "metadatas"} for the
+        # stored ids; missing ids are skipped and order is not guaranteed.
+        raise NotImplementedError
+    
+    async def scan(self, batch_size: int = 1000) -> AsyncIterator[Dict[str, list]]:
+        # Yields every stored item in batches of
+        # {"ids", "embeddings", "documents", "metadatas"}.
+        raise NotImplementedError
+        yield
+    
+    async def partition(self, collection_name: str, dimensions: Optional[int] = None) -> "VectorStore":
+        # Returns a store for another collection that shares this store's
+        # client, executor or engine. dimensions is set for collections
+        # holding truncated vectors.
+        raise NotImplementedError
+    
+    async def warm_up(self) -> int:
+        return await self.count()
+    
+    async def close(self):
+        pass
+
+
+def _empty_result(query_count: int) -> QueryResult:
+    return {
+        key: [[] for _ in range(query_count)]
+        for key in ("ids", "documents", "metadatas", "distances")
+    }
+
+
+class ChromaVectorStore(VectorStore):
+    backend = "chroma"
+    
+    def __init__(
+        self,
+        path: str,
+        collection_name: str,
+        executor: BoundedExecutor,
+        client: Optional[chromadb.ClientAPI] = None,
+        host: str = "",
+        port: int = 8000
+    ):
+        # The embedded client must be the only process using its directory;
+        # API and workers in separate processes share a server via host.
+        self._owns_executor = client is None
+        if client is None and host:
+            client = chromadb.HttpClient(
+                host=host,
+                port=port,
+                settings=ChromaSettings(anonymized_telemetry=False)
+            )
+        self.client = client or chromadb.PersistentClient(
+            path=path,
+            settings=ChromaSettings(anonymized_telemetry=False)
+        )
+        self.path = path
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            metadata={"hnsw:space": "cosine"}
+        )
+        self.executor = executor
+    
+    async def add(self, ids, embeddings, documents, metadatas):
+        await self.executor.run(
+            "add",
+            self.collection.add,
+            ids=ids,
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=metadatas
+        )
+    
+    async def query(self, query_embeddings, n_results, where=None):
+        result = await self.executor.run(
+            "query",
+            self.collection.query,
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=self._where(where),
+            include=["documents", "metadatas", "distances"]
+        )
+        return {
+            key: result[key] or [[] for _ in query_embeddings]
+            for key in ("ids", "documents", "metadatas", "distances")
+        }
+    
+    async def update_metadata(self, ids, metadatas):
+        await self.executor.run("update", self.collection.update, ids=ids, metadatas=metadatas)
+    
+    async def delete(self, ids=None, where=None):
+        await self.executor.run("delete", self.collection.delete, ids=ids, where=self._where(where))
+    
+    async def count(self):
+        return await self.executor.run("count", self.collection.count)
+    
+    async def get(self, ids):
+        result = await self.executor.run(
+            "get",
+            self.collection.get,
+            ids=ids,
+            include=["embeddings", "documents", "metadatas"]
+        )
+        return {
+            "ids": result["ids"],
+            "embeddings": [list(embedding) for embedding in result["embeddings"]],
+            "documents": result["documents"],
+            "metadatas": result["metadatas"],
+        }
+    
+    async def scan(self, batch_size=1000):
+        offset = 0
+        while True:
+            batch = await self.executor.run(
+                "scan",
+                self.collection.get,
+                limit=batch_size,
+                offset=offset,
+                include=["embeddings", "documents", "metadatas"]
+            )
+            if not batch["ids"]:
+                return
+            yield {
+                "ids": batch["ids"],
+                "embeddings": [list(embedding) for embedding in batch["embeddings"]],
+                "documents": batch["documents"],
+                "metadatas": batch["metadatas"],
+            }
+            offset += len(batch["ids"])
+    
+    async def partition(self, collection_name, dimensions=None):
+        return await self.executor.run(
+            "partition",
+            ChromaVectorStore,
+            self.path,
+            collection_name,
+            self.executor,
+            self.client
+        )
+    
+    async def warm_up(self):
+        # Querying for a stored vector pages the HNSW index into memory.
+        item_count = await self.count()
+        if item_count:
+            sample = await self.executor.run("peek", self.collection.peek, 1)
+            await self.query([list(sample["embeddings"][0])], n_results=1)
+        return item_count
+    
+    async def close(self):
+        if self._owns_executor:
+            await asyncio.to_thread(self.executor.shutdown)
+    
+    def _where(self, where: Optional[dict]) -> Optional[dict]:
+        # Chroma accepts a single field per filter; several are combined
+        # with $and.
+        if not where:
+            return None
+        if len(where) == 1:
+            return where
+        return {"$and": [{key: value} for key, value in where.items()]}
+
+
+class PgVectorStore(VectorStore):
+    # Stores vectors in the application's Postgres with the pgvector
+    # extension. asyncpg is non-blocking, so no executor is needed.
+    #
+    # float16 quantization builds the HNSW graph over a halfvec cast of the
+    # column, halving index memory, and rescores the oversampled shortlist
+    # against the full-precision vectors in the heap table.
+    backend = "pgvector"
+    
+    def __init__(
+        self,
+        url: str,
+        collection_name: str,
+        dimensions: int,
+        quantization: str = "none",
+        oversample: int = 4
+    ):
+        self.engine = create_async_engine(url)
+        self.collection_name = collection_name
+        self.dimensions = dimensions
+        self.quantization = self._check_quantization(quantization)
+        self.oversample = oversample
+        self.table = "vector_embeddings"
+        self._owns_engine = True
+        self._schema_ready = False
+    
+    async def ensure_schema(self):
+        # The table is list-partitioned by collection, so every collection
+        # gets its own table and HNSW graph and queries never walk vectors
+        # of other collections.
+        if self._schema_ready:
+            return
+        table = f"{self.table}_{hashlib.md5(self.collection_name.encode()).hexdigest()[:16]}"
+        async with self.engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                " collection TEXT NOT NULL,"
+                " id TEXT NOT NULL,"
+                " document TEXT NOT NULL,"
+                " metadata JSONB NOT NULL DEFAULT '{}',"
+                f" embedding vector({self.dimensions}) NOT NULL,"
+                " PRIMARY KEY (collection, id)"
+                ") PARTITION BY LIST (collection)"
+            ))
+            # DDL cannot take bind parameters, so the name is quoted here.
+            collection = self.collection_name.replace("'", "''")
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {table} PARTITION OF {self.table} "
+                f"FOR VALUES IN ('{collection}')"
+            ))
+            if self.quantization == "float16":
+                await conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_hnsw_halfvec ON {table} "
+                    f"USING hnsw ((embedding::halfvec({self.dimensions})) halfvec_cosine_ops)"
+                ))
+            else:
+                await conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_hnsw "
+                    f"ON {table} USING hnsw (embedding vector_cosine_ops)"
+                ))
+            await conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_metadata "
+                f"ON {table} USING gin (metadata jsonb_path_ops)"
+            ))
+        self._schema_ready = True
+    
+    async def add(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        await self.ensure_schema()
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                text(
+                    f"INSERT INTO {self.table} (collection, id, document, metadata, embedding) "
+                    "VALUES (:collection, :id, :document, CAST(:metadata AS jsonb), CAST(:embedding AS vector)) "
+                    "ON CONFLICT (collection, id) DO UPDATE SET document = EXCLUDED.document, "
+                    "metadata = EXCLUDED.metadata, embedding = EXCLUDED.embedding"
+                ),
+                [
+                    {
+                        "collection": self.collection_name,
+                        "id": id_,
+                        "document": document,
+                        "metadata": json.dumps(metadata),
+                        "embedding": self._vector_literal(embedding),
+                    }
+                    for id_, embedding, document, metadata in zip(ids, embeddings, documents, metadatas)
+                ]
+            )
+    
+    async def query(self, query_embeddings, n_results, where=None):
+        await self.ensure_schema()
+        result = _empty_result(len(query_embeddings))
+        statement = text(self._query_sql())
+        async with self.engine.connect() as conn:
+            for i, embedding in enumerate(query_embeddings):
+                rows = await conn.execute(
+                    statement,
+                    {
+                        "embedding": self._vector_literal(embedding),
+                        "collection": self.collection_name,
+                        "where": json.dumps(where or {}),
+                        "limit": n_results,
+                        "candidates": n_results * self.oversample,
+                    }
+                )
+                for id_, document, metadata, distance in rows:
+                    result["ids"][i].append(id_)
+                    result["documents"][i].append(document)
+                    result["metadatas"][i].append(
+                        json.loads(metadata) if isinstance(metadata, str) else metadata
+                    )
+                    result["distances"][i].append(float(distance))
+        return result
+    
+    async def update_metadata(self, ids, metadatas):
+        if not ids:
+            return
+        await self.ensure_schema()
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                text(
+                    f"UPDATE {self.table} SET metadata = metadata || CAST(:metadata AS jsonb) "
+                    "WHERE collection = :collection AND id = :id"
+                ),
+                [
+                    {"collection": self.collection_name, "id": id_, "metadata": json.dumps(metadata)}
+                    for id_, metadata in zip(ids, metadatas)
+                ]
+            )
+    
+    async def delete(self, ids=None, where=None):
+        await self.ensure_schema()
+        conditions = ["collection = :collection"]
+        params: Dict[str, Any] = {"collection": self.collection_name}
+        if ids is not None:
+            conditions.append("id = ANY(:ids)")
+            params["ids"] = list(ids)
+        if where:
+            conditions.append("metadata @> CAST(:where AS jsonb)")
+            params["where"] = json.dumps(where)
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                text(f"DELETE FROM {self.table} WHERE {' AND '.join(conditions)}"),
+                params
+            )
+    
+    async def count(self):
+        await self.ensure_schema()
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                text(f"SELECT COUNT(*) FROM {self.table} WHERE collection = :collection"),
+                {"collection": self.collection_name}
+            )
+            return result.scalar_one()
+    
+    async def get(self, ids):
+        await self.ensure_schema()
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(
+                text(
+                    f"SELECT id, document, metadata, embedding::text FROM {self.table} "
+                    "WHERE collection = :collection AND id = ANY(:ids)"
+                ),
+                {"collection": self.collection_name, "ids": list(ids)}
+            )).all()
+        return self._rows_to_batch(rows)
+    
+    async def scan(self, batch_size=1000):
+        await self.ensure_schema()
+        after = ""
+        while True:
+            async with self.engine.connect() as conn:
+                rows = (await conn.execute(
+                    text(
+                        f"SELECT id, document, metadata, embedding::text FROM {self.table} "
+                        "WHERE collection = :collection AND id > :after ORDER BY id LIMIT :limit"
+                    ),
+                    {"collection": self.collection_name, "after": after, "limit": batch_size}
+                )).all()
+            if not rows:
+                return
+            yield self._rows_to_batch(rows)
+            after = rows[-1][0]
+    
+    async def partition(self, collection_name, dimensions=None):
+        store = copy.copy(self)
+        store.collection_name = collection_name
+        if dimensions and dimensions != self.dimensions:
+            # The vector column has a fixed width, so truncated vectors get
+            # their own parent table.
+            store.dimensions = dimensions
+            store.table = f"vector_embeddings_d{dimensions}"
+        store.quantization = self._check_quantization(quantization_for(collection_name, self.quantization))
+        store._owns_engine = False
+        store._schema_ready = False
+        return store
+    
+    async def close(self):
+        if self._owns_engine:
+            await self.engine.dispose()
+    
+    def _query_sql(self) -> str:
+        if self.quantization == "none":
+            return (
+                "SELECT id, document, metadata, embedding <=> CAST(:embedding AS vector) AS distance "
+                f"FROM {self.table} "
+                "WHERE collection = :collection AND metadata @> CAST(:where AS jsonb) "
+                "ORDER BY distance LIMIT :limit"
+            )
+        half = f"halfvec({self.dimensions})"
+        return (
+            "SELECT id, document, metadata, embedding <=> CAST(:embedding AS vector) AS distance "
+            "FROM ("
+            f" SELECT id, document, metadata, embedding FROM {self.table}"
+            " WHERE collection = :collection AND metadata @> CAST(:where AS jsonb)"
+            f" ORDER BY embedding::{half} <=> CAST(:embedding AS {half}) LIMIT :candidates"
+            ") shortlist ORDER BY distance LIMIT :limit"
+        )
+    
+    def _rows_to_batch(self, rows) -> Dict[str, list]:
+        return {
+            "ids": [row[0] for row in rows],
+            "documents": [row[1] for row in rows],
+            "metadatas": [
+                json.loads(row[2]) if isinstance(row[2], str) else row[2] for row in rows
+            ],
+            "embeddings": [json.loads(row[3]) for row in rows],
+        }
+    
+    def _check_quantization(self, quantization: str) -> str:
+        if quantization not in ("none", "float16"):
+            raise ValueError(f"pgvector supports float16 quantization only, got {quantization}")
+        return quantization
+    
+    def _vector_literal(self, embedding: List[float]) -> str:
+        return "[" + ",".join(repr(float(value)) for value in embedding) + "]"
+
+
+class NumpyVectorStore(VectorStore):
+    # Exact in-process search over a normalized float32 matrix (scan returns
+    # the normalized vectors). Meant for tests and small single-process
+    # deployments; nothing is persisted.
+    #
+    # With quantization the search matrix holds float16 or int8 codes and
+    # the best oversample * n_results candidates are rescored against the
+    # full-precision rows, memory-mapped under rescore_directory when set.
+    # int8 is only available here, for tests and benchmarks.
+    backend = "numpy"
+    
+    def __init__(
+        self,
+        executor: Optional[BoundedExecutor] = None,
+        owns_executor: bool = True,
+        quantization: str = "none",
+        rescore_directory: Optional[str] = None,
+        oversample: int = 4
+    ):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported vector quantization: {quantization}")
+        self.executor = executor
+        self.quantization = quantization
+        self.rescore_directory = rescore_directory
+        self.oversample = oversample
+        self._owns_executor = owns_executor
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._documents: List[str] = []
+        self._metadatas: List[dict] = []
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._scales: Optional[np.ndarray] = None
+        self._full: Optional[FullPrecisionMatrix] = None
+    
+    async def add(self, ids, embeddings, documents, metadatas):
+        await self._run("add", self._add, ids, embeddings, documents, metadatas)
+    
+    async def query(self, query_embeddings, n_results, where=None):
+        return await self._run("query", self._query, query_embeddings, n_results, where)
+    
+    async def update_metadata(self, ids, metadatas):
+        await self._run("update", self._update_metadata, ids, metadatas)
+    
+    async def delete(self, ids=None, where=None):
+        await self._run("delete", self._delete, ids, where)
+    
+    async def count(self):
+        return len(self._ids)
+    
+    async def get(self, ids):
+        return await self._run("get", self._get, ids)
+    
+    async def scan(self, batch_size=1000):
+        for start in range(0, len(self._ids), batch_size):
+            with self._lock:
+                end = start + batch_size
+                vectors = self._full[start:end] if self._full is not None else self._vectors[start:end]
+                batch = {
+                    "ids": self._ids[start:end],
+                    "embeddings": vectors.tolist(),
+                    "documents": self._documents[start:end],
+                    "metadatas": [dict(metadata) for metadata in self._metadatas[start:end]],
+                }
+            yield batch
+    
+    async def partition(self, collection_name, dimensions=None):
+        return NumpyVectorStore(
+            self.executor,
+            owns_executor=False,
+            quantization=quantization_for(collection_name, self.quantization),
+            rescore_directory=self.rescore_directory,
+            oversample=self.oversample
+        )
+    
+    async def close(self):
+        if self._full is not None:
+            self._full.close()
+        if self.executor and self._owns_executor:
+            await asyncio.to_thread(self.executor.shutdown)
+    
+    def memory_usage(self) -> Dict[str, int]:
+        # Bytes held on the heap for search versus bytes kept for rescoring
+        # (memory-mapped when a rescore directory is configured).
+        resident = self._vectors.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+        rescore = self._full.nbytes if self._full is not None else 0
+        if self._full is not None and self._full.path is None:
+            resident += rescore
+        return {"resident": resident, "rescore": rescore}
+    
+    async def _run(self, operation: str, func: Callable, *args):
+        if self.executor:
+            return await self.executor.run(operation, func, *args)
+        return func(*args)
+    
+    def _add(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self._delete_ids([id_ for id_ in ids if id_ in self._positions])
+            if not len(self._vectors):
+                self._reset(vectors.shape[1])
+            for id_ in ids:
+                self._positions[id_] = len(self._ids)
+                self._ids.append(id_)
+            self._documents.extend(documents)
+            self._metadatas.extend(dict(metadata) for metadata in metadatas)
+            if self._full is None:
+                self._vectors = np.vstack([self._vectors, vectors])
+                return
+            codes, scales = quantize(vectors, self.quantization)
+            self._vectors = np.vstack([self._vectors, codes])
+            if scales is not None:
+                self._scales = np.concatenate([self._scales, scales])
+            self._full.append(vectors)
+    
+    def _reset(self, dimensions: int):
+        if self.quantization == "none":
+            self._vectors = np.empty((0, dimensions), dtype=np.float32)
+            return
+        codes, scales = quantize(np.empty((0, dimensions), dtype=np.float32), self.quantization)
+        self._vectors = codes
+        self._scales = scales
+        if self._full is not None:
+            self._full.close()
+        self._full = FullPrecisionMatrix(dimensions, self.rescore_directory)
+    
+    def _query(self, query_embeddings, n_results, where):
+        result = _empty_result(len(query_embeddings))
+        with self._lock:
+            candidates = np.array(
+                [i for i, metadata in enumerate(self._metadatas) if self._matches(metadata, where)],
+                dtype=np.int64
+            )
+            if not len(candidates) or not len(query_embeddings):
+                return result
+            
+            queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+            k = min(n_results, len(candidates))
+            for i, (top, distances) in enumerate(self._rank(queries, candidates, k)):
+                for j, distance in zip(top, distances):
+                    position = candidates[j]
+                    result["ids"][i].append(self._ids[position])
+                    result["documents"][i].append(self._documents[position])
+                    result["metadatas"][i].append(dict(self._metadatas[position]))
+                    result["distances"][i].append(float(distance))
+        return result
+    
+    def _rank(self, queries: np.ndarray, candidates: np.ndarray, k: int):
+        # Yields (indices into candidates, cosine distances) per query,
+        # closest first.
+        if self._full is None:
+            for row in 1.0 - queries @ self._vectors[candidates].T:
+                yield self._top(row, k)
+            return
+        
+        scales = self._scales[candidates] if self._scales is not None else None
+        approximate = 1.0 - approximate_scores(self._vectors[candidates], scales, queries)
+        shortlist_size = min(len(candidates), k * self.oversample)
+        for query, row in zip(queries, approximate):
+            shortlist, _ = self._top(row, shortlist_size)
+            exact = 1.0 - self._full.take(candidates[shortlist]) @ query
+            top, distances = self._top(exact, k)
+            yield shortlist[top], distances
+    
+    def _top(self, distances: np.ndarray, k: int):
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind="stable")]
+        return top, distances[top]
+    
+    def _get(self, ids):
+        with self._lock:
+            positions = [self._positions[id_] for id_ in ids if id_ in self._positions]
+            if self._full is not None:
+                vectors = self._full.take(np.array(positions, dtype=np.int64))
+            else:
+                vectors = self._vectors[positions]
+            return {
+                "ids": [self._ids[i] for i in positions],
+                "embeddings": vectors.tolist(),
+                "documents": [self._documents[i] for i in positions],
+                "metadatas": [dict(self._metadatas[i]) for i in positions],
+            }
+    
+    def _update_metadata(self, ids, metadatas):
+        with self._lock:
+            for id_, metadata in zip(ids, metadatas):
+                if id_ in self._positions:
+                    self._metadatas[self._positions[id_]].update(metadata)
+    
+    def _delete(self, ids, where):
+        with self._lock:
+            targets = set(ids) if ids is not None else set(self._ids)
+            if where:
+                targets = {
+                    id_ for id_ in targets
+                    if id_ in self._positions and self._matches(self._metadatas[self._positions[id_]], where)
+                }
+            self._delete_ids([id_ for id_ in targets if id_ in self._positions])
+    
+    def _delete_ids(self, ids: List[str]):
+        if not ids:
+            return
+        removed = {self._positions[id_] for id_ in ids}
+        keep = [i for i in range(len(self._ids)) if i not in removed]
+        self._ids = [self._ids[i] for i in keep]
+        self._documents = [self._documents[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._vectors = self._vectors[keep]
+        if self._scales is not None:
+            self._scales = self._scales[keep]
+        if self._full is not None:
+            self._full.keep(np.array(keep, dtype=np.int64))
+        self._positions = {id_: i for i, id_ in enumerate(self._ids)}
+    
+    def _matches(self, metadata: dict, where: Optional[dict]) -> bool:
+        return not where or all(metadata.get(key) == value for key, value in where.items())
+    
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def quantization_for(collection_name: str, default: Optional[str] = None) -> str:
+    # Per-collection overrides win; partitions otherwise inherit the mode of
+    # the store they were derived from.
+    mode = settings.VECTOR_QUANTIZATION_COLLECTIONS.get(
+        collection_name,
+        default or settings.VECTOR_QUANTIZATION
+    ).lower()
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unsupported vector quantization for {collection_name}: {mode}")
+    return mode
+
+
+def create_vector_store() -> VectorStore:
+    backend = settings.VECTOR_STORE_BACKEND.lower()
+    
+    # int8 codes are only implemented by the exact in-process NumpyVectorStore,
+    # which tests and benchmarks construct directly; no persistent backend
+    # has an int8 ANN index.
+    configured = [settings.VECTOR_QUANTIZATION, *settings.VECTOR_QUANTIZATION_COLLECTIONS.values()]
+    if any(mode.lower() == "int8" for mode in configured):
+        raise ValueError(
+            "int8 vector quantization is not supported by the configurable backends; "
+            "use float16 with pgvector"
+        )
+    
+    if backend == "chroma":
+        if quantization_for(settings.CHROMA_COLLECTION_NAME) != "none" or any(
+            mode.lower() != "none" for mode in settings.VECTOR_QUANTIZATION_COLLECTIONS.values()
+        ):
+            raise ValueError("Quantized vector storage requires the pgvector or numpy backend")
+        return ChromaVectorStore(
+            settings.CHROMA_PERSIST_DIRECTORY,
+            settings.CHROMA_COLLECTION_NAME,
+            BoundedExecutor(
+                backend,
+                max_workers=settings.VECTOR_STORE_EXECUTOR_WORKERS,
+                queue_size=settings.VECTOR_STORE_EXECUTOR_QUEUE_SIZE
+            ),
+            host=settings.CHROMA_HOST,
+            port=settings.CHROMA_PORT
+        )
+    if backend == "pgvector":
+        return PgVectorStore(
+            str(settings.DATABASE_URI),
+            settings.CHROMA_COLLECTION_NAME,
+            settings.EMBEDDING_DIMENSIONS,
+            quantization=quantization_for(settings.CHROMA_COLLECTION_NAME),
+            oversample=settings.VECTOR_RESCORE_OVERSAMPLE
+        )
+    if backend == "numpy":
+        return NumpyVectorStore(
+            BoundedExecutor(
+                backend,
+                max_workers=settings.VECTOR_STORE_EXECUTOR_WORKERS,
+                queue_size=settings.VECTOR_STORE_EXECUTOR_QUEUE_SIZE
+            ),
+            quantization=quantization_for(settings.CHROMA_COLLECTION_NAME),
+            rescore_directory=settings.VECTOR_RESCORE_DIRECTORY or None,
+            oversample=settings.VECTOR_RESCORE_OVERSAMPLE
+        )
+    
+    raise ValueError(f"Unknown vector store backend: {settings.VECTOR_STORE_BACKEND}")
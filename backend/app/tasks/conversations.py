@@ -0,0 +1,33 @@
+import asyncio
+import structlog
+
+from app.core.celery import celery_app
+from app.services.conversation_memory import compact_memory
+from app.services.openai_client import create_openai_client
+from app.tasks.documents import WorkerSessionLocal
+
+logger = structlog.get_logger()
+
+
+async def _summarize_conversation(conversation_id: str) -> bool:
+    client = create_openai_client()
+    try:
+        async with WorkerSessionLocal() as db:
+            return await compact_memory(db, conversation_id, client)
+    finally:
+        await client.close()
+
+
+@celery_app.task(name="conversations.summarize_conversation")
+def summarize_conversation(conversation_id: str) -> bool:
+    logger.info("Summarizing conversation", conversation_id=conversation_id)
+    return asyncio.run(_summarize_conversation(conversation_id))
+
+
+def schedule_summary(conversation_id: str):
+    # The answer has already been saved, so a broker outage only delays the
+    # compaction until the next turn.
+    try:
+        summarize_conversation.delay(conversation_id)
+    except Exception as e:
+        logger.warning("Failed to queue conversation summary", conversation_id=conversation_id, error=str(e))
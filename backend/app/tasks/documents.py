@@ -0,0 +1,97 @@
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Dict, List
+import structlog
+from celery.signals import worker_shutdown
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.core.celery import celery_app
+from app.core.config import settings
+from app.services.extraction_pool import shutdown_process_pool
+from app.services.ingestion_service import IngestionService
+
+logger = structlog.get_logger()
+
+# Each task runs in its own event loop, so pooled asyncpg connections
+# cannot be shared between tasks.
+engine = create_async_engine(str(settings.DATABASE_URI), poolclass=NullPool)
+
+WorkerSessionLocal = async_sessionmaker(
+    engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+@asynccontextmanager
+async def _ingestion_session():
+    # HTTP clients are bound to the event loop of a single task run, so the
+    # service is built per task and closed with it.
+    ingestion_service = IngestionService()
+    try:
+        async with WorkerSessionLocal() as db:
+            yield ingestion_service, db
+    finally:
+        await ingestion_service.embedding_service.close()
+
+
+async def _process_document(document_id: str) -> str | None:
+    async with _ingestion_session() as (ingestion_service, db):
+        document = await ingestion_service.process_document(document_id, db)
+        return document.processing_status if document else None
+
+
+@celery_app.task(name="documents.process_document")
+def process_document(document_id: str) -> str | None:
+    logger.info("Processing document", document_id=document_id)
+    return asyncio.run(_process_document(document_id))
+
+
+async def _reindex_document(document_id: str, replacement: Dict[str, Any] | None) -> str | None:
+    async with _ingestion_session() as (ingestion_service, db):
+        document = await ingestion_service.reindex_document(document_id, db, replacement)
+        return document.processing_status if document else None
+
+
+@celery_app.task(name="documents.reindex_document")
+def reindex_document(
+    document_id: str,
+    replacement: Dict[str, Any] | None = None,
+    previous_path: str | None = None
+) -> str | None:
+    # replacement holds the attributes of an uploaded new version. The
+    # document switches to it only if the reindex completes; otherwise the
+    # new file is removed and the previous one kept.
+    logger.info("Reindexing document", document_id=document_id)
+    status = None
+    try:
+        status = asyncio.run(_reindex_document(document_id, replacement))
+        return status
+    finally:
+        if status == "completed":
+            _remove_file(previous_path)
+        elif replacement:
+            _remove_file(replacement["file_path"])
+
+
+async def _process_documents(document_ids: List[str]) -> Dict[str, str]:
+    async with _ingestion_session() as (ingestion_service, db):
+        return await ingestion_service.process_documents(document_ids, db)
+
+
+@celery_app.task(name="documents.process_documents")
+def process_documents(document_ids: List[str]) -> Dict[str, str]:
+    logger.info("Processing document batch", document_count=len(document_ids))
+    return asyncio.run(_process_documents(document_ids))
+
+
+def _remove_file(file_path: str | None):
+    if file_path:
+        Path(file_path).unlink(missing_ok=True)
+
+
+@worker_shutdown.connect
+def _shutdown_extraction_pool(**kwargs):
+    shutdown_process_pool()
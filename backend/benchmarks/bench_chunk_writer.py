@@ -0,0 +1,100 @@
+"""Compare ORM chunk inserts with ChunkWriter against the configured Postgres.
+
+Run from the backend directory with the database settings in the environment:
+
+    python -m benchmarks.bench_chunk_writer --chunks 1000 5000 20000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete, select
+
+from app.core.database import AsyncSessionLocal, Base, engine
+from app.models.document import Document, DocumentChunk
+from app.models.user import User
+from app.services.chunk_writer import ChunkWriter
+
+CHUNK_TEXT = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 18
+
+
+async def create_document(db, owner_id: int) -> Document:
+    document = Document(
+        filename="benchmark.txt",
+        file_type="text/plain",
+        file_size=0,
+        metadata={},
+        owner_id=owner_id,
+        processing_status="completed"
+    )
+    db.add(document)
+    await db.commit()
+    return document
+
+
+def chunk_rows(document_id, count: int) -> list[dict]:
+    return [
+        {
+            "document_id": document_id,
+            "chunk_index": i,
+            "content": CHUNK_TEXT,
+            "embedding_id": f"{document_id}_{i}",
+            "tokens": 256,
+        }
+        for i in range(count)
+    ]
+
+
+async def orm_insert(db, rows: list[dict]):
+    for row in rows:
+        db.add(DocumentChunk(**row))
+    await db.commit()
+
+
+async def bulk_insert(db, rows: list[dict]):
+    await ChunkWriter().write(db, rows)
+    await db.commit()
+
+
+async def main(chunk_counts: list[int]):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    
+    async with AsyncSessionLocal() as db:
+        suffix = uuid.uuid4().hex[:8]
+        user = User(
+            email=f"bench-{suffix}@example.com",
+            username=f"bench-{suffix}",
+            hashed_password="!"
+        )
+        db.add(user)
+        await db.commit()
+        
+        try:
+            for count in chunk_counts:
+                print(f"{count} chunks")
+                for name, insert in (("ORM add loop", orm_insert), ("ChunkWriter", bulk_insert)):
+                    document = await create_document(db, user.id)
+                    rows = chunk_rows(document.id, count)
+                    start = time.perf_counter()
+                    await insert(db, rows)
+                    elapsed = time.perf_counter() - start
+                    print(f"  {name:<14} {elapsed:8.3f}s {count / elapsed:10.0f} rows/s")
+                    db.expunge_all()
+        finally:
+            await db.execute(delete(DocumentChunk).where(
+                DocumentChunk.document_id.in_(select(Document.id).where(Document.owner_id == user.id))
+            ))
+            await db.execute(delete(Document).where(Document.owner_id == user.id))
+            await db.execute(delete(User).where(User.id == user.id))
+            await db.commit()
+    
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 5000, 20000])
+    args = parser.parse_args()
+    asyncio.run(main(args.chunks))
@@ -0,0 +1,89 @@
+"""Compare the token chunker with langchain's RecursiveCharacterTextSplitter.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_chunker --megabytes 2 5 10
+"""
+import argparse
+import random
+import statistics
+import time
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from app.core.config import settings
+from app.services.text_chunker import TokenTextChunker
+
+WORDS = (
+    "agreement party shall terms invoice payment clause liability notice period "
+    "effective date termination confidential information services provider "
+    "customer obligations warranty schedule amendment governing law"
+).split()
+
+
+def generate_text(megabytes: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    paragraphs = []
+    size = 0
+    while size < target:
+        sentences = [
+            " ".join(rng.choices(WORDS, k=rng.randint(6, 24))).capitalize() + "."
+            for _ in range(rng.randint(2, 8))
+        ]
+        paragraph = " ".join(sentences)
+        if rng.random() < 0.3:
+            paragraph = paragraph.replace(". ", ".\n", 2)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def summarize(name: str, seconds: float, megabytes: float, token_counts: list[int]):
+    print(
+        f"  {name:<28} {seconds:8.2f}s {megabytes / seconds:8.2f} MB/s "
+        f"chunks={len(token_counts):<7} tokens min={min(token_counts)} "
+        f"max={max(token_counts)} stdev={statistics.pstdev(token_counts):.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megabytes", type=float, nargs="+", default=[1, 5, 10])
+    args = parser.parse_args()
+    
+    chunker = TokenTextChunker(
+        chunk_size=settings.CHUNK_SIZE_TOKENS,
+        chunk_overlap=settings.CHUNK_OVERLAP_TOKENS,
+        model=settings.EMBEDDING_MODEL
+    )
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+    chunker.count_tokens("warm up")
+    
+    for megabytes in args.megabytes:
+        text = generate_text(megabytes)
+        print(f"{megabytes} MB input")
+        
+        start = time.perf_counter()
+        langchain_chunks = splitter.split_text(text)
+        elapsed = time.perf_counter() - start
+        summarize(
+            "RecursiveCharacterTextSplitter",
+            elapsed,
+            megabytes,
+            [chunker.count_tokens(chunk) for chunk in langchain_chunks]
+        )
+        
+        start = time.perf_counter()
+        token_chunks = chunker.split_text(text)
+        elapsed = time.perf_counter() - start
+        summarize("TokenTextChunker", elapsed, megabytes, [chunk.tokens for chunk in token_chunks])
+
+
+if __name__ == "__main__":
+    main()
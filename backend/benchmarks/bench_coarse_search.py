@@ -0,0 +1,119 @@
+"""Compare single-pass search with truncated-dimension two-pass search.
+
+The single pass queries the full vectors; the two-pass search queries a
+truncated index for VECTOR_COARSE_CANDIDATES candidates and reranks them with
+the full vectors, the way EmbeddingService.search_by_embedding does.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_coarse_search --vectors 20000 100000 --coarse 128 256 512
+    python -m benchmarks.bench_coarse_search --backend chroma --vectors 100000
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embedding_service import EmbeddingService, truncate_embeddings
+from app.services.vector_store import BoundedExecutor, ChromaVectorStore, NumpyVectorStore
+
+
+def generate_vectors(count: int, dimensions: int, clusters: int, seed: int) -> np.ndarray:
+    # Matryoshka-trained embeddings concentrate information in the leading
+    # dimensions; a decaying per-dimension scale imitates that.
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimensions)).astype(np.float32)
+    labels = rng.integers(clusters, size=count)
+    noise = rng.normal(scale=0.6, size=(count, dimensions)).astype(np.float32)
+    decay = 1.0 / np.sqrt(1.0 + np.arange(dimensions, dtype=np.float32) / 64.0)
+    return (centers[labels] + noise) * decay
+
+
+async def measure(service: EmbeddingService, queries: np.ndarray, k: int):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        result = await service.search_by_embedding(query.tolist(), n_results=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([metadata["chunk"] for metadata in result["metadatas"]])
+    return results, latencies
+
+
+def summarize(name: str, results, truth, latencies):
+    recall = statistics.mean(
+        len(set(found) & set(expected)) / len(expected) for found, expected in zip(results, truth)
+    )
+    latencies = sorted(latencies)
+    print(
+        f"  {name:<24} recall={recall:.4f} "
+        f"p50={statistics.median(latencies):7.2f}ms p95={latencies[int(len(latencies) * 0.95) - 1]:7.2f}ms"
+    )
+
+
+def create_store(backend: str, directory: str):
+    if backend == "chroma":
+        return ChromaVectorStore(directory, "benchmark", BoundedExecutor("chroma", 4, 64))
+    return NumpyVectorStore()
+
+
+async def run(args):
+    settings.VECTOR_PARTITION_MODE = "global"
+    for count in args.vectors:
+        vectors = generate_vectors(count + args.queries, args.dimensions, args.clusters, args.seed)
+        corpus, queries = vectors[:count], vectors[count:]
+        ids = [str(i) for i in range(count)]
+        metadatas = [{"chunk": i} for i in range(count)]
+        print(f"{args.backend}: {count} vectors x {args.dimensions} dims, {args.queries} queries, k={args.k}")
+        
+        with tempfile.TemporaryDirectory() as directory:
+            service = EmbeddingService(vector_store=create_store(args.backend, directory))
+            for start in range(0, count, args.batch_size):
+                end = start + args.batch_size
+                await service.vector_store.add(
+                    ids[start:end], corpus[start:end].tolist(), ["" for _ in ids[start:end]], metadatas[start:end]
+                )
+            
+            settings.VECTOR_COARSE_DIMENSIONS = 0
+            truth, latencies = await measure(service, queries, args.k)
+            summarize(f"single pass ({args.dimensions})", truth, truth, latencies)
+            
+            for dimensions in args.coarse:
+                settings.VECTOR_COARSE_DIMENSIONS = dimensions
+                settings.VECTOR_COARSE_CANDIDATES = args.candidates
+                coarse = await service.coarse_store_for_owner(None)
+                for start in range(0, count, args.batch_size):
+                    end = start + args.batch_size
+                    await coarse.add(
+                        ids[start:end],
+                        truncate_embeddings(corpus[start:end], dimensions),
+                        ["" for _ in ids[start:end]],
+                        metadatas[start:end]
+                    )
+                results, latencies = await measure(service, queries, args.k)
+                summarize(f"two pass ({dimensions}/{args.candidates})", results, truth, latencies)
+            
+            await service.vector_store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["numpy", "chroma"], default="numpy")
+    parser.add_argument("--vectors", type=int, nargs="+", default=[20_000, 100_000])
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--coarse", type=int, nargs="+", default=[128, 256, 512])
+    parser.add_argument("--candidates", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Compare float32, float16 and int8 vector storage for recall, latency and memory.
+
+The float32 NumPy store is the exact baseline; quantized stores search over
+codes and rescore the shortlist against memory-mapped float32 vectors. Pass
+--chroma to include the current Chroma HNSW collection.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_quantization --vectors 50000 --queries 200
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.vector_store import BoundedExecutor, ChromaVectorStore, NumpyVectorStore
+
+
+def generate_vectors(count: int, dimensions: int, clusters: int, seed: int) -> np.ndarray:
+    # Embeddings cluster by topic, which makes near neighbours harder to
+    # separate than uniformly random vectors.
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimensions)).astype(np.float32)
+    labels = rng.integers(clusters, size=count)
+    noise = rng.normal(scale=0.6, size=(count, dimensions)).astype(np.float32)
+    return centers[labels] + noise
+
+
+async def load(store, vectors: np.ndarray, batch_size: int = 5000):
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        ids = [str(i) for i in range(start, start + len(batch))]
+        await store.add(ids, batch.tolist(), ["" for _ in ids], [{"owner_id": 1} for _ in ids])
+
+
+async def measure(store, queries: np.ndarray, k: int):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        result = await store.query([query.tolist()], n_results=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(result["ids"][0])
+    return results, latencies
+
+
+def summarize(name: str, results, truth, latencies, memory: str):
+    recall = statistics.mean(
+        len(set(found) & set(expected)) / len(expected) for found, expected in zip(results, truth)
+    )
+    latencies = sorted(latencies)
+    print(
+        f"  {name:<24} recall={recall:.4f} "
+        f"p50={statistics.median(latencies):7.2f}ms p95={latencies[int(len(latencies) * 0.95) - 1]:7.2f}ms "
+        f"{memory}"
+    )
+
+
+def megabytes(value: int) -> str:
+    return f"{value / 1024 / 1024:.1f}MB"
+
+
+async def run(args):
+    vectors = generate_vectors(args.vectors + args.queries, args.dimensions, args.clusters, args.seed)
+    corpus, queries = vectors[:args.vectors], vectors[args.vectors:]
+    print(f"{args.vectors} vectors x {args.dimensions} dims, {args.queries} queries, k={args.k}")
+    
+    baseline = NumpyVectorStore()
+    await load(baseline, corpus)
+    truth, latencies = await measure(baseline, queries, args.k)
+    summarize("float32 (exact)", truth, truth, latencies, f"heap={megabytes(baseline.memory_usage()['resident'])}")
+    await baseline.close()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        for quantization in ("float16", "int8"):
+            for oversample in args.oversample:
+                store = NumpyVectorStore(
+                    quantization=quantization,
+                    rescore_directory=directory,
+                    oversample=oversample
+                )
+                await load(store, corpus)
+                results, latencies = await measure(store, queries, args.k)
+                usage = store.memory_usage()
+                summarize(
+                    f"{quantization} oversample={oversample}",
+                    results,
+                    truth,
+                    latencies,
+                    f"heap={megabytes(usage['resident'])} mapped={megabytes(usage['rescore'])}"
+                )
+                await store.close()
+        
+        if args.chroma:
+            store = ChromaVectorStore(directory, "benchmark", BoundedExecutor("chroma", 1, 1))
+            await load(store, corpus)
+            results, latencies = await measure(store, queries, args.k)
+            summarize(
+                "chroma hnsw (float32)",
+                results,
+                truth,
+                latencies,
+                f"vectors={megabytes(corpus.nbytes)}"
+            )
+            await store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversample", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--chroma", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Build the truncated first-pass index from stored full-precision vectors.
+
+Set VECTOR_COARSE_DIMENSIONS (e.g. 256) and the vector store settings in the
+environment, then run from the backend directory:
+
+    python -m scripts.build_coarse_index --batch-size 1000
+    python -m scripts.build_coarse_index --rebuild
+
+Vectors are truncated locally, so no embeddings are requested. The copy is
+idempotent; --rebuild clears each coarse collection first, which is needed
+after changing the dimensions of an existing index.
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.document import Document
+from app.services.embedding_service import EmbeddingService, truncate_embeddings
+
+
+async def owner_ids():
+    if settings.VECTOR_PARTITION_MODE == "global":
+        return [None]
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Document.owner_id).distinct())
+        return [owner_id for owner_id, in result]
+
+
+async def main(batch_size: int, rebuild: bool):
+    dimensions = settings.VECTOR_COARSE_DIMENSIONS
+    if not dimensions:
+        raise SystemExit("Set VECTOR_COARSE_DIMENSIONS first")
+    
+    service = EmbeddingService()
+    built = set()
+    total = 0
+    
+    try:
+        for owner_id in await owner_ids():
+            # Owners hashed into the same bucket share one collection.
+            name = service.partition_name(owner_id) or settings.CHROMA_COLLECTION_NAME
+            if name in built:
+                continue
+            built.add(name)
+            
+            source = await service.store_for_owner(owner_id)
+            coarse = await service.coarse_store_for_owner(owner_id)
+            if rebuild:
+                stale = [id_ async for batch in coarse.scan(batch_size) for id_ in batch["ids"]]
+                for start in range(0, len(stale), batch_size):
+                    await coarse.delete(ids=stale[start:start + batch_size])
+            
+            copied = 0
+            async for batch in source.scan(batch_size):
+                await coarse.add(
+                    ids=batch["ids"],
+                    embeddings=truncate_embeddings(batch["embeddings"], dimensions),
+                    documents=["" for _ in batch["ids"]],
+                    metadatas=batch["metadatas"]
+                )
+                copied += len(batch["ids"])
+            
+            print(f"{name + '_d' + str(dimensions):<48} {copied:>10} vectors")
+            total += copied
+        
+        print(f"{'total':<48} {total:>10} vectors")
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.rebuild))
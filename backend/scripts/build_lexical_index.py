@@ -0,0 +1,64 @@
+"""Build BM25 postings for chunks ingested before hybrid search existed.
+
+Run from the backend directory:
+
+    python -m scripts.build_lexical_index
+    python -m scripts.build_lexical_index --rebuild
+
+Documents that already have postings are skipped unless --rebuild is given.
+New uploads are indexed at ingest, so this only needs to run once.
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal
+from app.models.document import ChunkTerm, Document, DocumentChunk
+from app.services.lexical_index import LexicalIndex
+
+
+async def main(rebuild: bool):
+    lexical_index = LexicalIndex()
+    indexed = 0
+    chunk_total = 0
+    
+    async with AsyncSessionLocal() as db:
+        documents = (await db.execute(
+            select(Document.id, Document.owner_id).where(Document.processing_status == "completed")
+        )).all()
+        
+        for document_id, owner_id in documents:
+            has_postings = (await db.execute(
+                select(ChunkTerm.chunk_id).where(ChunkTerm.document_id == document_id).limit(1)
+            )).first()
+            if has_postings and not rebuild:
+                continue
+            
+            await lexical_index.remove_document(db, document_id)
+            chunks = (await db.execute(
+                select(DocumentChunk.id, DocumentChunk.content, DocumentChunk.tokens)
+                .where(DocumentChunk.document_id == document_id)
+            )).all()
+            await lexical_index.add(db, [
+                {
+                    "owner_id": owner_id,
+                    "document_id": document_id,
+                    "chunk_id": chunk_id,
+                    "content": content,
+                    "tokens": tokens,
+                }
+                for chunk_id, content, tokens in chunks
+            ])
+            await db.commit()
+            indexed += 1
+            chunk_total += len(chunks)
+    
+    print(f"Indexed {chunk_total} chunks from {indexed} documents")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.rebuild))
@@ -0,0 +1,75 @@
+"""Copy vectors from the global collection into per-owner partitions.
+
+Set VECTOR_PARTITION_MODE ("owner" or "bucket") and the vector store settings
+in the environment, then run from the backend directory:
+
+    python -m scripts.partition_vectors --batch-size 1000
+    python -m scripts.partition_vectors --delete-source
+
+The copy is idempotent, so it can be re-run after new uploads. Only pass
+--delete-source once the API and workers run with the new partition mode.
+"""
+import argparse
+import asyncio
+from collections import Counter, defaultdict
+
+from app.core.config import settings
+from app.services.embedding_service import EmbeddingService
+
+
+async def main(batch_size: int, delete_source: bool, dry_run: bool):
+    if settings.VECTOR_PARTITION_MODE == "global":
+        raise SystemExit("Set VECTOR_PARTITION_MODE to 'owner' or 'bucket' first")
+    
+    service = EmbeddingService()
+    source = service.vector_store
+    copied = Counter()
+    skipped = 0
+    source_ids = []
+    
+    try:
+        async for batch in source.scan(batch_size):
+            groups = defaultdict(list)
+            for i, metadata in enumerate(batch["metadatas"]):
+                owner_id = (metadata or {}).get("owner_id")
+                if owner_id is None:
+                    skipped += 1
+                    continue
+                groups[owner_id].append(i)
+            
+            for owner_id, indices in groups.items():
+                partition = service.partition_name(owner_id)
+                copied[partition] += len(indices)
+                source_ids.extend(batch["ids"][i] for i in indices)
+                if dry_run:
+                    continue
+                
+                store = await service.store_for_owner(owner_id)
+                await store.add(
+                    ids=[batch["ids"][i] for i in indices],
+                    embeddings=[batch["embeddings"][i] for i in indices],
+                    documents=[batch["documents"][i] for i in indices],
+                    metadatas=[batch["metadatas"][i] for i in indices]
+                )
+        
+        for partition, count in sorted(copied.items()):
+            print(f"{partition:<48} {count:>10} vectors")
+        print(f"{'total':<48} {sum(copied.values()):>10} vectors")
+        if skipped:
+            print(f"{skipped} vectors without owner_id were left in {settings.CHROMA_COLLECTION_NAME}")
+        
+        if delete_source and not dry_run:
+            for start in range(0, len(source_ids), batch_size):
+                await source.delete(ids=source_ids[start:start + batch_size])
+            print(f"Deleted {len(source_ids)} vectors from {settings.CHROMA_COLLECTION_NAME}")
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--delete-source", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.delete_source, args.dry_run))
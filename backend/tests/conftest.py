@@ -2,14 +2,19 @@ import asyncio
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient
+from unittest.mock import Mock
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
 from app.core.database import get_db, Base
+from app.api.deps import get_embedding_service, get_chat_service, get_lexical_index
 from app.core.config import settings
 from app.models.user import User
 from app.core.security import get_password_hash
+from app.services.chat_service import ChatService
+from app.services.embedding_service import EmbeddingService
+from app.services.lexical_index import LexicalIndex
 
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
@@ -38,12 +43,23 @@ async def db_session():
         await conn.run_sync(Base.metadata.drop_all)
 
 
+@pytest.fixture
+def embedding_service():
+    return Mock(spec=EmbeddingService)
+
+
 @pytest_asyncio.fixture
-async def client(db_session):
+async def client(db_session, embedding_service):
     def override_get_db():
         return db_session
     
+    lexical_index = LexicalIndex()
+    chat_service = ChatService(embedding_service=embedding_service, client=Mock(), lexical_index=lexical_index)
+    
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_embedding_service] = lambda: embedding_service
+    app.dependency_overrides[get_chat_service] = lambda: chat_service
+    app.dependency_overrides[get_lexical_index] = lambda: lexical_index
     
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
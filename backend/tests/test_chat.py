@@ -2,6 +2,9 @@ import pytest
 from httpx import AsyncClient
 from unittest.mock import patch, Mock
 
+from app.core.config import settings
+from app.services.stage_timer import StageTimeout
+
 
 class TestChat:
     async def test_chat_new_conversation(self, authenticated_client: AsyncClient):
@@ -77,6 +80,72 @@ class TestChat:
         assert response.status_code == 500
         assert "Chat processing failed" in response.json()["detail"]
     
+    async def test_chat_stage_timeout_returns_504(self, authenticated_client: AsyncClient):
+        with patch("app.services.chat_service.ChatService.generate_response") as mock_chat:
+            mock_chat.side_effect = StageTimeout("vector_search")
+            
+            response = await authenticated_client.post(
+                "/api/v1/chat/",
+                json={"message": "What is this document about?"}
+            )
+        
+        assert response.status_code == 504
+        assert "vector_search" in response.json()["detail"]
+    
+    async def test_chat_batch_returns_answers_in_order(self, authenticated_client: AsyncClient):
+        batch = {
+            "results": [
+                {"question": "q1", "response": "a1", "sources": [], "cached": False, "error": None},
+                {"question": "q2", "response": None, "sources": [], "cached": False, "error": "failed"},
+            ],
+            "timings": None,
+        }
+        
+        with patch("app.services.chat_service.ChatService.answer_batch") as mock_batch:
+            mock_batch.return_value = batch
+            
+            response = await authenticated_client.post(
+                "/api/v1/chat/batch",
+                json={"questions": ["q1", "q2"]}
+            )
+        
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [(result["question"], result["message"], result["error"]) for result in results] == [
+            ("q1", "a1", None), ("q2", None, "failed")
+        ]
+        
+        conversations = await authenticated_client.get("/api/v1/chat/conversations")
+        assert conversations.json() == []
+    
+    async def test_chat_batch_rejects_too_many_questions(self, authenticated_client: AsyncClient, monkeypatch):
+        monkeypatch.setattr(settings, "CHAT_BATCH_MAX_QUESTIONS", 2)
+        
+        response = await authenticated_client.post(
+            "/api/v1/chat/batch",
+            json={"questions": ["q1", "q2", "q3"]}
+        )
+        
+        assert response.status_code == 400
+    
+    async def test_chat_stream_sends_sources_then_tokens(self, authenticated_client: AsyncClient):
+        async def stream_response(self, **kwargs):
+            yield {"event": "sources", "data": {"sources": [], "cached": False}}
+            yield {"event": "token", "data": {"content": "Hello"}}
+            yield {"event": "done", "data": {"cached": False}}
+        
+        with patch("app.services.chat_service.ChatService.stream_response", stream_response):
+            response = await authenticated_client.post(
+                "/api/v1/chat/stream",
+                json={"message": "Hi"}
+            )
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [block.split("\n")[0] for block in response.text.strip().split("\n\n")]
+        assert events == ["event: conversation", "event: sources", "event: token", "event: done"]
+        assert 'data: {"content": "Hello"}' in response.text
+    
     async def test_get_conversations(self, authenticated_client: AsyncClient):
         response = await authenticated_client.get("/api/v1/chat/conversations")
         
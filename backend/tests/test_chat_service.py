@@ -0,0 +1,280 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock
+
+from app.core.config import settings
+from app.services.chat_service import ChatService
+from app.services.conversation_memory import ConversationMemory
+from app.services.embedding_service import EmbeddingService
+from app.services.lexical_index import LexicalIndex
+from app.services.response_cache import MemoryResponseCache
+from app.services.stage_timer import StageTimeout
+
+
+class WordEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(monkeypatch):
+    monkeypatch.setattr("app.services.context_builder.get_encoding", lambda model: WordEncoding())
+
+
+def make_chat_service():
+    embedding_service = Mock(spec=EmbeddingService)
+    embedding_service.embed_query.return_value = [1.0, 0.0]
+    embedding_service.embed_queries.side_effect = lambda queries: [[1.0, 0.0] for _ in queries]
+    embedding_service.search_by_embedding.return_value = {
+        "ids": ["a", "b"],
+        "documents": ["dense a", "dense b"],
+        "metadatas": [{"chunk_index": 0}, {"chunk_index": 1}],
+        "distances": [0.1, 0.2],
+    }
+    embedding_service.search_by_embeddings.side_effect = lambda embeddings, *args: [
+        embedding_service.search_by_embedding.return_value for _ in embeddings
+    ]
+    embedding_service.distances_for_ids.return_value = {"c": 0.4}
+    embedding_service.embeddings_for_ids.return_value = {
+        "a": [1.0, 0.0], "b": [0.0, 1.0], "c": [0.6, 0.8]
+    }
+    lexical_index = Mock(spec=LexicalIndex)
+    lexical_index.search.return_value = {
+        "ids": ["c", "b"],
+        "documents": ["keyword c", "dense b"],
+        "metadatas": [{"chunk_index": 2}, {"chunk_index": 1}],
+        "scores": [7.5, 3.0],
+    }
+    return ChatService(embedding_service=embedding_service, client=Mock(), lexical_index=lexical_index)
+
+
+def make_staged_service(monkeypatch):
+    monkeypatch.setattr(settings, "HYBRID_SEARCH_ENABLED", True)
+    service = make_chat_service()
+    service.client.chat.completions.create = AsyncMock(return_value=Mock(
+        choices=[Mock(message=Mock(content="thirty days"))]
+    ))
+    monkeypatch.setattr(
+        "app.services.chat_service.load_memory", AsyncMock(return_value=ConversationMemory())
+    )
+    service._save_messages = AsyncMock()
+    return service
+
+
+class TestChatServiceRetrieval:
+    async def test_turn_fuses_dense_and_lexical_rankings(self, monkeypatch):
+        service = make_staged_service(monkeypatch)
+        service.build_context = AsyncMock(wraps=service.build_context)
+        
+        await service.generate_response("INV-2023-0042", "c1", 1, Mock())
+        
+        results = service.build_context.call_args.args[0]
+        assert results["ids"] == ["b", "a", "c"]
+        assert results["documents"] == ["dense b", "dense a", "keyword c"]
+        assert results["distances"] == [0.2, 0.1, 0.4]
+        assert results["lexical"] == [True, False, True]
+        service.embedding_service.distances_for_ids.assert_awaited_once_with([1.0, 0.0], ["c"], 1)
+    
+    async def test_turn_falls_back_to_dense_when_lexical_fails(self, monkeypatch):
+        service = make_staged_service(monkeypatch)
+        service.lexical_index.search.side_effect = RuntimeError("no index")
+        db = Mock(rollback=AsyncMock())
+        
+        result = await service.generate_response("question", "c1", 1, db)
+        
+        assert [source["content"] for source in result["sources"]] == ["dense a", "dense b"]
+        db.rollback.assert_awaited_once()
+
+
+class TestChatServiceResponseCache:
+    def make_cached_service(self, monkeypatch, version="v1"):
+        monkeypatch.setattr(settings, "HYBRID_SEARCH_ENABLED", True)
+        monkeypatch.setattr(
+            "app.services.chat_service.corpus_version", AsyncMock(return_value=version)
+        )
+        service = make_chat_service()
+        service.response_cache = MemoryResponseCache(
+            similarity=0.95, ttl=60, entries_per_key=5, max_keys=10
+        )
+        service.client.chat.completions.create = AsyncMock(return_value=Mock(
+            choices=[Mock(message=Mock(content="thirty days"))]
+        ))
+        monkeypatch.setattr(
+            "app.services.chat_service.load_memory", AsyncMock(return_value=ConversationMemory())
+        )
+        service._save_messages = AsyncMock()
+        return service
+    
+    async def test_similar_question_is_answered_from_cache(self, monkeypatch):
+        service = self.make_cached_service(monkeypatch)
+        
+        first = await service.generate_response("What are the payment terms?", "c1", 1, Mock())
+        second = await service.generate_response("what are the payment terms", "c2", 1, Mock())
+        
+        assert (first["cached"], second["cached"]) == (False, True)
+        assert second["response"] == "thirty days"
+        service.client.chat.completions.create.assert_awaited_once()
+        assert service._save_messages.await_count == 2
+    
+    async def test_corpus_change_and_bypass_skip_cache(self, monkeypatch):
+        service = self.make_cached_service(monkeypatch)
+        await service.generate_response("payment terms?", "c1", 1, Mock())
+        
+        bypassed = await service.generate_response("payment terms?", "c2", 1, Mock(), use_cache=False)
+        monkeypatch.setattr(
+            "app.services.chat_service.corpus_version", AsyncMock(return_value="v2")
+        )
+        after_upload = await service.generate_response("payment terms?", "c3", 1, Mock())
+        
+        assert not bypassed["cached"] and not after_upload["cached"]
+        assert service.client.chat.completions.create.await_count == 3
+
+
+class TestChatServiceStages:
+    async def test_slow_lexical_search_falls_back_to_dense_ranking(self, monkeypatch):
+        service = make_staged_service(monkeypatch)
+        monkeypatch.setitem(settings.CHAT_STAGE_TIMEOUTS, "lexical_search", 0.01)
+        
+        async def slow_search(*args):
+            await asyncio.sleep(1)
+        service.lexical_index.search.side_effect = slow_search
+        db = Mock(rollback=AsyncMock())
+        
+        result = await service.generate_response("terms?", "c1", 1, db)
+        
+        assert [source["content"] for source in result["sources"]] == ["dense a", "dense b"]
+        db.rollback.assert_awaited_once()
+    
+    async def test_slow_vector_search_raises_stage_timeout(self, monkeypatch):
+        service = make_staged_service(monkeypatch)
+        monkeypatch.setitem(settings.CHAT_STAGE_TIMEOUTS, "vector_search", 0.01)
+        
+        async def slow_search(*args):
+            await asyncio.sleep(1)
+        service.embedding_service.search_by_embedding.side_effect = slow_search
+        
+        with pytest.raises(StageTimeout) as error:
+            await service.generate_response("terms?", "c1", 1, Mock())
+        
+        assert error.value.stage == "vector_search"
+        service.client.chat.completions.create.assert_not_awaited()
+    
+    async def test_timings_are_returned_in_debug_mode(self, monkeypatch):
+        service = make_staged_service(monkeypatch)
+        
+        assert (await service.generate_response("terms?", "c1", 1, Mock()))["timings"] is None
+        
+        monkeypatch.setattr(settings, "DEBUG", True)
+        timings = (await service.generate_response("terms?", "c2", 1, Mock()))["timings"]
+        
+        assert {"history", "query_embedding", "vector_search", "lexical_search", "fusion",
+                "context", "completion", "total"} <= timings.keys()
+
+
+class TestChatServiceBatch:
+    async def test_answers_keep_input_order_within_concurrency_limit(self, monkeypatch):
+        monkeypatch.setattr(settings, "HYBRID_SEARCH_ENABLED", True)
+        monkeypatch.setattr(settings, "CHAT_BATCH_CONCURRENCY", 2)
+        service = make_chat_service()
+        running = 0
+        peak = 0
+        
+        async def complete(model, messages, temperature, max_tokens):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            question = messages[-1]["content"]
+            await asyncio.sleep(0.01 if question == "first" else 0)
+            running -= 1
+            return Mock(choices=[Mock(message=Mock(content=f"answer to {question}"))])
+        service.client.chat.completions.create = AsyncMock(side_effect=complete)
+        questions = ["first", "second", "third", "fourth", "fifth"]
+        
+        batch = await service.answer_batch(questions, 1, Mock())
+        
+        assert [result["response"] for result in batch["results"]] == [
+            f"answer to {question}" for question in questions
+        ]
+        assert peak == 2
+        service.embedding_service.embed_queries.assert_called_once_with(questions)
+        service.embedding_service.search_by_embeddings.assert_called_once()
+    
+    async def test_failed_answer_does_not_fail_the_batch(self, monkeypatch):
+        monkeypatch.setattr(settings, "HYBRID_SEARCH_ENABLED", False)
+        service = make_chat_service()
+        
+        async def complete(model, messages, temperature, max_tokens):
+            if messages[-1]["content"] == "bad":
+                raise RuntimeError("rate limited")
+            return Mock(choices=[Mock(message=Mock(content="ok"))])
+        service.client.chat.completions.create = AsyncMock(side_effect=complete)
+        
+        batch = await service.answer_batch(["good", "bad"], 1, Mock())
+        
+        assert [(result["response"], result["error"]) for result in batch["results"]] == [
+            ("ok", None), (None, "rate limited")
+        ]
+        assert batch["results"][1]["sources"]
+        service.lexical_index.search.assert_not_called()
+    
+    async def test_batch_timings_sum_repeated_stages(self, monkeypatch):
+        monkeypatch.setattr(settings, "HYBRID_SEARCH_ENABLED", False)
+        monkeypatch.setattr(settings, "DEBUG", True)
+        service = make_chat_service()
+        
+        async def complete(model, messages, temperature, max_tokens):
+            await asyncio.sleep(0.01)
+            return Mock(choices=[Mock(message=Mock(content="ok"))])
+        service.client.chat.completions.create = AsyncMock(side_effect=complete)
+        
+        timings = (await service.answer_batch(["one", "two", "three"], 1, Mock()))["timings"]
+        
+        assert timings["completion_count"] == 3
+        assert timings["completion"] >= 30
+        assert "vector_search_count" not in timings
+
+
+class FakeStream:
+    def __init__(self, parts):
+        self.parts = parts
+        self.close = AsyncMock()
+    
+    async def __aiter__(self):
+        for part in self.parts:
+            yield Mock(choices=[Mock(delta=Mock(content=part))])
+
+
+class TestChatServiceStreaming:
+    def make_streaming_service(self, monkeypatch, parts):
+        monkeypatch.setattr(settings, "HYBRID_SEARCH_ENABLED", True)
+        service = make_chat_service()
+        service.response_cache = None
+        service.stream = FakeStream(parts)
+        service.client.chat.completions.create = AsyncMock(return_value=service.stream)
+        monkeypatch.setattr(
+            "app.services.chat_service.load_memory", AsyncMock(return_value=ConversationMemory())
+        )
+        service._save_messages = AsyncMock()
+        return service
+    
+    async def test_stream_sends_sources_before_tokens_and_saves_answer(self, monkeypatch):
+        service = self.make_streaming_service(monkeypatch, ["Thirty", " days", "."])
+        
+        events = [event async for event in service.stream_response("terms?", "c1", 1, Mock())]
+        
+        assert [event["event"] for event in events] == ["sources", "token", "token", "token", "done"]
+        assert events[0]["data"]["sources"]
+        service._save_messages.assert_awaited_once()
+        assert service._save_messages.await_args.args[2] == "Thirty days."
+        service.stream.close.assert_awaited_once()
+    
+    async def test_closing_the_stream_saves_partial_answer(self, monkeypatch):
+        service = self.make_streaming_service(monkeypatch, ["Thirty", " days", "."])
+        events = service.stream_response("terms?", "c1", 1, Mock())
+        
+        assert (await events.__anext__())["event"] == "sources"
+        assert (await events.__anext__())["data"]["content"] == "Thirty"
+        await events.aclose()
+        
+        service.stream.close.assert_awaited_once()
+        assert service._save_messages.await_args.args[2] == "Thirty"
@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import select
+
+from app.models.document import Document, DocumentChunk
+from app.services.chunk_writer import ChunkWriter
+
+
+class TestChunkWriter:
+    async def test_write_inserts_all_rows(self, db_session, test_user):
+        document = Document(
+            filename="test.txt",
+            file_type="text/plain",
+            file_size=10,
+            metadata={},
+            owner_id=test_user.id
+        )
+        db_session.add(document)
+        await db_session.commit()
+        
+        ids = await ChunkWriter().write(db_session, [
+            {
+                "document_id": document.id,
+                "chunk_index": i,
+                "content": f"chunk {i}",
+                "embedding_id": f"{document.id}_{i}",
+                "tokens": 2,
+            }
+            for i in range(3)
+        ])
+        await db_session.commit()
+        
+        result = await db_session.execute(
+            select(DocumentChunk)
+            .where(DocumentChunk.document_id == document.id)
+            .order_by(DocumentChunk.chunk_index)
+        )
+        chunks = result.scalars().all()
+        assert [chunk.id for chunk in chunks] == ids
+        assert [chunk.content for chunk in chunks] == ["chunk 0", "chunk 1", "chunk 2"]
+    
+    async def test_write_empty_rows(self, db_session):
+        assert await ChunkWriter().write(db_session, []) == []
+    
+    async def test_write_generates_id_for_null_id(self, db_session, test_user):
+        document = Document(
+            filename="test.txt",
+            file_type="text/plain",
+            file_size=10,
+            metadata={},
+            owner_id=test_user.id
+        )
+        db_session.add(document)
+        await db_session.commit()
+        
+        ids = await ChunkWriter().write(db_session, [{
+            "id": None,
+            "document_id": document.id,
+            "chunk_index": 0,
+            "content": "chunk 0",
+            "embedding_id": f"{document.id}_0",
+            "tokens": 2,
+        }])
+        await db_session.commit()
+        
+        chunk = (await db_session.execute(select(DocumentChunk))).scalar_one()
+        assert ids[0] is not None
+        assert chunk.id == ids[0]
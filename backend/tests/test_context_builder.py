@@ -0,0 +1,104 @@
+import pytest
+
+from app.core.config import settings
+from app.services.context_builder import (
+    ContextChunk,
+    context_candidates,
+    merge_overlapping,
+    pack_context,
+    render_context,
+    select_context,
+)
+
+
+class WordEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(monkeypatch):
+    monkeypatch.setattr("app.services.context_builder.get_encoding", lambda model: WordEncoding())
+
+
+def chunk(id_, content, index, similarity=0.9, document_id="d1"):
+    return ContextChunk(id_, content, {"document_id": document_id, "chunk_index": index}, similarity)
+
+
+class TestContextBuilder:
+    def test_candidates_below_similarity_cutoff_are_dropped(self, monkeypatch):
+        monkeypatch.setattr(settings, "CHAT_CONTEXT_MIN_SIMILARITY", 0.5)
+        
+        candidates = context_candidates({
+            "ids": ["a", "b"],
+            "documents": ["close", "far"],
+            "metadatas": [{}, {}],
+            "distances": [0.2, 0.7],
+        })
+        
+        assert [candidate.id for candidate in candidates] == ["a"]
+    
+    def test_keyword_matches_bypass_similarity_cutoff(self, monkeypatch):
+        monkeypatch.setattr(settings, "CHAT_CONTEXT_MIN_SIMILARITY", 0.5)
+        
+        candidates = context_candidates({
+            "ids": ["a", "b", "c"],
+            "documents": ["close", "INV-2024-0042", "far"],
+            "metadatas": [{}, {}, {}],
+            "distances": [0.2, 0.9, 0.7],
+            "lexical": [False, True, False],
+        })
+        
+        assert [candidate.id for candidate in candidates] == ["a", "b"]
+    
+    def test_select_context_drops_near_duplicates(self, monkeypatch):
+        monkeypatch.setattr(settings, "CHAT_DUPLICATE_SIMILARITY", 0.95)
+        candidates = [
+            chunk("a", "payment terms", 0, 0.9),
+            chunk("a2", "payment terms again", 5, 0.89),
+            chunk("b", "termination", 1, 0.6),
+        ]
+        embeddings = {"a": [1.0, 0.0], "a2": [0.99, 0.01], "b": [0.0, 1.0]}
+        
+        selected = select_context(candidates, embeddings)
+        
+        assert [candidate.id for candidate in selected] == ["a", "b"]
+    
+    def test_merge_overlapping_keeps_repeated_text_once(self):
+        first = "Payment is due within thirty days of the invoice date."
+        second = "thirty days of the invoice date. Late payments accrue interest."
+        
+        assert merge_overlapping(first, second) == (
+            "Payment is due within thirty days of the invoice date. Late payments accrue interest."
+        )
+    
+    def test_render_context_merges_adjacent_chunks(self):
+        chunks = [
+            chunk("d1_1", "the agreement renews yearly. Either party may cancel.", 1),
+            chunk("d2_0", "other document", 0, document_id="d2"),
+            chunk("d1_0", "Signed in March; the agreement renews yearly.", 0),
+        ]
+        
+        assert render_context(chunks) == (
+            "Document: Signed in March; the agreement renews yearly. Either party may cancel."
+            "\n\nDocument: other document"
+        )
+    
+    def test_pack_context_fits_the_token_budget(self, monkeypatch):
+        monkeypatch.setattr(settings, "CHAT_MAX_PROMPT_TOKENS", 40)
+        monkeypatch.setattr(settings, "CHAT_MAX_HISTORY_TOKENS", 10)
+        history = [
+            {"role": "user", "content": "an old question that no longer fits"},
+            {"role": "assistant", "content": "recent answer"},
+        ]
+        chunks = [
+            chunk("a", "one two three four five", 0, document_id="a"),
+            chunk("b", " ".join(["long"] * 30), 0, document_id="b"),
+            chunk("c", "six seven", 0, document_id="c"),
+        ]
+        
+        packed = pack_context(lambda context: f"Context: {context}", history, "what is due?", chunks)
+        
+        assert packed.history == history[1:]
+        assert [selected.id for selected in packed.chunks] == ["a", "c"]
+        assert packed.tokens <= 40
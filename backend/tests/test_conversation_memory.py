@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from unittest.mock import AsyncMock, Mock
+
+from app.core.config import settings
+from app.models.conversation import Conversation, Message
+from app.services.conversation_memory import compact_memory, load_memory
+
+
+class WordEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(monkeypatch):
+    monkeypatch.setattr("app.services.context_builder.get_encoding", lambda model: WordEncoding())
+
+
+async def create_conversation(db_session, user_id, turns):
+    conversation = Conversation(user_id=user_id, title="Contract questions")
+    db_session.add(conversation)
+    await db_session.flush()
+    
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for index, content in enumerate(turns):
+        db_session.add(Message(
+            conversation_id=conversation.id,
+            role="user" if index % 2 == 0 else "assistant",
+            content=content,
+            created_at=start + timedelta(minutes=index)
+        ))
+    await db_session.commit()
+    return conversation
+
+
+def summary_client(summary):
+    client = Mock()
+    client.chat.completions.create = AsyncMock(return_value=Mock(
+        choices=[Mock(message=Mock(content=summary))]
+    ))
+    return client
+
+
+class TestConversationMemory:
+    async def test_compaction_folds_oldest_turns_into_summary(self, db_session, test_user, monkeypatch):
+        monkeypatch.setattr(settings, "CHAT_MAX_HISTORY_TOKENS", 40)
+        turns = [f"turn {index} " + "word " * 5 for index in range(8)]
+        conversation = await create_conversation(db_session, test_user.id, turns)
+        client = summary_client("The user asked about payment terms.")
+        
+        assert await compact_memory(db_session, str(conversation.id), client)
+        memory = await load_memory(db_session, str(conversation.id))
+        
+        assert memory.summary == "The user asked about payment terms."
+        assert [message["content"] for message in memory.messages] == turns[-2:]
+        prompt = client.chat.completions.create.await_args.kwargs["messages"][1]["content"]
+        assert turns[0] in prompt and turns[-1] not in prompt
+    
+    async def test_compaction_skips_history_within_budget(self, db_session, test_user, monkeypatch):
+        monkeypatch.setattr(settings, "CHAT_MAX_HISTORY_TOKENS", 1000)
+        conversation = await create_conversation(db_session, test_user.id, ["hello", "hi there"])
+        client = summary_client("unused")
+        
+        assert not await compact_memory(db_session, str(conversation.id), client)
+        client.chat.completions.create.assert_not_awaited()
+        memory = await load_memory(db_session, str(conversation.id))
+        assert memory.summary is None
+        assert [message["role"] for message in memory.messages] == ["user", "assistant"]
@@ -1,7 +1,41 @@
 import pytest
 import io
+import time
 from unittest.mock import patch, Mock
+from PIL import Image
+from app.core.config import settings
 from app.services.document_processor import DocumentProcessor
+from app.services.extraction_pool import (
+    PageTimeoutError,
+    extract_pdf_page_range,
+    shutdown_process_pool,
+    time_limit,
+)
+from app.services.ocr import preprocess_image
+
+
+def make_pdf(pages):
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF"
+    return out.encode("latin-1")
 
 
 class TestDocumentProcessor:
@@ -19,6 +53,14 @@ class TestDocumentProcessor:
         assert result["metadata"]["filename"] == "test.txt"
         assert result["metadata"]["file_type"] == ".txt"
     
+    async def test_process_text_file_in_blocks(self, monkeypatch):
+        monkeypatch.setattr(settings, "TEXT_READ_BLOCK_SIZE", 3)
+        file = io.BytesIO("Déjà vu — naïve café".encode("utf-8"))
+        
+        result = await self.processor.process_file(file, "test.txt")
+        
+        assert result["content"] == "Déjà vu — naïve café"
+    
     async def test_process_unsupported_file_type(self):
         file = io.BytesIO(b"content")
         
@@ -32,12 +74,81 @@ class TestDocumentProcessor:
         mock_pdf_reader.return_value.pages = [mock_page]
         
         file = io.BytesIO(b"fake pdf content")
+        calls = []
         
-        result = await self.processor.process_file(file, "test.pdf")
+        async def run_inline(func, *args):
+            calls.append(args)
+            return func(*args)
+        
+        with patch("app.services.document_processor.run_in_process_pool", run_inline):
+            result = await self.processor.process_file(file, "test.pdf")
         
         assert result["content"] == "PDF content here"
+        assert calls[0][-1] == settings.PDF_PAGE_TIMEOUT
         assert result["metadata"]["file_type"] == ".pdf"
     
+    async def test_process_pdf_file_in_process_pool(self, monkeypatch):
+        monkeypatch.setattr(settings, "PDF_PAGES_PER_TASK", 1)
+        monkeypatch.setattr(settings, "EXTRACTION_POOL_WORKERS", 2)
+        file = io.BytesIO(make_pdf(["First page", "Second page", "Third page"]))
+        
+        try:
+            result = await self.processor.process_file(file, "test.pdf")
+        finally:
+            shutdown_process_pool()
+        
+        assert result["content"] == "First page\n\nSecond page\n\nThird page"
+    
+    @patch('pytesseract.image_to_string')
+    async def test_process_image_file(self, mock_ocr):
+        mock_ocr.return_value = "  Scanned text  "
+        image = io.BytesIO()
+        Image.new("RGB", (100, 50), "white").save(image, format="PNG")
+        image.seek(0)
+        
+        async def run_inline(func, *args):
+            return func(*args)
+        
+        with patch("app.services.document_processor.run_in_process_pool", run_inline):
+            result = await self.processor.process_file(image, "scan.png")
+        
+        assert result["content"] == "Scanned text"
+        assert result["metadata"]["file_type"] == ".png"
+    
+    @patch('PyPDF2.PdfReader')
+    async def test_process_scanned_pdf_falls_back_to_ocr(self, mock_pdf_reader):
+        text_page = Mock()
+        text_page.extract_text.return_value = "Typed page"
+        scanned_page = Mock()
+        scanned_page.extract_text.return_value = ""
+        mock_pdf_reader.return_value.pages = [text_page, scanned_page]
+        ocr_calls = []
+        
+        async def run_inline(func, *args):
+            if func is extract_pdf_page_range:
+                return func(*args)
+            ocr_calls.append(args[1])
+            return {"page": args[1], "text": "Scanned page", "duration": 0.1}
+        
+        with patch("app.services.document_processor.run_in_process_pool", run_inline):
+            result = await self.processor.process_file(io.BytesIO(b"fake pdf"), "test.pdf")
+        
+        assert ocr_calls == [1]
+        assert result["content"] == "Typed page\n\nScanned page"
+    
+    def test_preprocess_image_downscales_and_binarizes(self):
+        image = Image.new("RGB", (1200, 600), (200, 200, 200))
+        
+        prepared = preprocess_image(image, source_dpi=600, target_dpi=300, threshold=128)
+        
+        assert prepared.size == (600, 300)
+        assert prepared.mode == "1"
+    
+    def test_time_limit_interrupts_slow_work(self):
+        with pytest.raises(PageTimeoutError):
+            with time_limit(0.05):
+                time.sleep(1)
+    
     async def test_split_text_empty_content(self):
         chunks = self.processor._split_text("")
         assert chunks == []
@@ -49,8 +160,35 @@ class TestDocumentProcessor:
         assert chunks[0] == content
     
     async def test_split_text_long_content(self):
-        content = "A" * 2000  # Long content that should be split
-        chunks = self.processor._split_text(content)
+        content = " ".join(f"word{i}" for i in range(2000))
+        chunks = self.processor.chunker.split_text(content)
         assert len(chunks) > 1
         for chunk in chunks:
-            assert len(chunk) <= 1000  # Based on chunk_size in config
\ No newline at end of file
+            assert chunk.tokens <= settings.CHUNK_SIZE_TOKENS
+    
+    async def test_split_text_reports_exact_token_counts(self):
+        content = "\n\n".join(
+            " ".join(f"paragraph {p} sentence {i}." for i in range(40)) for p in range(10)
+        )
+        chunks = self.processor.chunker.split_text(content)
+        for chunk in chunks:
+            assert chunk.tokens == len(self.processor.chunker.encoding.encode(chunk.content))
+    
+    async def test_split_text_prefers_paragraph_boundaries(self):
+        paragraphs = [" ".join(f"p{p}w{i}" for i in range(30)) for p in range(20)]
+        chunks = self.processor.chunker.split_text("\n\n".join(paragraphs))
+        for chunk in chunks[:-1]:
+            assert chunk.content.split()[-1].endswith("w29")
+    
+    async def test_split_stream_bounds_chunks(self, monkeypatch):
+        monkeypatch.setattr(settings, "STREAM_SPLIT_WINDOW", 3000)
+        words = [f"word{i}" for i in range(2000)]
+        
+        async def texts():
+            for start in range(0, len(words), 100):
+                yield " ".join(words[start:start + 100]) + " ", start / len(words)
+        
+        chunks = [chunk async for chunk, _ in self.processor.split_stream(texts())]
+        
+        assert all(chunk.tokens <= settings.CHUNK_SIZE_TOKENS for chunk in chunks)
+        assert {word for chunk in chunks for word in chunk.content.split()} == set(words)
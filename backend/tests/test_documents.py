@@ -1,53 +1,121 @@
 import pytest
 import io
+import zipfile
 from httpx import AsyncClient
-from unittest.mock import patch, Mock
+from unittest.mock import AsyncMock, patch, Mock
+
+from app.core.config import settings
+from app.models.document import Document, DocumentChunk
+from app.tasks.documents import reindex_document
 
 
 class TestDocuments:
-    async def test_upload_document_success(self, authenticated_client: AsyncClient):
+    async def test_upload_document_success(self, authenticated_client: AsyncClient, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "UPLOAD_DIRECTORY", str(tmp_path))
         file_content = b"This is a test document content."
         files = {
             "file": ("test.txt", io.BytesIO(file_content), "text/plain")
         }
         
-        with patch("app.services.document_processor.DocumentProcessor.process_file") as mock_process, \
-             patch("app.services.embedding_service.EmbeddingService.store_document_embeddings") as mock_store:
-            
-            mock_process.return_value = {
-                "content": "This is a test document content.",
-                "chunks": ["This is a test", "document content."],
-                "metadata": {"filename": "test.txt", "chunk_count": 2}
-            }
-            mock_store.return_value = ["chunk1", "chunk2"]
-            
+        with patch("app.api.api_v1.endpoints.documents.process_document") as mock_task:
             response = await authenticated_client.post(
                 "/api/v1/documents/upload",
                 files=files
             )
         
-        assert response.status_code == 200
+        assert response.status_code == 202
         data = response.json()
         assert data["filename"] == "test.txt"
-        assert data["processing_status"] == "completed"
+        assert data["processing_status"] == "pending"
         assert "id" in data
+        mock_task.delay.assert_called_once_with(data["id"])
+        
+        stored_files = list(tmp_path.rglob("*.txt"))
+        assert len(stored_files) == 1
+        assert stored_files[0].read_bytes() == file_content
     
-    async def test_upload_document_processing_failure(self, authenticated_client: AsyncClient):
+    async def test_upload_document_unsupported_type(self, authenticated_client: AsyncClient):
+        files = {
+            "file": ("test.xyz", io.BytesIO(b"content"), "application/octet-stream")
+        }
+        
+        response = await authenticated_client.post(
+            "/api/v1/documents/upload",
+            files=files
+        )
+        
+        assert response.status_code == 400
+        assert "Unsupported file type" in response.json()["detail"]
+    
+    async def test_upload_document_too_large(self, authenticated_client: AsyncClient, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "UPLOAD_DIRECTORY", str(tmp_path))
+        monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 10)
+        files = {
+            "file": ("test.txt", io.BytesIO(b"x" * 100), "text/plain")
+        }
+        
+        response = await authenticated_client.post(
+            "/api/v1/documents/upload",
+            files=files
+        )
+        
+        assert response.status_code == 413
+        assert list(tmp_path.rglob("*.txt")) == []
+    
+    async def test_upload_document_queue_failure(self, authenticated_client: AsyncClient, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "UPLOAD_DIRECTORY", str(tmp_path))
         file_content = b"This is a test document content."
         files = {
             "file": ("test.txt", io.BytesIO(file_content), "text/plain")
         }
         
-        with patch("app.services.document_processor.DocumentProcessor.process_file") as mock_process:
-            mock_process.side_effect = Exception("Processing failed")
+        with patch("app.api.api_v1.endpoints.documents.process_document") as mock_task:
+            mock_task.delay.side_effect = Exception("Broker unavailable")
             
             response = await authenticated_client.post(
                 "/api/v1/documents/upload",
                 files=files
             )
         
-        assert response.status_code == 500
-        assert "Processing failed" in response.json()["detail"]
+        assert response.status_code == 503
+        assert "Broker unavailable" in response.json()["detail"]
+    
+    async def test_bulk_upload_reports_per_file_status(self, authenticated_client: AsyncClient, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "UPLOAD_DIRECTORY", str(tmp_path))
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zip_file:
+            zip_file.writestr("docs/a.txt", "First archived document.")
+            zip_file.writestr("docs/b.exe", "binary")
+        archive.seek(0)
+        files = [
+            ("files", ("notes.txt", io.BytesIO(b"Loose document."), "text/plain")),
+            ("files", ("bundle.zip", archive, "application/zip")),
+        ]
+        
+        with patch("app.api.api_v1.endpoints.documents.process_documents") as mock_task:
+            response = await authenticated_client.post("/api/v1/documents/bulk", files=files)
+        
+        assert response.status_code == 202
+        data = response.json()
+        assert data["queued"] == 2
+        assert data["rejected"] == 1
+        statuses = {item["filename"]: item for item in data["items"]}
+        assert statuses["notes.txt"]["status"] == "queued"
+        assert statuses["bundle.zip/a.txt"]["status"] == "queued"
+        assert statuses["bundle.zip/b.exe"]["status"] == "rejected"
+        assert "Unsupported file type" in statuses["bundle.zip/b.exe"]["error"]
+        mock_task.delay.assert_called_once_with([
+            statuses["notes.txt"]["document_id"],
+            statuses["bundle.zip/a.txt"]["document_id"],
+        ])
+        assert len(list(tmp_path.rglob("*.txt"))) == 2
+    
+    async def test_get_document_status_not_found(self, authenticated_client: AsyncClient):
+        fake_id = "550e8400-e29b-41d4-a716-446655440000"
+        response = await authenticated_client.get(f"/api/v1/documents/{fake_id}/status")
+        
+        assert response.status_code == 404
+        assert "not found" in response.json()["detail"]
     
     async def test_list_documents(self, authenticated_client: AsyncClient):
         response = await authenticated_client.get("/api/v1/documents/")
@@ -67,4 +135,123 @@ class TestDocuments:
         response = await authenticated_client.delete(f"/api/v1/documents/{fake_id}")
         
         assert response.status_code == 404
-        assert "not found" in response.json()["detail"]
\ No newline at end of file
+        assert "not found" in response.json()["detail"]
+    
+    async def test_replace_document_not_found(self, authenticated_client: AsyncClient):
+        fake_id = "550e8400-e29b-41d4-a716-446655440000"
+        files = {
+            "file": ("test.txt", io.BytesIO(b"Updated content."), "text/plain")
+        }
+        
+        with patch("app.api.api_v1.endpoints.documents.reindex_document") as mock_task:
+            response = await authenticated_client.put(f"/api/v1/documents/{fake_id}", files=files)
+        
+        assert response.status_code == 404
+        mock_task.delay.assert_not_called()
+    
+    async def test_replace_document_keeps_previous_file_for_reindex(
+        self, authenticated_client: AsyncClient, db_session, test_user, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "UPLOAD_DIRECTORY", str(tmp_path))
+        previous_path = tmp_path / "previous.txt"
+        previous_path.write_text("Original content.")
+        document = Document(
+            filename="test.txt",
+            file_type="text/plain",
+            file_size=17,
+            file_path=str(previous_path),
+            metadata={},
+            owner_id=test_user.id,
+            processing_status="completed"
+        )
+        db_session.add(document)
+        await db_session.commit()
+        files = {
+            "file": ("test.txt", io.BytesIO(b"Updated content."), "text/plain")
+        }
+        
+        with patch("app.api.api_v1.endpoints.documents.reindex_document") as mock_task:
+            response = await authenticated_client.put(f"/api/v1/documents/{document.id}", files=files)
+        
+        assert response.status_code == 202
+        assert previous_path.exists()
+        document_id, replacement, queued_previous_path = mock_task.delay.call_args.args
+        assert (document_id, queued_previous_path) == (str(document.id), str(previous_path))
+        assert replacement["file_size"] == len(b"Updated content.")
+        await db_session.refresh(document)
+        assert document.file_path == str(previous_path)
+    
+    def test_reindex_task_keeps_previous_file_until_completed(self, tmp_path):
+        previous_path = tmp_path / "previous.txt"
+        new_path = tmp_path / "new.txt"
+        replacement = {"filename": "new.txt", "file_path": str(new_path)}
+        
+        for status, kept, removed in [("completed", new_path, previous_path), ("failed", previous_path, new_path)]:
+            previous_path.write_text("old")
+            new_path.write_text("new")
+            with patch("app.tasks.documents._reindex_document", AsyncMock(return_value=status)):
+                assert reindex_document("d1", replacement, str(previous_path)) == status
+            assert kept.exists() and not removed.exists()
+        
+        previous_path.write_text("old")
+        new_path.write_text("new")
+        with patch("app.tasks.documents._reindex_document", AsyncMock(side_effect=RuntimeError("boom"))):
+            with pytest.raises(RuntimeError):
+                reindex_document("d1", replacement, str(previous_path))
+        assert previous_path.exists() and not new_path.exists()
+    
+    async def test_delete_document_removes_embeddings(
+        self, authenticated_client: AsyncClient, db_session, test_user, embedding_service
+    ):
+        document = Document(
+            filename="test.txt",
+            file_type="text/plain",
+            file_size=10,
+            metadata={},
+            owner_id=test_user.id,
+            processing_status="completed"
+        )
+        db_session.add(document)
+        await db_session.commit()
+        
+        response = await authenticated_client.delete(f"/api/v1/documents/{document.id}")
+        
+        assert response.status_code == 200
+        embedding_service.delete_document_embeddings.assert_called_once_with(str(document.id), test_user.id)
+    
+    async def test_search_returns_ranked_highlighted_page(
+        self, authenticated_client: AsyncClient, db_session, test_user
+    ):
+        document = Document(
+            filename="contract.txt",
+            file_type="text/plain",
+            file_size=10,
+            metadata={},
+            owner_id=test_user.id,
+            processing_status="completed"
+        )
+        db_session.add(document)
+        await db_session.flush()
+        for index, content in enumerate([
+            "The invoice <draft> is due in thirty days.",
+            "Invoice totals: invoice one and invoice two.",
+            "Termination requires written notice.",
+        ]):
+            db_session.add(DocumentChunk(document_id=document.id, chunk_index=index, content=content))
+        await db_session.commit()
+        
+        response = await authenticated_client.get(
+            "/api/v1/documents/search", params={"q": "invoice", "page_size": 1}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 2
+        assert [hit["chunk_index"] for hit in data["results"]] == [1]
+        assert "<mark>Invoice</mark>" in data["results"][0]["snippet"]
+        
+        response = await authenticated_client.get(
+            "/api/v1/documents/search", params={"q": "invoice", "page": 2, "page_size": 1}
+        )
+        snippet = response.json()["results"][0]["snippet"]
+        assert "&lt;draft&gt;" in snippet
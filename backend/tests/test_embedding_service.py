@@ -0,0 +1,330 @@
+import asyncio
+import numpy as np
+import pytest
+from unittest.mock import patch, Mock, AsyncMock
+
+from app.core.config import settings
+from app.services.embedding_cache import (
+    DiskEmbeddingCache,
+    QueryEmbeddingCache,
+    RedisEmbeddingCache,
+    embedding_cache_key,
+    normalize_query,
+)
+from app.services.embedding_service import EmbeddingService
+from app.services.vector_store import NumpyVectorStore
+
+
+class WordEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+    
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def embedding_response(texts):
+    return Mock(data=[Mock(embedding=[float(len(text))]) for text in texts])
+
+
+class TestEmbeddingService:
+    def setup_method(self):
+        self.service = EmbeddingService(vector_store=NumpyVectorStore())
+        self.encoding_patch = patch(
+            "app.services.embedding_service.get_encoding",
+            return_value=WordEncoding()
+        )
+        self.encoding_patch.start()
+    
+    def teardown_method(self):
+        self.encoding_patch.stop()
+    
+    def test_build_batches_respects_token_limit(self, monkeypatch):
+        monkeypatch.setattr(settings, "EMBEDDING_BATCH_MAX_TOKENS", 4)
+        monkeypatch.setattr(settings, "EMBEDDING_BATCH_MAX_INPUTS", 10)
+        
+        _, batches = self.service._build_batches(["a b", "c d", "e f g", "h"])
+        
+        assert batches == [[0, 1], [2, 3]]
+    
+    def test_build_batches_respects_input_limit(self, monkeypatch):
+        monkeypatch.setattr(settings, "EMBEDDING_BATCH_MAX_INPUTS", 2)
+        
+        _, batches = self.service._build_batches(["a", "b", "c"])
+        
+        assert batches == [[0, 1], [2]]
+    
+    def test_build_batches_truncates_long_inputs(self, monkeypatch):
+        monkeypatch.setattr(settings, "EMBEDDING_MAX_INPUT_TOKENS", 2)
+        
+        texts, _ = self.service._build_batches(["a b c d"])
+        
+        assert texts == ["a b"]
+    
+    async def test_generate_embeddings_preserves_order(self, monkeypatch):
+        monkeypatch.setattr(settings, "EMBEDDING_BATCH_MAX_INPUTS", 1)
+        self.service.client = Mock()
+        self.service.client.embeddings.create = AsyncMock(
+            side_effect=lambda input, model: embedding_response(input)
+        )
+        
+        embeddings = await self.service.generate_embeddings(["a", "bb", "ccc"])
+        
+        assert embeddings == [[1.0], [2.0], [3.0]]
+        assert self.service.client.embeddings.create.call_count == 3
+    
+    async def test_generate_embeddings_does_not_retry_failed_batches(self, monkeypatch):
+        monkeypatch.setattr(settings, "EMBEDDING_BATCH_MAX_INPUTS", 1)
+        calls = []
+        
+        async def create(input, model):
+            calls.append(input)
+            if input == ["bb"]:
+                raise Exception("invalid request")
+            return embedding_response(input)
+        
+        self.service.client = Mock()
+        self.service.client.embeddings.create = create
+        
+        with pytest.raises(Exception, match="invalid request"):
+            await self.service.generate_embeddings(["a", "bb", "ccc"])
+        
+        assert sorted(calls) == [["a"], ["bb"], ["ccc"]]
+    
+    async def test_get_embeddings_uses_cache(self, tmp_path):
+        self.service.cache = DiskEmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=100)
+        self.service.client = Mock()
+        self.service.client.embeddings.create = AsyncMock(
+            side_effect=lambda input, model: embedding_response(input)
+        )
+        
+        first = await self.service.get_embeddings(["a", "bb", "a"])
+        second = await self.service.get_embeddings(["bb", "ccc"])
+        
+        assert first == [[1.0], [2.0], [1.0]]
+        assert second == [[2.0], [3.0]]
+        sent = [call.kwargs["input"] for call in self.service.client.embeddings.create.call_args_list]
+        assert sorted(text for batch in sent for text in batch) == ["a", "bb", "ccc"]
+    
+    
+    async def test_search_similar_documents_filters_by_owner(self):
+        self.service.client = Mock()
+        self.service.client.embeddings.create = AsyncMock(
+            side_effect=lambda input, model: embedding_response(input)
+        )
+        await self.service.store_embeddings(
+            ["a_0", "b_0"],
+            ["mine", "theirs"],
+            [{"owner_id": 1}, {"owner_id": 2}]
+        )
+        
+        results = await self.service.search_similar_documents("query", document_filter={"owner_id": 1})
+        
+        assert results["documents"] == ["mine"]
+        assert results["metadatas"] == [{"owner_id": 1}]
+    
+    
+    async def test_owner_partitions_isolate_tenants(self, monkeypatch):
+        monkeypatch.setattr(settings, "VECTOR_PARTITION_MODE", "owner")
+        self.service.client = Mock()
+        self.service.client.embeddings.create = AsyncMock(
+            side_effect=lambda input, model: embedding_response(input)
+        )
+        await self.service.store_embeddings(
+            ["a_0", "b_0"],
+            ["mine", "theirs"],
+            [{"owner_id": 1}, {"owner_id": 2}]
+        )
+        
+        results = await self.service.search_similar_documents("query", document_filter={"owner_id": 1})
+        
+        assert results["documents"] == ["mine"]
+        assert await self.service.vector_store.count() == 0
+        assert await (await self.service.store_for_owner(2)).count() == 1
+    
+    async def test_two_pass_search_reranks_with_full_vectors(self, monkeypatch):
+        monkeypatch.setattr(settings, "VECTOR_COARSE_DIMENSIONS", 2)
+        monkeypatch.setattr(settings, "VECTOR_COARSE_CANDIDATES", 2)
+        vectors = {
+            "prefix match": [1.0, 0.0, -1.0],
+            "full match": [0.7, 0.7, 1.0],
+            "unrelated": [0.0, 1.0, 0.0],
+            "query": [1.0, 0.0, 1.0],
+        }
+        self.service.client = Mock()
+        self.service.client.embeddings.create = AsyncMock(
+            side_effect=lambda input, model: Mock(data=[Mock(embedding=vectors[text]) for text in input])
+        )
+        await self.service.store_embeddings(
+            ["a_0", "b_0", "c_0"],
+            ["prefix match", "full match", "unrelated"],
+            [{"owner_id": 1, "document_id": "a"}, {"owner_id": 1, "document_id": "b"}, {"owner_id": 1, "document_id": "c"}]
+        )
+        
+        results = await self.service.search_similar_documents("query", n_results=1)
+        
+        assert results["documents"] == ["full match"]
+        
+        coarse = await self.service.coarse_store_for_owner(1)
+        await self.service.delete_document_embeddings("b", owner_id=1)
+        assert await coarse.count() == 2
+        results = await self.service.search_similar_documents("query", n_results=1)
+        assert results["documents"] == ["prefix match"]
+    
+    async def test_embed_query_caches_normalized_text(self):
+        self.service.query_cache = QueryEmbeddingCache(max_entries=10, ttl=60)
+        self.service.client = Mock()
+        self.service.client.embeddings.create = AsyncMock(
+            side_effect=lambda input, model: embedding_response(input)
+        )
+        
+        first, second = await asyncio.gather(
+            self.service.embed_query("payment  terms"),
+            self.service.embed_query("payment terms"),
+        )
+        third = await self.service.embed_query(" payment\nterms ")
+        
+        assert first == second == third == [13.0]
+        self.service.client.embeddings.create.assert_awaited_once_with(
+            input=["payment terms"], model=settings.EMBEDDING_MODEL
+        )
+    
+    async def test_embed_queries_embeds_uncached_queries_in_one_request(self):
+        self.service.query_cache = QueryEmbeddingCache(max_entries=10, ttl=60)
+        self.service.client = Mock()
+        self.service.client.embeddings.create = AsyncMock(
+            side_effect=lambda input, model: embedding_response(input)
+        )
+        await self.service.embed_query("net")
+        
+        embeddings = await self.service.embed_queries(["payment terms", "net", "payment  terms", "fee"])
+        
+        assert embeddings == [[13.0], [3.0], [13.0], [3.0]]
+        self.service.client.embeddings.create.assert_awaited_with(
+            input=["payment terms", "fee"], model=settings.EMBEDDING_MODEL
+        )
+        assert self.service.client.embeddings.create.await_count == 2
+    
+    async def test_query_cache_misses_use_the_embedding_cache(self, tmp_path):
+        self.service.cache = DiskEmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=100)
+        self.service.query_cache = QueryEmbeddingCache(max_entries=10, ttl=60)
+        self.service.client = Mock()
+        self.service.client.embeddings.create = AsyncMock(
+            side_effect=lambda input, model: embedding_response(input)
+        )
+        
+        await self.service.embed_query("payment terms")
+        self.service.query_cache = QueryEmbeddingCache(max_entries=10, ttl=60)
+        embedding = await self.service.embed_query("payment terms")
+        
+        assert embedding == [13.0]
+        self.service.client.embeddings.create.assert_awaited_once()
+    
+    async def test_search_by_embeddings_returns_results_in_query_order(self, monkeypatch):
+        monkeypatch.setattr(settings, "VECTOR_COARSE_DIMENSIONS", 2)
+        vectors = {"north": [0.0, 1.0, 0.0], "east": [1.0, 0.0, 0.0]}
+        self.service.client = Mock()
+        self.service.client.embeddings.create = AsyncMock(
+            side_effect=lambda input, model: Mock(data=[Mock(embedding=vectors[text]) for text in input])
+        )
+        await self.service.store_embeddings(
+            ["n_0", "e_0"],
+            ["north", "east"],
+            [{"owner_id": 1, "document_id": "n"}, {"owner_id": 1, "document_id": "e"}]
+        )
+        
+        results = await self.service.search_by_embeddings(
+            [[1.0, 0.1, 0.0], [0.1, 1.0, 0.0]], n_results=1, document_filter={"owner_id": 1}
+        )
+        
+        assert [result["documents"] for result in results] == [["east"], ["north"]]
+    
+    def test_bucket_partition_names(self, monkeypatch):
+        monkeypatch.setattr(settings, "VECTOR_PARTITION_MODE", "bucket")
+        monkeypatch.setattr(settings, "VECTOR_PARTITION_BUCKETS", 4)
+        
+        names = {self.service.partition_name(owner_id) for owner_id in range(100)}
+        
+        assert len(names) == 4
+        assert self.service.partition_name(7) == self.service.partition_name(7)
+        with pytest.raises(ValueError):
+            self.service.partition_name(None)
+
+class TestDiskEmbeddingCache:
+    async def test_round_trip(self, tmp_path):
+        cache = DiskEmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=10)
+        key = embedding_cache_key("model", "text")
+        
+        await cache.set_many({key: [0.5, 0.25]})
+        
+        assert await cache.get_many([key, "missing"]) == [[0.5, 0.25], None]
+    
+    async def test_evicts_least_recently_used(self, tmp_path):
+        cache = DiskEmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+        
+        await cache.set_many({"a": [1.0]})
+        await cache.set_many({"b": [2.0]})
+        await cache.get_many(["a"])
+        await cache.set_many({"c": [3.0]})
+        
+        assert await cache.get_many(["a", "b", "c"]) == [[1.0], None, [3.0]]
+    
+    def test_key_depends_on_model(self):
+        assert embedding_cache_key("small", "text") != embedding_cache_key("large", "text")
+
+
+class RecordingPipeline:
+    def __init__(self, commands):
+        self.commands = commands
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        return False
+    
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+    
+    async def execute(self):
+        return []
+
+
+class TestRedisEmbeddingCache:
+    async def test_lookup_refreshes_hits_and_drops_expired_keys(self):
+        with patch("app.services.embedding_cache.redis.from_url"):
+            cache = RedisEmbeddingCache("redis://", max_entries=10, ttl=60)
+        commands = []
+        cache.redis.mget = AsyncMock(return_value=[np.float32([1.0]).tobytes(), None])
+        cache.redis.pipeline = lambda transaction: RecordingPipeline(commands)
+        
+        assert await cache.get_many(["a", "b"]) == [[1.0], None]
+        
+        assert [(name, args) for name, args, _ in commands if name != "zadd"] == [
+            ("expire", ("embedding:a", 60)),
+            ("zrem", ("embedding:lru", "b")),
+        ]
+        zadd = next(args for name, args, _ in commands if name == "zadd")
+        assert list(zadd[1]) == ["a"]
+
+
+class TestQueryEmbeddingCache:
+    async def test_evicts_least_recently_used(self):
+        cache = QueryEmbeddingCache(max_entries=2, ttl=60)
+        
+        await cache.set("a", [1.0])
+        await cache.set("b", [2.0])
+        await cache.get("a")
+        await cache.set("c", [3.0])
+        
+        assert [await cache.get(key) for key in "abc"] == [[1.0], None, [3.0]]
+    
+    async def test_entries_expire(self):
+        cache = QueryEmbeddingCache(max_entries=2, ttl=0)
+        
+        await cache.set("a", [1.0])
+        
+        assert await cache.get("a") is None
+    
+    def test_normalize_query_keeps_case(self):
+        assert normalize_query("  INV-42\u00a0due\t now ") == "INV-42 due now"
@@ -0,0 +1,289 @@
+import pytest
+from unittest.mock import AsyncMock, Mock
+from sqlalchemy import inspect, select, text, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.models.document import Document, DocumentChunk
+from app.services.embedding_service import EmbeddingService
+from app.services.ingestion_service import IngestionService, ensure_document_columns
+from app.services.text_chunker import TextChunk
+
+
+class PipeProcessor:
+    async def iter_text(self, file, filename):
+        yield file.read().decode(), 1.0
+    
+    async def split_stream(self, texts):
+        async for text, progress in texts:
+            for part in text.split("|"):
+                yield TextChunk(content=part, tokens=1), progress
+
+
+def make_embedding_service():
+    service = Mock(spec=EmbeddingService)
+    service.chunk_metadata = lambda document_id, index, chunk, metadata=None: {"chunk_index": index}
+    service.get_embeddings.side_effect = lambda texts: [[float(len(text))] for text in texts]
+    return service
+
+
+class TestIngestionService:
+    async def test_reindex_embeds_only_changed_chunks(self, db_session, test_user, tmp_path):
+        file_path = tmp_path / "doc.txt"
+        file_path.write_text("alpha|beta|gamma")
+        document = Document(
+            filename="doc.txt",
+            file_type="text/plain",
+            file_size=16,
+            file_path=str(file_path),
+            metadata={},
+            owner_id=test_user.id
+        )
+        db_session.add(document)
+        await db_session.commit()
+        
+        embedding_service = make_embedding_service()
+        service = IngestionService(processor=PipeProcessor(), embedding_service=embedding_service)
+        await service.process_document(document.id, db_session)
+        
+        new_path = tmp_path / "new.txt"
+        new_path.write_text("alpha|delta|beta")
+        embedding_service.store_embeddings.reset_mock()
+        document = await service.reindex_document(
+            document.id, db_session, {"filename": "new.txt", "file_path": str(new_path)}
+        )
+        
+        embedding_service.store_embeddings.assert_not_awaited()
+        embedding_service.add_embeddings.assert_awaited_once_with(
+            [f"{document.id}_3"], [[5.0]], ["delta"], [{"chunk_index": 1}]
+        )
+        embedding_service.update_chunk_indices.assert_called_once_with([f"{document.id}_1"], [2], test_user.id)
+        embedding_service.delete_embeddings.assert_called_once_with([f"{document.id}_2"], test_user.id)
+        
+        result = await db_session.execute(
+            select(DocumentChunk)
+            .where(DocumentChunk.document_id == document.id)
+            .order_by(DocumentChunk.chunk_index)
+        )
+        assert [chunk.content for chunk in result.scalars()] == ["alpha", "delta", "beta"]
+        assert document.processing_status == "completed"
+        assert document.metadata["reindex"] == {"kept": 2, "added": 1, "removed": 1}
+        assert (document.filename, document.file_path) == ("new.txt", str(new_path))
+    
+    async def test_stale_vectors_left_by_a_failed_delete_are_removed_later(
+        self, db_session, test_user, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr("app.services.ingestion_service.asyncio.sleep", AsyncMock())
+        file_path = tmp_path / "doc.txt"
+        file_path.write_text("alpha|beta")
+        owner_id = test_user.id
+        document = Document(
+            filename="doc.txt",
+            file_type="text/plain",
+            file_size=10,
+            file_path=str(file_path),
+            metadata={},
+            owner_id=owner_id
+        )
+        db_session.add(document)
+        await db_session.commit()
+        document_id = document.id
+        
+        embedding_service = make_embedding_service()
+        service = IngestionService(processor=PipeProcessor(), embedding_service=embedding_service)
+        await service.process_document(document_id, db_session)
+        
+        file_path.write_text("alpha|gamma")
+        embedding_service.delete_embeddings.side_effect = RuntimeError("vector store unavailable")
+        document = await service.reindex_document(document_id, db_session)
+        
+        assert document.processing_status == "completed"
+        assert embedding_service.delete_embeddings.await_count == 3
+        assert document.metadata["stale_vectors"] == [f"{document_id}_1"]
+        
+        file_path.write_text("alpha|gamma|delta")
+        embedding_service.delete_embeddings.reset_mock(side_effect=True)
+        embedding_service.add_embeddings.reset_mock()
+        document = await service.reindex_document(document_id, db_session)
+        
+        embedding_service.add_embeddings.assert_awaited_once_with(
+            [f"{document_id}_3"], [[5.0]], ["delta"], [{"chunk_index": 2}]
+        )
+        embedding_service.delete_embeddings.assert_awaited_once_with([f"{document_id}_1"], owner_id)
+        assert "stale_vectors" not in document.metadata
+    
+    async def test_reindex_keeps_chunks_stored_without_hashes(self, db_session, test_user, tmp_path):
+        file_path = tmp_path / "doc.txt"
+        file_path.write_text("alpha|beta")
+        document = Document(
+            filename="doc.txt",
+            file_type="text/plain",
+            file_size=10,
+            file_path=str(file_path),
+            metadata={},
+            owner_id=test_user.id
+        )
+        db_session.add(document)
+        await db_session.commit()
+        
+        embedding_service = make_embedding_service()
+        service = IngestionService(processor=PipeProcessor(), embedding_service=embedding_service)
+        await service.process_document(document.id, db_session)
+        await db_session.execute(
+            update(DocumentChunk).where(DocumentChunk.document_id == document.id).values(content_hash=None)
+        )
+        await db_session.commit()
+        
+        document = await service.reindex_document(document.id, db_session)
+        
+        embedding_service.add_embeddings.assert_not_awaited()
+        assert document.metadata["reindex"] == {"kept": 2, "added": 0, "removed": 0}
+        result = await db_session.execute(
+            select(DocumentChunk.content_hash).where(DocumentChunk.document_id == document.id)
+        )
+        assert None not in result.scalars().all()
+    
+    async def test_failed_reindex_keeps_previous_chunks(self, db_session, test_user, tmp_path, monkeypatch):
+        file_path = tmp_path / "doc.txt"
+        file_path.write_text("alpha|beta")
+        owner_id = test_user.id
+        document = Document(
+            filename="doc.txt",
+            file_type="text/plain",
+            file_size=10,
+            file_path=str(file_path),
+            metadata={},
+            owner_id=test_user.id
+        )
+        db_session.add(document)
+        await db_session.commit()
+        document_id = document.id
+        
+        embedding_service = make_embedding_service()
+        service = IngestionService(processor=PipeProcessor(), embedding_service=embedding_service)
+        await service.process_document(document_id, db_session)
+        
+        monkeypatch.setattr(settings, "INGEST_CHUNK_BATCH_SIZE", 1)
+        # The test engine shares one connection between sessions, so the
+        # progress session would commit the reindex transaction too.
+        monkeypatch.setattr(service, "_report_progress", AsyncMock())
+        new_path = tmp_path / "new.txt"
+        new_path.write_text("gamma|delta|epsilon")
+        embedding_service.get_embeddings.side_effect = [[[1.0]], [[2.0]], RuntimeError("embeddings unavailable")]
+        with pytest.raises(RuntimeError):
+            await service.reindex_document(
+                document_id, db_session, {"filename": "new.txt", "file_path": str(new_path)}
+            )
+        
+        embedding_service.add_embeddings.assert_not_awaited()
+        assert service._report_progress.await_count == 2
+        embedding_service.delete_embeddings.assert_awaited_once_with(
+            [f"{document_id}_2", f"{document_id}_3"], owner_id
+        )
+        result = await db_session.execute(
+            select(DocumentChunk.content)
+            .where(DocumentChunk.document_id == document_id)
+            .order_by(DocumentChunk.chunk_index)
+        )
+        assert list(result.scalars()) == ["alpha", "beta"]
+        assert document.processing_status == "failed"
+        assert (document.filename, document.file_path) == ("doc.txt", str(file_path))
+    
+    async def test_process_documents_shares_batches_and_isolates_failures(
+        self, db_session, test_user, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "INGEST_CHUNK_BATCH_SIZE", 10)
+        documents = []
+        for name, text in [("a.txt", "one|two"), ("b.txt", "three"), ("missing.txt", None)]:
+            file_path = tmp_path / name
+            if text is not None:
+                file_path.write_text(text)
+            documents.append(Document(
+                filename=name,
+                file_type="text/plain",
+                file_size=len(text or ""),
+                file_path=str(file_path),
+                metadata={},
+                owner_id=test_user.id
+            ))
+        db_session.add_all(documents)
+        await db_session.commit()
+        
+        embedding_service = make_embedding_service()
+        service = IngestionService(processor=PipeProcessor(), embedding_service=embedding_service)
+        statuses = await service.process_documents([document.id for document in documents], db_session)
+        
+        assert statuses == {
+            str(documents[0].id): "completed",
+            str(documents[1].id): "completed",
+            str(documents[2].id): "failed",
+        }
+        embedding_service.store_embeddings.assert_awaited_once()
+        assert sorted(embedding_service.store_embeddings.call_args.args[1]) == ["one", "three", "two"]
+        assert documents[0].metadata["chunk_count"] == 2
+        assert documents[2].error_message
+    
+    async def test_redelivered_document_replaces_leftover_chunks(self, db_session, test_user, tmp_path):
+        file_path = tmp_path / "doc.txt"
+        file_path.write_text("alpha|beta")
+        document = Document(
+            filename="doc.txt",
+            file_type="text/plain",
+            file_size=10,
+            file_path=str(file_path),
+            processing_status="processing",
+            metadata={},
+            owner_id=test_user.id
+        )
+        db_session.add(document)
+        await db_session.commit()
+        db_session.add(DocumentChunk(
+            document_id=document.id,
+            chunk_index=0,
+            content="alpha",
+            embedding_id=f"{document.id}_0"
+        ))
+        await db_session.commit()
+        
+        embedding_service = make_embedding_service()
+        service = IngestionService(processor=PipeProcessor(), embedding_service=embedding_service)
+        await service.process_document(document.id, db_session)
+        
+        embedding_service.delete_document_embeddings.assert_awaited_once_with(str(document.id), test_user.id)
+        result = await db_session.execute(
+            select(DocumentChunk.content).where(DocumentChunk.document_id == document.id)
+        )
+        assert sorted(result.scalars()) == ["alpha", "beta"]
+        assert document.processing_status == "completed"
+        
+        embedding_service.store_embeddings.reset_mock()
+        await service.process_document(document.id, db_session)
+        embedding_service.store_embeddings.assert_not_awaited()
+    
+    
+    async def test_ensure_document_columns_upgrades_existing_tables(self):
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE documents (id VARCHAR PRIMARY KEY, processing_status VARCHAR)"
+            ))
+            await conn.execute(text("INSERT INTO documents VALUES ('a', 'completed'), ('b', 'failed')"))
+            await conn.execute(text("CREATE TABLE document_chunks (id VARCHAR PRIMARY KEY, content TEXT)"))
+            
+            await ensure_document_columns(conn)
+            await ensure_document_columns(conn)
+            
+            columns = await conn.run_sync(
+                lambda sync_conn: {column["name"] for column in inspect(sync_conn).get_columns("documents")}
+            )
+            chunk_columns = await conn.run_sync(
+                lambda sync_conn: {column["name"] for column in inspect(sync_conn).get_columns("document_chunks")}
+            )
+            progress = (await conn.execute(
+                text("SELECT id, processing_progress FROM documents ORDER BY id")
+            )).all()
+        await engine.dispose()
+        
+        assert {"file_path", "processing_progress"} <= columns
+        assert "content_hash" in chunk_columns
+        assert progress == [("a", 100), ("b", 0)]
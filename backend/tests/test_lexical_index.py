@@ -0,0 +1,86 @@
+import uuid
+import pytest
+from sqlalchemy import select
+
+from app.models.document import ChunkTerm, Document, DocumentChunk
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+async def index_document(db_session, lexical_index, owner_id, contents):
+    document = Document(
+        filename="contract.txt",
+        file_type="text/plain",
+        file_size=10,
+        metadata={},
+        owner_id=owner_id
+    )
+    db_session.add(document)
+    await db_session.flush()
+    
+    chunks = []
+    for index, content in enumerate(contents):
+        chunk = DocumentChunk(
+            id=uuid.uuid4(),
+            document_id=document.id,
+            chunk_index=index,
+            content=content,
+            embedding_id=f"{document.id}_{index}",
+            tokens=len(content.split())
+        )
+        db_session.add(chunk)
+        chunks.append(chunk)
+    await db_session.flush()
+    
+    await lexical_index.add(db_session, [
+        {
+            "owner_id": owner_id,
+            "document_id": document.id,
+            "chunk_id": chunk.id,
+            "content": chunk.content,
+            "tokens": chunk.tokens,
+        }
+        for chunk in chunks
+    ])
+    await db_session.commit()
+    return document
+
+
+class TestLexicalIndex:
+    def test_tokenize_keeps_identifiers_and_parts(self):
+        assert tokenize("The invoice INV-2023-0042 is due") == [
+            "invoice", "inv-2023-0042", "inv", "2023", "0042", "due"
+        ]
+    
+    def test_reciprocal_rank_fusion_rewards_agreement(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=60)
+        
+        assert fused[0] == "c"
+        assert set(fused) == {"a", "b", "c", "d"}
+    
+    async def test_search_ranks_exact_identifier_first(self, db_session, test_user):
+        lexical_index = LexicalIndex()
+        document = await index_document(db_session, lexical_index, test_user.id, [
+            "Payment terms are thirty days from the invoice date.",
+            "Invoice INV-2023-0042 covers the March consulting work.",
+            "Either party may terminate under clause 14.2 with notice.",
+            "Confidential information must not be disclosed.",
+        ])
+        await index_document(db_session, lexical_index, test_user.id + 1, [
+            "Invoice INV-2023-0042 belongs to someone else.",
+        ])
+        
+        results = await lexical_index.search(db_session, "where is INV-2023-0042?", test_user.id, n_results=2)
+        
+        assert results["ids"][0] == f"{document.id}_1"
+        assert all(metadata["owner_id"] == test_user.id for metadata in results["metadatas"])
+        assert results["scores"] == sorted(results["scores"], reverse=True)
+    
+    async def test_remove_document_drops_postings(self, db_session, test_user):
+        lexical_index = LexicalIndex()
+        document = await index_document(db_session, lexical_index, test_user.id, ["clause 14.2 applies"])
+        
+        await lexical_index.remove_document(db_session, document.id)
+        await db_session.commit()
+        
+        result = await db_session.execute(select(ChunkTerm).where(ChunkTerm.document_id == document.id))
+        assert result.scalars().all() == []
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services.openai_client import (
+    NO_RETRY_HEADER,
+    CircuitBreaker,
+    ProviderGuard,
+    ResilientTransport,
+    TokenBucket,
+    request_cost,
+)
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "OPENAI_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(settings, "OPENAI_HEDGE_DELAY", 0.0)
+
+
+def make_client(handler, guard=None):
+    transport = ResilientTransport(
+        httpx.MockTransport(handler),
+        guard or ProviderGuard({}, failure_threshold=3, reset_timeout=60)
+    )
+    return httpx.AsyncClient(transport=transport, base_url="https://api.openai.com/v1")
+
+
+def embeddings_request(**body):
+    return {"model": "text-embedding-3-small", "input": ["payment terms"], **body}
+
+
+class TestResilientTransport:
+    async def test_retries_rate_limited_requests(self):
+        statuses = [429, 503, 200]
+        
+        def handler(request):
+            return httpx.Response(statuses.pop(0), headers={"retry-after": "0"}, json={})
+        
+        async with make_client(handler) as client:
+            response = await client.post("/embeddings", json=embeddings_request())
+        
+        assert response.status_code == 200
+        assert statuses == []
+    
+    async def test_returns_last_response_when_retries_run_out(self):
+        calls = []
+        
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(500, json={})
+        
+        async with make_client(handler) as client:
+            response = await client.post("/embeddings", json=embeddings_request())
+        
+        assert response.status_code == 500
+        assert len(calls) == settings.OPENAI_MAX_RETRIES + 1
+    
+    async def test_client_errors_are_not_retried(self):
+        calls = []
+        
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(400, json={})
+        
+        async with make_client(handler) as client:
+            response = await client.post("/embeddings", json=embeddings_request())
+        
+        assert response.status_code == 400
+        assert len(calls) == 1
+    
+    async def test_no_retry_header_sends_a_single_attempt(self):
+        calls = []
+        
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(503, json={})
+        
+        async with make_client(handler) as client:
+            response = await client.get("/models/text-embedding-3-small", headers={NO_RETRY_HEADER: "1"})
+        
+        assert response.status_code == 503
+        assert len(calls) == 1
+        assert NO_RETRY_HEADER not in calls[0].headers
+    
+    async def test_open_circuit_fails_fast(self, monkeypatch):
+        monkeypatch.setattr(settings, "OPENAI_MAX_RETRIES", 0)
+        guard = ProviderGuard({}, failure_threshold=2, reset_timeout=60)
+        calls = []
+        
+        def handler(request):
+            calls.append(request)
+            raise httpx.ConnectError("unreachable")
+        
+        async with make_client(handler, guard) as client:
+            for _ in range(2):
+                with pytest.raises(httpx.ConnectError):
+                    await client.post("/embeddings", json=embeddings_request())
+            response = await client.post("/embeddings", json=embeddings_request())
+        
+        assert response.status_code == 503
+        assert response.json()["error"]["type"] == "circuit_open"
+        assert len(calls) == 2
+    
+    async def test_slow_request_is_hedged(self, monkeypatch):
+        monkeypatch.setattr(settings, "OPENAI_HEDGE_DELAY", 0.01)
+        calls = []
+        
+        async def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                await asyncio.sleep(5)
+            return httpx.Response(200, json={"copy": len(calls)})
+        
+        async with make_client(handler) as client:
+            response = await asyncio.wait_for(
+                client.post("/embeddings", json=embeddings_request()), timeout=1
+            )
+        
+        assert response.json() == {"copy": 2}
+    
+    async def test_streamed_requests_are_not_hedged(self, monkeypatch):
+        monkeypatch.setattr(settings, "OPENAI_HEDGE_DELAY", 0.01)
+        calls = []
+        
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={})
+        
+        async with make_client(handler) as client:
+            await client.post("/chat/completions", json={"model": "gpt-3.5-turbo", "messages": [], "stream": True})
+        
+        assert len(calls) == 1
+
+
+class TestProviderGuard:
+    def test_token_bucket_reservations_queue_up(self):
+        bucket = TokenBucket(per_minute=60)
+        
+        assert bucket.reserve(60) == 0.0
+        assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+        assert bucket.reserve(2) == pytest.approx(3.0, abs=0.05)
+        assert not bucket.available(1)
+    
+    def test_rate_limits_apply_per_model(self):
+        guard = ProviderGuard(
+            {"text-embedding-3-small": {"rpm": 60, "tpm": 600}},
+            failure_threshold=3,
+            reset_timeout=60
+        )
+        
+        assert guard.reserve("text-embedding-3-small", 600) == 0.0
+        assert guard.reserve("text-embedding-3-small", 60) == pytest.approx(6.0, abs=0.05)
+        assert guard.reserve("gpt-3.5-turbo", 10_000) == 0.0
+    
+    def test_circuit_probe_closes_or_reopens(self, monkeypatch):
+        now = [0.0]
+        monkeypatch.setattr("app.services.openai_client.time.monotonic", lambda: now[0])
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert not breaker.allow()
+        
+        now[0] = 11.0
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_failure()
+        assert not breaker.allow()
+        
+        now[0] = 22.0
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.allow() and breaker.allow()
+    
+    def test_request_cost_estimates_prompt_and_completion_tokens(self):
+        chat = httpx.Request("POST", "https://api.openai.com/v1/chat/completions", content=json.dumps({
+            "model": "gpt-3.5-turbo",
+            "messages": [{"role": "user", "content": "x" * 400}],
+            "max_tokens": 1000,
+            "stream": True,
+        }))
+        embeddings = httpx.Request(
+            "POST", "https://api.openai.com/v1/embeddings", content=json.dumps(embeddings_request(input="y" * 80))
+        )
+        
+        assert request_cost(chat) == ("gpt-3.5-turbo", 1100, True)
+        assert request_cost(embeddings) == ("text-embedding-3-small", 20, False)
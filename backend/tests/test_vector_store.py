@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+from unittest.mock import patch, Mock
+
+from app.core.config import settings
+from app.services.vector_store import BoundedExecutor, ChromaVectorStore, NumpyVectorStore, create_vector_store
+
+
+class TestNumpyVectorStore:
+    async def test_query_orders_by_cosine_distance(self):
+        store = NumpyVectorStore()
+        await store.add(
+            ["a", "b", "c"],
+            [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+            ["first", "second", "third"],
+            [{"owner_id": 1}, {"owner_id": 1}, {"owner_id": 2}]
+        )
+        
+        results = await store.query([[1.0, 0.1]], n_results=2)
+        
+        assert results["ids"] == [["a", "c"]]
+        assert results["distances"][0][0] == pytest.approx(1 - 1 / (1.01 ** 0.5), abs=1e-6)
+    
+    async def test_where_update_and_delete(self):
+        store = NumpyVectorStore()
+        await store.add(
+            ["a", "b"],
+            [[1.0, 0.0], [0.0, 1.0]],
+            ["first", "second"],
+            [{"document_id": "d1", "chunk_index": 0}, {"document_id": "d2", "chunk_index": 0}]
+        )
+        
+        await store.update_metadata(["b"], [{"chunk_index": 5}])
+        results = await store.query([[0.0, 1.0]], n_results=5, where={"document_id": "d2"})
+        assert results["metadatas"] == [[{"document_id": "d2", "chunk_index": 5}]]
+        
+        await store.delete(where={"document_id": "d1"})
+        assert await store.count() == 1
+        results = await store.query([[1.0, 0.0]], n_results=5)
+        assert results["ids"] == [["b"]]
+    
+    
+    @pytest.mark.parametrize("quantization", ["float16", "int8"])
+    async def test_quantized_search_rescores_exactly(self, quantization, tmp_path):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(200, 32)).astype(np.float32)
+        ids = [str(i) for i in range(len(vectors))]
+        exact = NumpyVectorStore()
+        store = NumpyVectorStore(quantization=quantization, rescore_directory=str(tmp_path))
+        for target in (exact, store):
+            await target.add(ids, vectors.tolist(), ids, [{} for _ in ids])
+        
+        queries = rng.normal(size=(5, 32)).tolist()
+        expected = await exact.query(queries, n_results=5)
+        results = await store.query(queries, n_results=5)
+        
+        assert results["ids"] == expected["ids"]
+        assert np.allclose(results["distances"], expected["distances"], atol=1e-6)
+        assert store.memory_usage()["resident"] < exact.memory_usage()["resident"]
+        await store.close()
+        assert not list(tmp_path.iterdir())
+    
+    async def test_quantized_delete_compacts_rescore_vectors(self, tmp_path):
+        store = NumpyVectorStore(quantization="int8", rescore_directory=str(tmp_path))
+        await store.add(
+            ["a", "b", "c"],
+            [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+            ["first", "second", "third"],
+            [{}, {}, {}]
+        )
+        
+        await store.delete(ids=["a"])
+        results = await store.query([[1.0, 0.0]], n_results=2)
+        
+        assert results["ids"] == [["c", "b"]]
+        assert results["distances"][0][0] == pytest.approx(1 - 1 / 2 ** 0.5, abs=1e-6)
+        embeddings = [embedding async for batch in store.scan() for embedding in batch["embeddings"]]
+        assert embeddings[0] == pytest.approx([0.0, 1.0])
+        await store.close()
+
+
+class TestChromaVectorStore:
+    def make_store(self):
+        with patch("app.services.vector_store.chromadb.PersistentClient"):
+            return ChromaVectorStore("unused", "documents", BoundedExecutor("chroma", 1, 1))
+    
+    async def test_warm_up_pages_in_index(self):
+        store = self.make_store()
+        store.collection.count.return_value = 3
+        store.collection.peek.return_value = {"embeddings": [[0.5, 0.5]]}
+        store.collection.query.return_value = {
+            "ids": [["a"]], "documents": [["x"]], "metadatas": [[{}]], "distances": [[0.0]]
+        }
+        
+        assert await store.warm_up() == 3
+        
+        assert store.collection.query.call_args.kwargs["query_embeddings"] == [[0.5, 0.5]]
+        await store.close()
+    
+    async def test_combines_filters_with_and(self):
+        store = self.make_store()
+        
+        await store.delete(where={"owner_id": 1, "document_id": "d1"})
+        
+        store.collection.delete.assert_called_once_with(
+            ids=None,
+            where={"$and": [{"owner_id": 1}, {"document_id": "d1"}]}
+        )
+        await store.close()
+    
+    async def test_host_connects_to_chroma_server(self):
+        with patch("app.services.vector_store.chromadb.HttpClient") as http_client, \
+                patch("app.services.vector_store.chromadb.PersistentClient") as persistent_client:
+            store = ChromaVectorStore(
+                "unused", "documents", BoundedExecutor("chroma", 1, 1), host="chromadb", port=8000
+            )
+        
+        assert http_client.call_args.kwargs["host"] == "chromadb"
+        persistent_client.assert_not_called()
+        await store.close()
+
+
+class TestCreateVectorStore:
+    @pytest.mark.parametrize("backend", ["chroma", "pgvector", "numpy"])
+    def test_int8_quantization_is_rejected(self, backend, monkeypatch):
+        monkeypatch.setattr(settings, "VECTOR_STORE_BACKEND", backend)
+        monkeypatch.setattr(settings, "VECTOR_QUANTIZATION_COLLECTIONS", {"documents_owner_1": "int8"})
+        
+        with pytest.raises(ValueError, match="int8"):
+            create_vector_store()